@@ -1,9 +1,27 @@
-from .nanoplot_stats import stats
-from .trim_long_reads import trim
+from .nanoplot_stats import (
+    collate_nanostats,
+    compute_nanostats,
+    compute_read_metrics,
+    stats,
+    stats_partitioned,
+)
+from .partition import collate_reads, partition_reads
+from .trim_long_reads import trim, trim_partitioned, trim_with_stats
 
 try:
     from ._version import __version__
 except ModuleNotFoundError:
     __version__ = "0.0.0+notfound"
 
-__all__ = ["trim", "stats"]
+__all__ = [
+    "trim",
+    "trim_with_stats",
+    "trim_partitioned",
+    "stats",
+    "partition_reads",
+    "collate_reads",
+    "stats_partitioned",
+    "compute_nanostats",
+    "collate_nanostats",
+    "compute_read_metrics",
+]
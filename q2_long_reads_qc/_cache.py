@@ -0,0 +1,131 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2024, QIIME 2 development team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file LICENSE, distributed with this software.
+# ----------------------------------------------------------------------------
+import hashlib
+import json
+import os
+import tempfile
+import threading
+
+from q2_long_reads_qc._utils import COPY_BUFFER_SIZE, link_or_copy
+
+# Extension of the cached trimmed files
+ENTRY_SUFFIX = ".fastq.gz"
+
+# Extension of the data cached along with the trimmed files, e.g. the
+# statistics of their reads
+DATA_SUFFIX = ".json"
+
+
+# SHA-256 digest of the content of a file
+def file_digest(path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as fh:
+        while chunk := fh.read(COPY_BUFFER_SIZE):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ResultCache:
+    """On-disk cache of trimmed FASTQ files, addressed by the digests of the
+    input files and the parameters they were trimmed with. Entries are
+    hardlinked in and out of the cache directory where possible and the
+    least recently used ones are evicted once the cache grows beyond
+    max_size bytes"""
+
+    def __init__(self, directory, max_size):
+        self.directory = directory
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    # Key of the result of trimming the given input files with the given
+    # parameters, which must be JSON serializable
+    def key(self, input_files, params) -> str:
+        digest = hashlib.sha256()
+        for input_file in input_files:
+            digest.update(file_digest(input_file).encode())
+        digest.update(json.dumps(params, sort_keys=True).encode())
+        return digest.hexdigest()
+
+    def _entry(self, key, index):
+        return os.path.join(self.directory, f"{key}.{index}{ENTRY_SUFFIX}")
+
+    def _data_entry(self, key):
+        return os.path.join(self.directory, f"{key}{DATA_SUFFIX}")
+
+    # Links the cached results of 'key' to the output files. Returns False,
+    # leaving the output files untouched, unless all of them are cached.
+    # Entries evicted by a concurrent run sharing the cache, even while they
+    # are being linked, are a miss as well
+    def fetch(self, key, output_files) -> bool:
+        entries = [self._entry(key, i) for i in range(len(output_files))]
+        linked = []
+        with self._lock:
+            try:
+                for entry in entries:
+                    # Mark the entry as recently used
+                    os.utime(entry)
+                for entry, output_file in zip(entries, output_files):
+                    link_or_copy(entry, output_file)
+                    linked.append(output_file)
+            except FileNotFoundError:
+                for output_file in linked:
+                    os.unlink(output_file)
+                return False
+        return True
+
+    # Adds the output files to the cache as the results of 'key'. Every
+    # entry appears atomically, so that concurrent runs sharing the cache
+    # never see partially written files
+    def store(self, key, output_files):
+        for i, output_file in enumerate(output_files):
+            fd, temp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+            os.close(fd)
+            os.unlink(temp_path)
+            link_or_copy(output_file, temp_path)
+            os.replace(temp_path, self._entry(key, i))
+
+    # Data cached along with the results of 'key', or None if there is none
+    def fetch_data(self, key):
+        entry = self._data_entry(key)
+        with self._lock:
+            try:
+                with open(entry) as fh:
+                    data = json.load(fh)
+                os.utime(entry)
+            except FileNotFoundError:
+                return None
+        return data
+
+    # Adds JSON serializable data to the cache along with the results of
+    # 'key', atomically like the results themselves
+    def store_data(self, key, data):
+        fd, temp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(fd, "w") as fh:
+            json.dump(data, fh)
+        os.replace(temp_path, self._data_entry(key))
+
+    # Removes the least recently used entries until the cache fits in
+    # max_size bytes
+    def evict(self):
+        with self._lock:
+            entries = []
+            for entry in os.scandir(self.directory):
+                if entry.name.endswith((ENTRY_SUFFIX, DATA_SUFFIX)):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+            size = sum(entry_size for _, entry_size, _ in entries)
+            for _, entry_size, path in sorted(entries):
+                if size <= self.max_size:
+                    break
+                try:
+                    os.unlink(path)
+                except FileNotFoundError:
+                    pass  # Evicted by a concurrent run
+                size -= entry_size
@@ -0,0 +1,203 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2024, QIIME 2 development team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file LICENSE, distributed with this software.
+# ----------------------------------------------------------------------------
+import asyncio
+import inspect
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, NamedTuple, Optional
+
+from q2_long_reads_qc._utils import (
+    ProcessGroup,
+    blame_stage,
+    enlarge_pipe,
+    print_command,
+    process_group,
+    stage_failed,
+)
+
+# Amount of the standard error of every stage kept for error reports
+STDERR_TAIL_SIZE = 64 * 1024
+
+
+class Pipeline(NamedTuple):
+    cmds: List[List[str]]
+    outfile_path: Optional[str] = None
+    timeout: Optional[float] = None
+
+
+# Reads a stream to its end, keeping only the last STDERR_TAIL_SIZE bytes
+async def _read_tail(stream):
+    tail = bytearray()
+    while chunk := await stream.read(STDERR_TAIL_SIZE):
+        tail += chunk
+        del tail[:-STDERR_TAIL_SIZE]
+    return bytes(tail)
+
+
+async def _kill(processes):
+    for process in processes:
+        if process.returncode is None:
+            process.kill()
+    for process in processes:
+        await process.wait()
+
+
+# Starts the stages of a pipeline connected by OS pipes, so that data flows
+# between them without passing through Python and a slow stage blocks the
+# stages feeding it
+async def _start(cmds, outfile):
+    processes, stdin = [], None
+    try:
+        for i, cmd in enumerate(cmds):
+            if i == len(cmds) - 1:
+                read_end, stdout = None, outfile
+            else:
+                read_end, stdout = os.pipe()
+                enlarge_pipe(read_end)
+            try:
+                processes.append(
+                    await asyncio.create_subprocess_exec(
+                        *cmd, stdin=stdin, stdout=stdout, stderr=subprocess.PIPE
+                    )
+                )
+            except BaseException:
+                if read_end is not None:
+                    os.close(read_end)
+                raise
+            finally:
+                # The stages started hold their own copies of the pipe ends
+                if stdin is not None:
+                    os.close(stdin)
+                    stdin = None
+                if read_end is not None:
+                    os.close(stdout)
+            stdin = read_end
+    except BaseException:
+        if stdin is not None:
+            os.close(stdin)
+        await _kill(processes)
+        raise
+    return processes
+
+
+async def run_pipeline_async(pipeline, verbose=True) -> List[bytes]:
+    """Runs the commands of a pipeline connected by pipes, writing the output
+    of the last one to the pipeline's output file, if any. As soon as one
+    stage fails, the pipeline times out or the calling task is cancelled,
+    all stages are killed. Returns the standard error of every stage, which
+    is also echoed once the pipeline finished so that the messages of
+    concurrent pipelines do not interleave"""
+    cmds = pipeline.cmds
+    if verbose:
+        print_command(" | ".join(" ".join(cmd) for cmd in cmds))
+
+    if pipeline.outfile_path is None:
+        processes = await _start(cmds, None)
+    else:
+        with open(pipeline.outfile_path, "wb") as outfile:
+            processes = await _start(cmds, outfile)
+
+    stderr_tasks = [asyncio.ensure_future(_read_tail(p.stderr)) for p in processes]
+    waits = {asyncio.ensure_future(p.wait()): i for i, p in enumerate(processes)}
+    deadline = None
+    if pipeline.timeout is not None:
+        deadline = time.monotonic() + pipeline.timeout
+
+    failed, timed_out, running = None, False, []
+    try:
+        pending = set(waits)
+        while pending and failed is None:
+            remaining = None
+            if deadline is not None:
+                remaining = max(0, deadline - time.monotonic())
+            done, pending = await asyncio.wait(
+                pending, timeout=remaining, return_when=asyncio.FIRST_COMPLETED
+            )
+            if not done:
+                timed_out = True
+                break
+            for task in done:
+                index = waits[task]
+                if stage_failed(processes[index].returncode, index, len(processes)):
+                    failed = index
+                    break
+    finally:
+        running = [p for p in processes if p.returncode is None]
+        await _kill(running)
+        stderr = await asyncio.gather(*stderr_tasks)
+        for message in stderr:
+            sys.stderr.write(message.decode(errors="replace"))
+
+    if timed_out:
+        raise subprocess.TimeoutExpired(
+            " | ".join(" ".join(cmd) for cmd in cmds), pipeline.timeout
+        )
+    if failed is not None:
+        index = blame_stage(processes, running, failed)
+        raise subprocess.CalledProcessError(
+            processes[index].returncode, cmds[index], stderr=stderr[index]
+        )
+    return stderr
+
+
+def _run_in_group(job, group):
+    with process_group(group):
+        return job()
+
+
+async def _run_tasks(tasks, max_concurrency, on_done, verbose):
+    semaphore = asyncio.Semaphore(max_concurrency)
+    group = ProcessGroup()
+    loop = asyncio.get_running_loop()
+
+    async def run(index, task):
+        async with semaphore:
+            if isinstance(task, Pipeline):
+                result = await run_pipeline_async(task, verbose)
+            elif inspect.iscoroutinefunction(task):
+                result = await task()
+            else:
+                result = await loop.run_in_executor(threads, _run_in_group, task, group)
+        if on_done is not None:
+            on_done(index)
+        return result
+
+    with ThreadPoolExecutor(max_workers=max_concurrency) as threads:
+        futures = [asyncio.ensure_future(run(i, t)) for i, t in enumerate(tasks)]
+        try:
+            return await asyncio.gather(*futures)
+        except BaseException:
+            # Jobs already running on a thread cannot be cancelled, but they
+            # fail fast once their commands are killed
+            for future in futures:
+                future.cancel()
+            group.kill()
+            await asyncio.gather(*futures, return_exceptions=True)
+            raise
+
+
+def run_tasks(tasks, max_concurrency, on_done=None, verbose=True):
+    """Runs pipelines and jobs, i.e. functions without arguments, from a
+    single event loop, at most max_concurrency of them at a time, so that
+    neither kind waits for the other. Pipelines and coroutine functions,
+    e.g. wrapping run_pipeline_async, are driven by the event loop itself,
+    other jobs run on a thread each. on_done is called with the
+    index of every task that succeeded. The first failure cancels all other
+    tasks, kills their commands and is re-raised. Returns the standard
+    error of the stages of every pipeline and the result of every job"""
+    return asyncio.run(_run_tasks(tasks, max_concurrency, on_done, verbose))
+
+
+def run_pipelines(pipelines, max_concurrency, on_done=None, verbose=True):
+    """Runs many pipelines from a single event loop, at most max_concurrency
+    of them at a time, see run_tasks. Returns the standard error of the
+    stages of every pipeline"""
+    return run_tasks(pipelines, max_concurrency, on_done, verbose)
@@ -0,0 +1,262 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2024, QIIME 2 development team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file LICENSE, distributed with this software.
+# ----------------------------------------------------------------------------
+import collections
+import functools
+from typing import List, NamedTuple
+
+import numpy as np
+
+# Error probability of every Phred+33 encoded quality character
+ERROR_PROBABILITIES = 10 ** (-np.maximum(np.arange(256) - 33, 0) / 10)
+
+# Amount of decompressed data parsed into one batch of records
+BATCH_SIZE = 16 * 1024**2
+
+# Policies for paired-end reads in which only one mate passes the filters
+PAIR_POLICIES = ("both", "either")
+
+
+class Batch(NamedTuple):
+    headers: List[bytes]
+    seqs: List[bytes]
+    quals: List[bytes]
+
+    def __len__(self):
+        return len(self.headers)
+
+    def slice(self, start, stop=None):
+        return Batch(
+            self.headers[start:stop], self.seqs[start:stop], self.quals[start:stop]
+        )
+
+
+def _to_batch(lines, n_records):
+    n_lines = 4 * n_records
+    headers = lines[0:n_lines:4]
+    if not all(header[:1] == b"@" for header in headers):
+        raise ValueError("Invalid FASTQ file: a record does not start with '@'.")
+    return Batch(headers, lines[1:n_lines:4], lines[3:n_lines:4])
+
+
+# Yields the records of FASTQ data given as an iterable of byte strings in
+# batches, parsing whole chunks at once rather than line by line
+def parse_batches(chunks):
+    remainder = b""
+    for chunk in chunks:
+        data = remainder + chunk
+        if b"\r" in data:
+            data = data.replace(b"\r\n", b"\n")
+        lines = data.split(b"\n")
+
+        # The last line may be incomplete and is kept for the next chunk
+        n_records = (len(lines) - 1) // 4
+        remainder = b"\n".join(lines[4 * n_records :])
+        if n_records:
+            yield _to_batch(lines, n_records)
+
+    lines = remainder.split(b"\n")
+    if lines[-1] == b"":
+        lines.pop()
+    if len(lines) % 4:
+        raise ValueError("Truncated FASTQ file: the last record is incomplete.")
+    if lines:
+        yield _to_batch(lines, len(lines) // 4)
+
+
+# Yields the records of a binary FASTQ file handle in batches
+def read_batches(fh, batch_size=BATCH_SIZE):
+    return parse_batches(iter(functools.partial(fh.read, batch_size), b""))
+
+
+# Yields record-aligned chunks of about chunk_size bytes of a binary FASTQ
+# file handle without parsing the records. A chunk ends after the last
+# complete record, i.e. after a number of lines divisible by four
+def read_chunks(fh, chunk_size=BATCH_SIZE):
+    remainder = b""
+    while True:
+        chunk = fh.read(chunk_size)
+        if not chunk:
+            if remainder:
+                yield remainder
+            return
+
+        data = remainder + chunk
+        end = len(data)
+        for _ in range(data.count(b"\n") % 4 + 1):
+            end = data.rfind(b"\n", 0, end)
+        # With no complete record in data, end is -1 and nothing is yielded
+        if end >= 0:
+            yield data[: end + 1]
+        remainder = data[end + 1 :]
+
+
+# Read name without the leading "@", the description and a "/1" or "/2" mate
+# suffix, i.e. the part both mates of a pair share
+def read_id(header):
+    name = header[1:].split(maxsplit=1)[0] if len(header) > 1 else b""
+    return name[:-2] if name[-2:] in (b"/1", b"/2") else name
+
+
+# Average Phred quality of every read computed the same way as chopper does,
+# i.e. from the mean error probability of its bases. The quality strings of
+# the whole batch are decoded at once and summed up per read
+def mean_qualities(quals) -> np.ndarray:
+    lengths = np.fromiter(map(len, quals), dtype=np.int64, count=len(quals))
+    qualities = np.zeros(len(quals))
+    nonempty = lengths > 0
+    if nonempty.any():
+        codes = np.frombuffer(b"".join(quals), dtype=np.uint8)
+        starts = (np.cumsum(lengths) - lengths)[nonempty]
+        probability_sums = np.add.reduceat(ERROR_PROBABILITIES[codes], starts)
+        qualities[nonempty] = -10 * np.log10(probability_sums / lengths[nonempty])
+    return qualities
+
+
+# Checks which reads of a batch pass chopper's filters. As in chopper, the
+# length and quality filters apply to the reads before cropping and reads
+# not longer than the cropped regions are discarded. The mean qualities of
+# the reads are computed unless given
+def filter_mask(
+    batch,
+    quality,
+    maxqual,
+    minlength,
+    maxlength,
+    headcrop,
+    tailcrop,
+    qualities=None,
+) -> np.ndarray:
+    lengths = np.fromiter(map(len, batch.seqs), dtype=np.int64, count=len(batch))
+    mask = (
+        (lengths > headcrop + tailcrop)
+        & (lengths >= minlength)
+        & (lengths <= maxlength)
+    )
+    if mask.any():
+        if qualities is None:
+            qualities = mean_qualities(batch.quals)
+        mask &= (qualities >= quality) & (qualities <= maxqual)
+    return mask
+
+
+# Selects reads of a batch, cropping those that are longer than the cropped
+# regions
+def select_records(batch, indices, headcrop, tailcrop) -> Batch:
+    selected = Batch([], [], [])
+    for i in indices:
+        seq, qual = batch.seqs[i], batch.quals[i]
+        if len(seq) > headcrop + tailcrop:
+            end = len(seq) - tailcrop
+            seq, qual = seq[headcrop:end], qual[headcrop:end]
+        selected.headers.append(batch.headers[i])
+        selected.seqs.append(seq)
+        selected.quals.append(qual)
+    return selected
+
+
+def _to_fastq(batch) -> bytes:
+    lines = []
+    for header, seq, qual in zip(*batch):
+        lines += (header, seq, b"+", qual)
+    if lines:
+        lines.append(b"")
+    return b"\n".join(lines)
+
+
+# Formats the selected reads of a batch as FASTQ, cropping those that are
+# longer than the cropped regions
+def format_records(batch, indices, headcrop, tailcrop) -> bytes:
+    return _to_fastq(select_records(batch, indices, headcrop, tailcrop))
+
+
+# Formats the records of a batch as FASTQ with their read names prefixed
+# by an integer tag, e.g. to tell apart reads of different samples after
+# streaming them through a single command
+def tag_records(batch, tag) -> bytes:
+    prefix = b"@%d|" % tag
+    headers = [prefix + header[1:] for header in batch.headers]
+    tagged = Batch(headers, batch.seqs, batch.quals)
+    return format_records(tagged, range(len(batch)), 0, 0)
+
+
+# Groups the records of a batch tagged by tag_records by their tag and
+# formats them as FASTQ without the tags
+def split_tagged(batch) -> dict:
+    lines = collections.defaultdict(list)
+    for header, seq, qual in zip(*batch):
+        tag, _, header = header[1:].partition(b"|")
+        lines[int(tag)] += (b"@" + header, seq, b"+", qual)
+    return {tag: b"\n".join(tag_lines) + b"\n" for tag, tag_lines in lines.items()}
+
+
+# Filters the reads of a FASTQ file handle with chopper's filters and writes
+# the ones passing them to fh_out. If given, the reads before and after
+# filtering are added to the statistics of the (input, filtered) pair 'stats'
+def filter_reads(fh_in, fh_out, stats=None, **filters):
+    headcrop, tailcrop = filters["headcrop"], filters["tailcrop"]
+    for batch in read_batches(fh_in):
+        indices = np.flatnonzero(filter_mask(batch, **filters))
+        selected = select_records(batch, indices, headcrop, tailcrop)
+        if stats is not None:
+            stats[0].add(batch)
+            stats[1].add(selected)
+        fh_out.write(_to_fastq(selected))
+
+
+# Yields equally long batches of the forward and reverse reads
+def _paired_batches(fwd_in, rev_in):
+    fwd_batches, rev_batches = read_batches(fwd_in), read_batches(rev_in)
+    fwd, rev = Batch([], [], []), Batch([], [], [])
+    while True:
+        if not len(fwd):
+            fwd = next(fwd_batches, fwd)
+        if not len(rev):
+            rev = next(rev_batches, rev)
+        if not len(fwd) and not len(rev):
+            return
+        if not len(rev):
+            raise ValueError("The reverse reads file has fewer reads.")
+        if not len(fwd):
+            raise ValueError("The forward reads file has fewer reads.")
+
+        n = min(len(fwd), len(rev))
+        yield fwd.slice(0, n), rev.slice(0, n)
+        fwd, rev = fwd.slice(n), rev.slice(n)
+
+
+# Filters the mates of paired-end reads together in a single pass, so that
+# both outputs stay in sync. With the "both" policy a pair is kept only if
+# both mates pass the filters, with "either" if at least one of them does.
+# Statistics are collected as in filter_reads, over the reads of both mates
+def filter_pairs(fwd_in, rev_in, fwd_out, rev_out, policy, stats=None, **filters):
+    if policy not in PAIR_POLICIES:
+        raise ValueError(f"Unknown pair policy {policy!r}.")
+    headcrop, tailcrop = filters["headcrop"], filters["tailcrop"]
+
+    for fwd, rev in _paired_batches(fwd_in, rev_in):
+        for fwd_header, rev_header in zip(fwd.headers, rev.headers):
+            if read_id(fwd_header) != read_id(rev_header):
+                raise ValueError(
+                    "The forward and reverse reads are not in the same order: "
+                    f"{fwd_header.decode()!r} is paired with "
+                    f"{rev_header.decode()!r}."
+                )
+
+        fwd_mask, rev_mask = filter_mask(fwd, **filters), filter_mask(rev, **filters)
+        if policy == "both":
+            indices = np.flatnonzero(fwd_mask & rev_mask)
+        else:
+            indices = np.flatnonzero(fwd_mask | rev_mask)
+        fwd_selected = select_records(fwd, indices, headcrop, tailcrop)
+        rev_selected = select_records(rev, indices, headcrop, tailcrop)
+        if stats is not None:
+            for mate, selected in ((fwd, fwd_selected), (rev, rev_selected)):
+                stats[0].add(mate)
+                stats[1].add(selected)
+        fwd_out.write(_to_fastq(fwd_selected))
+        rev_out.write(_to_fastq(rev_selected))
@@ -0,0 +1,64 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2024, QIIME 2 development team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file LICENSE, distributed with this software.
+# ----------------------------------------------------------------------------
+import gzip
+import shutil
+import zlib
+
+# Errors raised while reading a truncated or corrupt gzipped file, extended
+# by those of the backend below
+GZIP_ERRORS = (EOFError, gzip.BadGzipFile, zlib.error)
+
+# Fastest available gzip implementation for in-process decompression:
+# ISA-L, then zlib-ng, then the standard library's zlib
+try:
+    from isal import igzip as gzip_backend
+    from isal import isal_zlib
+
+    GZIP_ERRORS += (isal_zlib.error,)
+except ImportError:
+    try:
+        from zlib_ng import gzip_ng as gzip_backend
+        from zlib_ng import zlib_ng
+
+        GZIP_ERRORS += (zlib_ng.error,)
+    except ImportError:
+        import gzip as gzip_backend
+
+
+# Fastest available gzip implementation for in-process compression. ISA-L
+# is left out as it only supports compression levels 0-3
+try:
+    from zlib_ng import gzip_ng as compression_backend
+except ImportError:
+    import gzip as compression_backend
+
+
+# Opens a gzipped file for reading decompressed bytes in-process
+def open_gzip(path):
+    return gzip_backend.open(path, "rb")
+
+
+# Compresses data in-process into a single gzip member. Members compressed
+# separately can be concatenated into one valid gzip file
+def compress(data, level=6) -> bytes:
+    return compression_backend.compress(data, compresslevel=level)
+
+
+# Checks whether pigz, a multithreaded drop-in replacement for gzip,
+# is available
+def parallel_compression_available() -> bool:
+    return shutil.which("pigz") is not None
+
+
+# Generates the command compressing the trimmed reads. pigz writes a regular
+# gzip stream using several threads; plain gzip is used when only one thread
+# is requested or pigz is not installed
+def construct_compression_command(level: int = 6, threads: int = 1) -> list:
+    if threads > 1 and parallel_compression_available():
+        return ["pigz", "-c", f"-{level}", "-p", str(threads)]
+    return ["gzip", "-c", f"-{level}"]
@@ -0,0 +1,101 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2024, QIIME 2 development team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file LICENSE, distributed with this software.
+# ----------------------------------------------------------------------------
+import numpy as np
+import pyarrow as pa
+
+from q2_long_reads_qc._fastq import filter_mask, mean_qualities, read_id
+from q2_long_reads_qc._stats import NanoStats, scan_reads
+
+# Columns of the per-read metrics. 'mate' is 1 for single-end and forward
+# reads and 2 for reverse reads, and 'passed' tells whether a read passes
+# the trimming filters the metrics were computed with
+READ_METRICS_SCHEMA = pa.schema(
+    [
+        ("read_id", pa.string()),
+        ("mate", pa.uint8()),
+        ("length", pa.int64()),
+        ("mean_quality", pa.float64()),
+        ("gc_fraction", pa.float32()),
+        ("passed", pa.bool_()),
+    ]
+)
+
+# Whether every byte is a G or C base, in either case
+GC_BASES = np.zeros(256, dtype=bool)
+GC_BASES[list(b"GCgc")] = True
+
+
+# Fraction of G and C bases of every read. The sequences of the whole batch
+# are decoded at once and counted per read
+def gc_fractions(seqs) -> np.ndarray:
+    lengths = np.fromiter(map(len, seqs), dtype=np.int64, count=len(seqs))
+    fractions = np.zeros(len(seqs))
+    nonempty = lengths > 0
+    if nonempty.any():
+        codes = np.frombuffer(b"".join(seqs), dtype=np.uint8)
+        starts = (np.cumsum(lengths) - lengths)[nonempty]
+        gc_counts = np.add.reduceat(GC_BASES[codes].astype(np.int64), starts)
+        fractions[nonempty] = gc_counts / lengths[nonempty]
+    return fractions
+
+
+class ReadMetricsWriter:
+    """Writes the metrics of every read of a stream, batch by batch, as
+    record batches of an Arrow IPC file. The reads are checked against the
+    given trimming filters"""
+
+    def __init__(self, writer, mate, filters):
+        self.writer = writer
+        self.mate = mate
+        self.filters = filters
+
+    def add(self, batch):
+        if not len(batch):
+            return
+        lengths = np.fromiter(map(len, batch.seqs), dtype=np.int64, count=len(batch))
+        qualities = mean_qualities(batch.quals)
+        columns = [
+            pa.array(
+                [read_id(h).decode(errors="replace") for h in batch.headers],
+                pa.string(),
+            ),
+            pa.array(np.full(len(batch), self.mate, dtype=np.uint8)),
+            pa.array(lengths),
+            pa.array(qualities),
+            pa.array(gc_fractions(batch.seqs).astype(np.float32)),
+            pa.array(filter_mask(batch, **self.filters, qualities=qualities)),
+        ]
+        self.writer.write_batch(
+            pa.RecordBatch.from_arrays(columns, schema=READ_METRICS_SCHEMA)
+        )
+
+
+# Writes the metrics of the reads of the gzipped FASTQ files of a sample,
+# forward then reverse, to an Arrow IPC file, streaming the reads batch by
+# batch
+def write_read_metrics(files, output_path, filters):
+    with pa.OSFile(str(output_path), "wb") as sink, pa.ipc.new_file(
+        sink, READ_METRICS_SCHEMA
+    ) as writer:
+        for mate, path in enumerate(files, start=1):
+            scan_reads([path], [ReadMetricsWriter(writer, mate, filters)])
+
+
+# NanoStats of the reads in an Arrow IPC file of per-read metrics. The file
+# is memory-mapped, so its columns are read without copying them
+def metrics_nanostats(path) -> NanoStats:
+    stats = NanoStats()
+    with pa.memory_map(str(path)) as source:
+        reader = pa.ipc.open_file(source)
+        for i in range(reader.num_record_batches):
+            batch = reader.get_batch(i)
+            stats.add_reads(
+                batch.column("length").to_numpy(),
+                batch.column("mean_quality").to_numpy(),
+            )
+    return stats
@@ -10,34 +10,341 @@ from q2_types.per_sample_sequences import (
     SequencesWithQuality,
 )
 from q2_types.sample_data import SampleData
-from qiime2.plugin import Int, Range, TypeMatch
+from qiime2.plugin import (
+    Bool,
+    Choices,
+    Collection,
+    Int,
+    List,
+    Range,
+    Str,
+    TypeMatch,
+    Visualization,
+)
+
+from q2_long_reads_qc.types import (
+    NanoStats,
+    ReadMetrics,
+    ReadStats,
+    SequencingSummary,
+)
 
 T = TypeMatch([SequencesWithQuality, PairedEndSequencesWithQuality])
 
 # stats
-stats_inputs = {"sequences": SampleData[T]}
-stats_input_descriptions = {"sequences": "Sequences to be analyzed."}
+stats_inputs = {
+    "sequences": SampleData[T],
+    "read_stats": SampleData[ReadStats],
+    "nanostats": SampleData[NanoStats],
+    "read_metrics": SampleData[ReadMetrics],
+    "sequencing_summary": SampleData[SequencingSummary],
+}
+stats_input_descriptions = {
+    "sequences": "Sequences to be analyzed.",
+    "read_stats": (
+        "Read statistics collected by trim-with-stats, shown instead of "
+        "analyzing the sequences again."
+    ),
+    "nanostats": (
+        "NanoStats computed by compute-nanostats, shown instead of analyzing "
+        "the sequences again."
+    ),
+    "read_metrics": (
+        "Per-read metrics computed by compute-read-metrics, summarized "
+        "instead of analyzing the sequences again."
+    ),
+    "sequencing_summary": (
+        "Sequencing summaries written by the basecaller, one per sample, "
+        "analyzed instead of the sequences. Only the read lengths, mean "
+        "qualities and start times are parsed, which is much faster than "
+        "parsing the reads, and the report adds the yield over time."
+    ),
+}
+stats_parameters = {
+    "plots": Bool,
+    "threads": Int % Range(1, None) | Str % Choices(["auto"]),
+    "parallel_samples": Int % Range(1, None),
+    "subsample": Int % Range(0, None),
+    "random_seed": Int % Range(0, None),
+    "preset": Str % Choices(["full", "fast"]),
+    "static_plots": Bool,
+    "only_report": Bool,
+    "drop_outliers": Bool,
+    "maxlength": Int % Range(1, None),
+    "raw_data": Bool,
+    "bivariate_plots": List[Str % Choices(["kde", "dot"])],
+    "binned_plots": Bool,
+}
+stats_parameter_descriptions = {
+    "plots": (
+        "Run NanoPlot to plot the sequences. Otherwise, only NanoPlot's "
+        "summary statistics are computed, streaming the reads in constant "
+        "memory, which is much faster and scales to large runs."
+    ),
+    "threads": (
+        "Total number of threads shared by the NanoPlot runs, or 'auto' to "
+        "use all available CPUs."
+    ),
+    "parallel_samples": "Number of samples to run NanoPlot on concurrently.",
+    "subsample": (
+        "Run NanoPlot on a uniform random sample of at most this many reads "
+        "of every sample, drawn in a single pass over the reads. The total "
+        "numbers of reads and bases are still counted exactly; all other "
+        "statistics are estimates. 0 runs NanoPlot on all reads. Defaults "
+        "to the preset's value. Sequencing summaries are never subsampled."
+    ),
+    "random_seed": "Seed of the random sampling of reads.",
+    "preset": (
+        "Defaults for the NanoPlot options that are not given explicitly. "
+        "'full' runs NanoPlot on all reads and renders every plot, also as "
+        "static images. 'fast' renders only the interactive report of a "
+        "random sample of 100,000 reads per sample, skipping the slow static "
+        "image rendering."
+    ),
+    "static_plots": (
+        "Render static images of the plots in addition to the interactive "
+        "ones. Rendering them is the slowest part of a NanoPlot run."
+    ),
+    "only_report": "Only create the report, without saving the individual plots.",
+    "drop_outliers": "Drop reads with outlying lengths from the plots.",
+    "maxlength": "Hide reads longer than this from the plots.",
+    "raw_data": (
+        "Store the per-read data NanoPlot extracted as a TSV file in the "
+        "visualization."
+    ),
+    "bivariate_plots": (
+        "Types of NanoPlot's bivariate plots, e.g. of length vs quality. "
+        "These have one point per read, so with binned plots they are only "
+        "made if given explicitly, e.g. kde plots of a subsample."
+    ),
+    "binned_plots": (
+        "Plot read lengths vs mean qualities as 2-D histograms computed from "
+        "all reads in-process, instead of NanoPlot's plots with one point per "
+        "read. Their size does not depend on the number of reads. Defaults "
+        "to plotting them only when subsampling, which streams all reads "
+        "anyway; otherwise computing them means parsing the reads a second "
+        "time next to NanoPlot."
+    ),
+}
 
 # trim
 trim_inputs = {"query_reads": SampleData[T]}
 trim_outputs = [("filtered_query_reads", SampleData[T])]
 trim_parameters = {
-    "threads": Int % Range(1, None),
+    "threads": Int % Range(1, None) | Str % Choices(["auto"]),
+    "parallel_samples": Int % Range(1, None),
     "quality": Int % Range(0, None),
     "maxqual": Int % Range(0, None),
     "minlength": Int % Range(1, None),
     "maxlength": Int % Range(1, None),
     "headcrop": Int % Range(0, None),
     "tailcrop": Int % Range(0, None),
+    "compression_level": Int % Range(1, 10),
+    "pair_policy": Str % Choices(["independent", "both", "either"]),
+    "engine": Str % Choices(["chopper", "native"]),
+    "shard_threshold": Int % Range(0, None),
+    "batch_threshold": Int % Range(0, None),
+    "cache_dir": Str,
+    "cache_size": Int % Range(1, None),
+    "timeout": Int % Range(0, None),
 }
 trim_input_descriptions = {"query_reads": "Sequences to be trimmed."}
 trim_output_descriptions = {"filtered_query_reads": "The resulting trimmed sequences."}
 trim_parameter_descriptions = {
-    "threads": "Number of threads.",
+    "threads": (
+        "Total number of threads available for trimming. They are split "
+        "between concurrently processed files and the decompression, "
+        "chopper and compression stages of each file. Use 'auto' to detect "
+        "the CPUs available to this process (respecting CPU affinity and "
+        "cgroup quotas)."
+    ),
+    "parallel_samples": (
+        "Maximum number of FASTQ files trimmed concurrently. The actual "
+        "number may be lower if the thread budget or the available memory "
+        "does not allow for that many concurrent pipelines."
+    ),
     "quality": "Sets a minimum Phred average quality score.",
     "maxqual": "Sets a maximum Phred average quality score.",
     "minlength": "Sets a minimum read length.",
     "maxlength": "Sets a maximum read length.",
     "headcrop": "Trim N nucleotides from the start of a read.",
     "tailcrop": "Trim N nucleotides from the end of a read.",
+    "compression_level": (
+        "Compression level of the trimmed FASTQ files, from 1 (fastest) to "
+        "9 (smallest files). The files are compressed with pigz using "
+        "multiple threads if it is installed."
+    ),
+    "pair_policy": (
+        "How the mates of paired-end reads are filtered. 'independent' runs "
+        "chopper on the forward and reverse reads separately, so the two "
+        "files may fall out of sync. 'both' and 'either' stream both files "
+        "together in a single pass and keep a pair only if both mates pass "
+        "the filters or if at least one of them does, respectively. Ignored "
+        "for single-end reads."
+    ),
+    "engine": (
+        "Trimming engine. 'chopper' runs the chopper tool on every file; "
+        "'native' applies the same filters in-process using vectorized "
+        "NumPy operations, which avoids starting external processes and "
+        "does not require chopper to be installed."
+    ),
+    "shard_threshold": (
+        "Size in MB above which a compressed FASTQ file is split into "
+        "record-aligned shards that are trimmed in parallel using all "
+        "threads; the trimmed shards are written back in their original "
+        "order. Such files are processed one after another once all other "
+        "files are done. Paired-end reads filtered together are never "
+        "sharded. Use 0 to disable sharding."
+    ),
+    "batch_threshold": (
+        "Size in MB below which compressed FASTQ files are trimmed in "
+        "batches: the reads of many small files are streamed through a "
+        "single chopper process and split back into per-file outputs, "
+        "which saves starting separate processes for every file. Only used "
+        "with the chopper engine. Use 0 to disable batching."
+    ),
+    "cache_dir": (
+        "Directory of an on-disk cache of trimmed files, e.g. on a fast "
+        "node-local disk. Files that were trimmed before with the same "
+        "parameters and chopper version are reused from the cache instead "
+        "of being trimmed again, which also lets a failed run resume where "
+        "it stopped. No cache is used if not provided."
+    ),
+    "cache_size": (
+        "Maximum size of the cache in MB. The least recently used files are "
+        "removed from the cache once it grows beyond this size."
+    ),
+    "timeout": (
+        "Maximum time in seconds the commands trimming and compressing a "
+        "single FASTQ file may run, or the two files of a paired-end sample "
+        "filtered together. Files trimmed in a batch share a limit of this "
+        "many seconds per file, the shards of a large file share the limit "
+        "of their file. The time spent filtering reads in-process with the "
+        "native engine is only bounded through its compressor. Hung "
+        "processes are killed once the limit is exceeded and the action "
+        "fails. Use 0 for no limit."
+    ),
+}
+
+# trim with stats: the parameters of trim, collecting read statistics on the way
+trim_with_stats_outputs = [
+    ("filtered_query_reads", SampleData[T]),
+    ("read_stats", SampleData[ReadStats]),
+]
+trim_with_stats_parameters = trim_parameters
+trim_with_stats_output_descriptions = {
+    **trim_output_descriptions,
+    "read_stats": (
+        "Number of reads and bases, N50 and the distributions of read "
+        "lengths and mean qualities of every sample before and after "
+        "trimming."
+    ),
+}
+trim_with_stats_parameter_descriptions = trim_parameter_descriptions
+
+# partition and collate
+partition_reads_inputs = {"reads": SampleData[T]}
+partition_reads_outputs = [("partitioned_reads", Collection[SampleData[T]])]
+partition_reads_parameters = {"num_partitions": Int % Range(1, None)}
+partition_reads_input_descriptions = {"reads": "Sequences to be partitioned."}
+partition_reads_output_descriptions = {
+    "partitioned_reads": "The sequences split into partitions of samples."
+}
+partition_reads_parameter_descriptions = {
+    "num_partitions": (
+        "Number of partitions to split the samples into. Every sample gets "
+        "its own partition if not provided."
+    )
+}
+collate_reads_inputs = {"reads": Collection[SampleData[T]]}
+collate_reads_outputs = [("collated_reads", SampleData[T])]
+collate_reads_input_descriptions = {"reads": "Partitions of sequences to collate."}
+collate_reads_output_descriptions = {
+    "collated_reads": "The sequences of all partitions."
+}
+
+# trim partitioned: trim with every partition of samples trimmed separately
+trim_partitioned_parameters = {
+    **partition_reads_parameters,
+    **trim_parameters,
+}
+trim_partitioned_parameter_descriptions = {
+    "num_partitions": (
+        "Number of partitions the samples are split into, each trimmed by a "
+        "separate trim action that QIIME 2's parallel executor can run on a "
+        "different worker. Every sample gets its own partition if not "
+        "provided."
+    ),
+    **trim_parameter_descriptions,
+    "threads": (
+        "Total number of threads available for trimming a single partition. "
+        "Use 'auto' to detect the CPUs available to the worker trimming it."
+    ),
+}
+
+# compute and collate NanoStats
+compute_nanostats_inputs = {"sequences": SampleData[T]}
+compute_nanostats_outputs = [("nanostats", SampleData[NanoStats])]
+compute_nanostats_input_descriptions = {"sequences": "Sequences to be analyzed."}
+compute_nanostats_output_descriptions = {
+    "nanostats": (
+        "Number of reads and bases, extremes and fixed-bin histograms of the "
+        "read lengths and mean qualities of every sample."
+    )
+}
+collate_nanostats_inputs = {"nanostats": Collection[SampleData[NanoStats]]}
+collate_nanostats_outputs = [("collated_nanostats", SampleData[NanoStats])]
+collate_nanostats_input_descriptions = {"nanostats": "NanoStats to collate."}
+collate_nanostats_output_descriptions = {
+    "collated_nanostats": (
+        "NanoStats of all samples. Those of a sample present in several "
+        "inputs are merged."
+    )
+}
+
+# stats partitioned: NanoStats of every partition of samples, visualized
+# together
+stats_partitioned_inputs = {"sequences": SampleData[T]}
+stats_partitioned_outputs = [("visualization", Visualization)]
+stats_partitioned_input_descriptions = {"sequences": "Sequences to be analyzed."}
+stats_partitioned_parameters = partition_reads_parameters
+stats_partitioned_parameter_descriptions = {
+    "num_partitions": (
+        "Number of partitions the samples are split into, the NanoStats of "
+        "each computed by a separate action that QIIME 2's parallel executor "
+        "can run on a different worker. Every sample gets its own partition "
+        "if not provided."
+    )
+}
+stats_partitioned_output_descriptions = {
+    "visualization": "NanoStats of every sample and of all samples together."
+}
+
+# compute read metrics: the filters of trim the reads are checked against
+COMPUTE_READ_METRICS_FILTERS = (
+    "quality",
+    "maxqual",
+    "minlength",
+    "maxlength",
+    "headcrop",
+    "tailcrop",
+)
+compute_read_metrics_inputs = {"sequences": SampleData[T]}
+compute_read_metrics_outputs = [("read_metrics", SampleData[ReadMetrics])]
+compute_read_metrics_input_descriptions = {"sequences": "Sequences to be analyzed."}
+compute_read_metrics_output_descriptions = {
+    "read_metrics": (
+        "Read id, mate, length, mean quality, GC fraction and whether it "
+        "passes the filters of every read, as an Arrow IPC file per sample."
+    )
+}
+compute_read_metrics_parameters = {
+    "parallel_samples": Int % Range(1, None),
+    **{name: trim_parameters[name] for name in COMPUTE_READ_METRICS_FILTERS},
+}
+compute_read_metrics_parameter_descriptions = {
+    "parallel_samples": "Number of samples processed concurrently.",
+    **{
+        name: trim_parameter_descriptions[name] for name in COMPUTE_READ_METRICS_FILTERS
+    },
 }
@@ -0,0 +1,224 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2024, QIIME 2 development team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file LICENSE, distributed with this software.
+# ----------------------------------------------------------------------------
+import math
+import os
+from typing import NamedTuple, Tuple
+
+# Rough memory footprint of one trimming pipeline: a fixed part for the
+# decompression/compression stages and pipe buffers plus a per-thread part
+# for the read batches chopper keeps in flight
+WORKER_BASE_MEMORY = 256 * 1024**2
+THREAD_MEMORY = 64 * 1024**2
+
+# Files reporting "no limit" in cgroup v1 contain a huge number instead
+_CGROUP_V1_UNLIMITED = 2**60
+
+# Mount points of the cgroup v2 hierarchy and of the v1 controllers
+_CGROUP_ROOT = "/sys/fs/cgroup"
+_CGROUP_V1_CPU = "/sys/fs/cgroup/cpu"
+_CGROUP_V1_MEMORY = "/sys/fs/cgroup/memory"
+
+
+class ThreadPlan(NamedTuple):
+    workers: int
+    chopper_threads: int
+    compression_threads: int
+
+
+class ShardPlan(NamedTuple):
+    workers: int
+    window: int
+
+
+def _read_first_line(path):
+    try:
+        with open(path) as fh:
+            return fh.readline().strip()
+    except OSError:
+        return None
+
+
+def _read_lines(path):
+    try:
+        with open(path) as fh:
+            return fh.read().splitlines()
+    except OSError:
+        return []
+
+
+# Paths of the cgroups of this process within their hierarchies, from
+# /proc/self/cgroup: the v2 one under "", the v1 ones under the names of
+# their controllers, e.g. "cpu" or "memory"
+def _own_cgroups() -> dict:
+    cgroups = {}
+    for line in _read_lines("/proc/self/cgroup"):
+        parts = line.split(":", 2)
+        if len(parts) == 3:
+            for controller in parts[1].split(","):
+                cgroups[controller] = parts[2]
+    return cgroups
+
+
+# Directories of the cgroup at 'path' of the hierarchy mounted at 'mount'
+# and of all of its ancestors. Batch systems like SLURM set the limits of a
+# job on such a nested cgroup rather than on the root one
+def _cgroup_dirs(mount, path):
+    path = path.strip("/")
+    dirs = [mount]
+    while path:
+        dirs.append(os.path.join(mount, path))
+        path = os.path.dirname(path)
+    return dirs
+
+
+# Number of CPUs given by the smallest cgroup CPU quota (v2, then v1) of
+# the cgroup of this process and its ancestors, if any
+def _cgroup_cpu_quota():
+    cgroups = _own_cgroups()
+    quotas = []
+    for directory in _cgroup_dirs(_CGROUP_ROOT, cgroups.get("", "/")):
+        cpu_max = _read_first_line(os.path.join(directory, "cpu.max"))
+        if cpu_max:
+            quota, _, period = cpu_max.partition(" ")
+            if quota != "max" and period:
+                quotas.append(math.ceil(int(quota) / int(period)))
+
+    for directory in _cgroup_dirs(_CGROUP_V1_CPU, cgroups.get("cpu", "/")):
+        quota = _read_first_line(os.path.join(directory, "cpu.cfs_quota_us"))
+        period = _read_first_line(os.path.join(directory, "cpu.cfs_period_us"))
+        if quota and period and int(quota) > 0:
+            quotas.append(math.ceil(int(quota) / int(period)))
+    return min(quotas) if quotas else None
+
+
+# Number of CPUs this process may actually use, taking the affinity mask
+# and cgroup CPU quotas (e.g. containers or SLURM allocations) into account
+def available_cpus() -> int:
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+
+    quota = _cgroup_cpu_quota()
+    if quota:
+        cpus = min(cpus, quota)
+    return max(1, cpus)
+
+
+# Memory in bytes available to this process: the smallest of the memory
+# limits of its cgroup and their ancestors and the available system memory.
+# None if it is unknown
+def available_memory():
+    limits = []
+
+    # The smallest limit of the cgroup of this process and its ancestors
+    cgroups = _own_cgroups()
+    cgroup_files = [
+        os.path.join(directory, "memory.max")
+        for directory in _cgroup_dirs(_CGROUP_ROOT, cgroups.get("", "/"))
+    ] + [
+        os.path.join(directory, "memory.limit_in_bytes")
+        for directory in _cgroup_dirs(_CGROUP_V1_MEMORY, cgroups.get("memory", "/"))
+    ]
+    for cgroup_file in cgroup_files:
+        cgroup_limit = _read_first_line(cgroup_file)
+        if cgroup_limit and cgroup_limit != "max":
+            if int(cgroup_limit) < _CGROUP_V1_UNLIMITED:
+                limits.append(int(cgroup_limit))
+
+    try:
+        with open("/proc/meminfo") as fh:
+            for line in fh:
+                if line.startswith("MemAvailable:"):
+                    limits.append(int(line.split()[1]) * 1024)
+                    break
+    except OSError:
+        pass
+
+    return min(limits) if limits else None
+
+
+# Total number of threads to use: the given number or, for "auto", the
+# number of available CPUs
+def resolve_threads(threads) -> int:
+    return available_cpus() if threads == "auto" else threads
+
+
+def _worker_memory(threads):
+    return WORKER_BASE_MEMORY + threads * THREAD_MEMORY
+
+
+# Splits a total CPU budget between concurrently processed files and the
+# stages of each file's pipeline. Decompression is single-threaded and
+# counts as one thread. With parallel compression, the rest of a worker's
+# share is split between the compressor and chopper, the compressor getting
+# the larger half as it is the slower of the two; otherwise compression
+# takes one thread as well and chopper gets the rest. Without a separate
+# trimmer process, i.e. with the native engine filtering reads in the
+# decompressing thread, no threads are set aside for chopper and parallel
+# compression gets the whole rest. Concurrency is further capped so that
+# the estimated memory footprint fits in 'memory'
+def plan_threads(
+    threads,
+    n_files,
+    parallel_samples,
+    memory=None,
+    parallel_compression=False,
+    trimmer=True,
+) -> ThreadPlan:
+    total = resolve_threads(threads)
+    workers = max(1, min(parallel_samples, n_files, total))
+
+    if memory is None:
+        memory = available_memory()
+    if memory is not None:
+        while workers > 1:
+            trimmer_threads = total // workers if trimmer else 0
+            if workers * _worker_memory(trimmer_threads) <= memory:
+                break
+            workers -= 1
+
+    budget = total // workers - 1
+    if not trimmer:
+        compression_threads = max(1, budget) if parallel_compression else 1
+        return ThreadPlan(workers, 0, compression_threads)
+
+    if parallel_compression:
+        compression_threads = max(1, (budget + 1) // 2)
+    else:
+        compression_threads = 1
+    chopper_threads = max(1, budget - compression_threads)
+    return ThreadPlan(workers, chopper_threads, compression_threads)
+
+
+# Plans the trimming of a large file in shards of shard_size bytes of reads.
+# Every worker compresses the shards it trimmed itself: with a trimmer, it
+# also waits on a single-threaded chopper and takes two threads, with the
+# native engine it filters and compresses in one. At most 'window' shards
+# are in flight, read but not yet written, each holding its reads, the
+# trimmed reads and their compressed form. The window is capped so that
+# they fit in 'memory' and bounds the number of workers in turn
+def plan_shards(threads, shard_size, trimmer=True, memory=None) -> ShardPlan:
+    total = resolve_threads(threads)
+    workers = max(1, total // 2) if trimmer else total
+    window = 2 * workers
+
+    if memory is None:
+        memory = available_memory()
+    if memory is not None:
+        window = max(1, min(window, memory // (3 * shard_size)))
+    return ShardPlan(min(workers, window), window)
+
+
+# Splits a total CPU budget between samples processed concurrently by a
+# single multithreaded tool. Returns the number of concurrent jobs and the
+# threads of each
+def plan_sample_threads(threads, n_samples, parallel_samples) -> Tuple[int, int]:
+    total = resolve_threads(threads)
+    workers = max(1, min(parallel_samples, n_samples, total))
+    return workers, max(1, total // workers)
@@ -0,0 +1,69 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2024, QIIME 2 development team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file LICENSE, distributed with this software.
+# ----------------------------------------------------------------------------
+import numpy as np
+
+from q2_long_reads_qc._fastq import Batch, format_records
+from q2_long_reads_qc._gzip import compress
+from q2_long_reads_qc._stats import scan_reads
+
+
+class Reservoir:
+    """Uniform random sample of at most 'size' reads of a stream, drawn in a
+    single pass with reservoir sampling, along with exact counts of all the
+    reads and bases seen"""
+
+    def __init__(self, size, rng):
+        self.size = size
+        self.rng = rng
+        self.reads = 0
+        self.bases = 0
+        self.headers, self.seqs, self.quals = [], [], []
+
+    def add(self, batch):
+        self.bases += sum(map(len, batch.seqs))
+
+        # Fill the reservoir with the first reads
+        n_fill = min(len(batch), self.size - len(self.headers))
+        if n_fill > 0:
+            self.headers += batch.headers[:n_fill]
+            self.seqs += batch.seqs[:n_fill]
+            self.quals += batch.quals[:n_fill]
+
+        # Every later read, the t-th one counting from 0, replaces a random
+        # read of the reservoir with probability size / (t + 1). Reads
+        # replacing the same slot are applied in order, as in a sequential
+        # pass
+        seen = self.reads + np.arange(n_fill, len(batch))
+        if len(seen) and self.size:
+            slots = self.rng.integers(0, seen + 1)
+            for i in np.flatnonzero(slots < self.size):
+                slot = slots[i]
+                read = n_fill + i
+                self.headers[slot] = batch.headers[read]
+                self.seqs[slot] = batch.seqs[read]
+                self.quals[slot] = batch.quals[read]
+        self.reads += len(batch)
+
+    def to_batch(self) -> Batch:
+        return Batch(self.headers, self.seqs, self.quals)
+
+    # Writes the sampled reads to a gzipped FASTQ file
+    def write(self, output_file):
+        sample = self.to_batch()
+        with open(output_file, "wb") as fh:
+            fh.write(compress(format_records(sample, range(len(sample)), 0, 0)))
+
+
+# Draws a uniform random sample of at most 'size' reads from gzipped FASTQ
+# files, pooled together, and writes it to a gzipped FASTQ file. Returns the
+# exact numbers of reads and bases in the input files
+def subsample_reads(input_files, output_file, size, seed):
+    reservoir = Reservoir(size, np.random.default_rng(seed))
+    scan_reads(input_files, [reservoir])
+    reservoir.write(output_file)
+    return reservoir.reads, reservoir.bases
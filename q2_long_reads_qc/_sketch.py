@@ -0,0 +1,168 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2024, QIIME 2 development team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file LICENSE, distributed with this software.
+# ----------------------------------------------------------------------------
+import numpy as np
+
+
+# Index of the first bin at which the cumulative counts exceed 'target'
+def _bin_at(counts, target) -> int:
+    return int(np.searchsorted(np.cumsum(counts), target, side="right"))
+
+
+# Sparse form of the non-empty bins of a histogram, as {bin index: value}
+def _sparse(values, indices) -> dict:
+    return {str(i): int(values[i]) for i in indices}
+
+
+def _dense(values, sparse):
+    for i, value in sparse.items():
+        values[int(i)] = value
+
+
+class LogHistogram:
+    """Quantile sketch of positive integers such as read lengths, in fixed
+    memory: the number and the sum of the values in logarithmic bins,
+    'bins_per_doubling' of them between every power of two. Quantiles are
+    estimated as the mean value of the bin they fall in, which is within the
+    relative width of a bin of the true quantile, and quantiles weighted by
+    the values themselves, such as the N50, are estimated the same way. As
+    the bins are fixed, sketches with the same bins merge exactly"""
+
+    def __init__(self, bins_per_doubling, max_bits):
+        self.bins_per_doubling = bins_per_doubling
+        self.counts = np.zeros(max_bits * bins_per_doubling + 1, dtype=np.int64)
+        self.sums = np.zeros(max_bits * bins_per_doubling + 1, dtype=np.int64)
+
+    def add(self, values):
+        if not len(values):
+            return
+        bins = np.floor(np.log2(np.maximum(values, 1)) * self.bins_per_doubling)
+        bins = np.minimum(bins.astype(np.int64), len(self.counts) - 1)
+        self.counts += np.bincount(bins, minlength=len(self.counts))
+        self.sums += np.bincount(bins, weights=values, minlength=len(self.sums)).astype(
+            np.int64
+        )
+
+    def merge(self, other):
+        if (self.bins_per_doubling, len(self.counts)) != (
+            other.bins_per_doubling,
+            len(other.counts),
+        ):
+            raise ValueError("Only sketches with the same bins can be merged.")
+        self.counts += other.counts
+        self.sums += other.sums
+        return self
+
+    @property
+    def count(self) -> int:
+        return int(self.counts.sum())
+
+    @property
+    def total(self) -> int:
+        return int(self.sums.sum())
+
+    # Mean of the values in a bin
+    def _bin_value(self, index) -> float:
+        return float(self.sums[index] / self.counts[index])
+
+    # Value below which a fraction q of the values lie
+    def quantile(self, q) -> float:
+        count = self.count
+        if not count:
+            return 0.0
+        return self._bin_value(_bin_at(self.counts, (count - 1) * q))
+
+    # Value such that the values at least this large sum up to a fraction q
+    # of the total, e.g. the N50 of read lengths for q = 0.5
+    def weighted_quantile(self, q) -> float:
+        total = self.total
+        if not total:
+            return 0.0
+        index = _bin_at(self.sums[::-1], (total - 1) * q)
+        return self._bin_value(len(self.sums) - 1 - index)
+
+    # Lower bounds and counts of the non-empty bins
+    def nonzero(self):
+        (indices,) = np.nonzero(self.counts)
+        lower_bounds = np.ceil(2 ** (indices / self.bins_per_doubling)).astype(int)
+        return lower_bounds, self.counts[indices]
+
+    def to_dict(self) -> dict:
+        (indices,) = np.nonzero(self.counts)
+        return {
+            "bins_per_doubling": self.bins_per_doubling,
+            "n_bins": len(self.counts),
+            "counts": _sparse(self.counts, indices),
+            "sums": _sparse(self.sums, indices),
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        sketch = cls(data["bins_per_doubling"], 0)
+        sketch.counts = np.zeros(data["n_bins"], dtype=np.int64)
+        sketch.sums = np.zeros(data["n_bins"], dtype=np.int64)
+        _dense(sketch.counts, data["counts"])
+        _dense(sketch.sums, data["sums"])
+        return sketch
+
+
+class LinearHistogram:
+    """Quantile sketch of values in a bounded range such as mean read
+    qualities, in fixed memory: the number of values in bins of equal width,
+    'bins_per_unit' of them per unit from 0 to 'max_value'. Quantiles are
+    estimated as the centre of the bin they fall in. Sketches with the same
+    bins merge exactly"""
+
+    def __init__(self, bins_per_unit, max_value):
+        self.bins_per_unit = bins_per_unit
+        self.counts = np.zeros(max_value * bins_per_unit + 1, dtype=np.int64)
+
+    def add(self, values):
+        if not len(values):
+            return
+        bins = np.floor(np.asarray(values) * self.bins_per_unit).astype(np.int64)
+        bins = np.clip(bins, 0, len(self.counts) - 1)
+        self.counts += np.bincount(bins, minlength=len(self.counts))
+
+    def merge(self, other):
+        if (self.bins_per_unit, len(self.counts)) != (
+            other.bins_per_unit,
+            len(other.counts),
+        ):
+            raise ValueError("Only sketches with the same bins can be merged.")
+        self.counts += other.counts
+        return self
+
+    @property
+    def count(self) -> int:
+        return int(self.counts.sum())
+
+    def quantile(self, q) -> float:
+        count = self.count
+        if not count:
+            return 0.0
+        return (_bin_at(self.counts, (count - 1) * q) + 0.5) / self.bins_per_unit
+
+    # Lower bounds and counts of the non-empty bins
+    def nonzero(self):
+        (indices,) = np.nonzero(self.counts)
+        return np.round(indices / self.bins_per_unit, 6), self.counts[indices]
+
+    def to_dict(self) -> dict:
+        (indices,) = np.nonzero(self.counts)
+        return {
+            "bins_per_unit": self.bins_per_unit,
+            "n_bins": len(self.counts),
+            "counts": _sparse(self.counts, indices),
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        sketch = cls(data["bins_per_unit"], 0)
+        sketch.counts = np.zeros(data["n_bins"], dtype=np.int64)
+        _dense(sketch.counts, data["counts"])
+        return sketch
@@ -0,0 +1,355 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2024, QIIME 2 development team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file LICENSE, distributed with this software.
+# ----------------------------------------------------------------------------
+import collections
+
+import numpy as np
+
+from q2_long_reads_qc._fastq import mean_qualities, read_batches
+from q2_long_reads_qc._gzip import open_gzip
+from q2_long_reads_qc._sketch import LinearHistogram, LogHistogram
+
+
+def _counts(values) -> dict:
+    unique, counts = np.unique(values, return_counts=True)
+    return dict(zip(unique.tolist(), counts.tolist()))
+
+
+class ReadStats:
+    """Summary statistics of a stream of reads, collected batch by batch:
+    the number of reads and bases, and the distributions of read lengths and
+    of mean read qualities, binned to whole Phred scores. Statistics of
+    separate streams can be merged"""
+
+    def __init__(self):
+        self.reads = 0
+        self.bases = 0
+        self.quality_sum = 0.0
+        self.lengths = collections.Counter()
+        self.qualities = collections.Counter()
+
+    def add(self, batch):
+        if not len(batch):
+            return
+        lengths = np.fromiter(map(len, batch.seqs), dtype=np.int64, count=len(batch))
+        qualities = mean_qualities(batch.quals)
+        self.reads += len(batch)
+        self.bases += int(lengths.sum())
+        self.quality_sum += float(qualities.sum())
+        self.lengths.update(_counts(lengths))
+        self.qualities.update(_counts(np.floor(qualities).astype(np.int64)))
+
+    def merge(self, other):
+        self.reads += other.reads
+        self.bases += other.bases
+        self.quality_sum += other.quality_sum
+        self.lengths.update(other.lengths)
+        self.qualities.update(other.qualities)
+        return self
+
+    @property
+    def mean_length(self) -> float:
+        return self.bases / self.reads if self.reads else 0.0
+
+    @property
+    def mean_quality(self) -> float:
+        return self.quality_sum / self.reads if self.reads else 0.0
+
+    # Length such that reads at least this long hold half of the bases
+    @property
+    def n50(self) -> int:
+        covered = 0
+        for length in sorted(self.lengths, reverse=True):
+            covered += length * self.lengths[length]
+            if 2 * covered >= self.bases:
+                return length
+        return 0
+
+    def to_dict(self) -> dict:
+        return {
+            "reads": self.reads,
+            "bases": self.bases,
+            "quality_sum": self.quality_sum,
+            "lengths": {str(k): v for k, v in sorted(self.lengths.items())},
+            "qualities": {str(k): v for k, v in sorted(self.qualities.items())},
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        stats = cls()
+        stats.reads = data["reads"]
+        stats.bases = data["bases"]
+        stats.quality_sum = data["quality_sum"]
+        stats.lengths.update({int(k): v for k, v in data["lengths"].items()})
+        stats.qualities.update({int(k): v for k, v in data["qualities"].items()})
+        return stats
+
+
+# Fraction of 'total' left in 'retained', or 0 if there was nothing
+def retained_fraction(retained, total) -> float:
+    return retained / total if total else 0.0
+
+
+# Phred scores above which NanoStats counts the reads of higher mean quality
+QUALITY_THRESHOLDS = (5, 7, 10, 12, 15)
+
+# Mean read qualities are binned to tenths of a Phred score. The highest
+# quality encodable in Phred+33 is 93
+QUALITY_BINS_PER_SCORE = 10
+MAX_QUALITY = 93
+
+# Read lengths are binned logarithmically, with LENGTH_BINS_PER_DOUBLING bins
+# between every power of two. Each bin spans less than 0.6% of the lengths
+# in it, and lengths below 185 get a bin of their own
+LENGTH_BINS_PER_DOUBLING = 128
+MAX_LENGTH_BITS = 40
+
+# Percentiles of the read lengths and mean qualities, and fractions of the
+# bases for the Nx of the read lengths, reported next to NanoStats
+PERCENTILES = (5, 10, 25, 50, 75, 90, 95)
+NX = (10, 25, 50, 75, 90)
+
+
+class NanoStats:
+    """The summary numbers NanoPlot reports as NanoStats, computed in
+    constant memory from a stream of reads: exact counts, sums and extremes,
+    and quantile sketches of read lengths and mean qualities from which
+    medians, percentiles and the N50 are estimated. Statistics of separate
+    streams can be merged"""
+
+    def __init__(self):
+        self.reads = 0
+        self.bases = 0
+        self.squared_lengths = 0
+        self.quality_sum = 0.0
+        self.longest = 0
+        self.above_thresholds = np.zeros(len(QUALITY_THRESHOLDS), dtype=np.int64)
+        self.lengths = LogHistogram(LENGTH_BINS_PER_DOUBLING, MAX_LENGTH_BITS)
+        self.qualities = LinearHistogram(QUALITY_BINS_PER_SCORE, MAX_QUALITY)
+
+    def add(self, batch):
+        if not len(batch):
+            return
+        lengths = np.fromiter(map(len, batch.seqs), dtype=np.int64, count=len(batch))
+        self.add_reads(lengths, mean_qualities(batch.quals))
+
+    # Adds reads given by their lengths and mean qualities, e.g. per-read
+    # metrics computed before
+    def add_reads(self, lengths, qualities):
+        if not len(lengths):
+            return
+        self.reads += len(lengths)
+        self.bases += int(lengths.sum())
+        self.squared_lengths += int(np.dot(lengths, lengths))
+        self.quality_sum += float(qualities.sum())
+        self.longest = max(self.longest, int(lengths.max()))
+        # Reads of uniform quality must not land above their own score due to
+        # the rounding errors of the log of their error probability
+        rounded = np.round(qualities, 6)
+        self.above_thresholds += [
+            np.count_nonzero(rounded > threshold) for threshold in QUALITY_THRESHOLDS
+        ]
+        self.lengths.add(lengths)
+        self.qualities.add(rounded)
+
+    def merge(self, other):
+        self.reads += other.reads
+        self.bases += other.bases
+        self.squared_lengths += other.squared_lengths
+        self.quality_sum += other.quality_sum
+        self.longest = max(self.longest, other.longest)
+        self.above_thresholds += other.above_thresholds
+        self.lengths.merge(other.lengths)
+        self.qualities.merge(other.qualities)
+        return self
+
+    @property
+    def mean_length(self) -> float:
+        return self.bases / self.reads if self.reads else 0.0
+
+    @property
+    def length_stdev(self) -> float:
+        if not self.reads:
+            return 0.0
+        variance = self.squared_lengths / self.reads - self.mean_length**2
+        return float(np.sqrt(max(variance, 0.0)))
+
+    @property
+    def median_length(self) -> float:
+        return self.lengths.quantile(0.5)
+
+    @property
+    def mean_quality(self) -> float:
+        return self.quality_sum / self.reads if self.reads else 0.0
+
+    # Centre of the quality bin of the median read
+    @property
+    def median_quality(self) -> float:
+        return self.qualities.quantile(0.5)
+
+    # Length such that reads at least this long hold half of the bases
+    @property
+    def n50(self) -> float:
+        return self.lengths.weighted_quantile(0.5)
+
+    # Number of reads of higher mean quality than every threshold
+    @property
+    def quality_cutoffs(self) -> dict:
+        return dict(zip(QUALITY_THRESHOLDS, self.above_thresholds.tolist()))
+
+    # Read length histogram as {lower bound of bin: count} of non-empty bins
+    def length_histogram(self) -> dict:
+        lower_bounds, counts = self.lengths.nonzero()
+        return dict(zip(lower_bounds.tolist(), counts.tolist()))
+
+    # Mean quality histogram as {lower bound of bin: count} of non-empty bins
+    def quality_histogram(self) -> dict:
+        lower_bounds, counts = self.qualities.nonzero()
+        return dict(zip(lower_bounds.tolist(), counts.tolist()))
+
+    def summary(self) -> dict:
+        summary = {
+            "number_of_reads": self.reads,
+            "number_of_bases": self.bases,
+            "mean_read_length": self.mean_length,
+            "median_read_length": self.median_length,
+            "read_length_stdev": self.length_stdev,
+            "n50": self.n50,
+            "longest_read": self.longest,
+            "mean_qual": self.mean_quality,
+            "median_qual": self.median_quality,
+        }
+        for threshold, count in self.quality_cutoffs.items():
+            summary[f">Q{threshold}"] = count
+        return summary
+
+    # Percentiles of the read lengths and mean qualities and the Nx of the
+    # read lengths
+    def percentiles(self) -> dict:
+        percentiles = {}
+        for p in PERCENTILES:
+            percentiles[f"read_length_p{p}"] = self.lengths.quantile(p / 100)
+        for x in NX:
+            percentiles[f"n{x}"] = self.lengths.weighted_quantile(x / 100)
+        for p in PERCENTILES:
+            percentiles[f"qual_p{p}"] = self.qualities.quantile(p / 100)
+        return percentiles
+
+    def to_dict(self) -> dict:
+        return {
+            "reads": self.reads,
+            "bases": self.bases,
+            "squared_lengths": self.squared_lengths,
+            "quality_sum": self.quality_sum,
+            "longest": self.longest,
+            "above_thresholds": self.above_thresholds.tolist(),
+            "lengths": self.lengths.to_dict(),
+            "qualities": self.qualities.to_dict(),
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        stats = cls()
+        stats.reads = data["reads"]
+        stats.bases = data["bases"]
+        stats.squared_lengths = data["squared_lengths"]
+        stats.quality_sum = data["quality_sum"]
+        stats.longest = data["longest"]
+        stats.above_thresholds[:] = data["above_thresholds"]
+        stats.lengths = LogHistogram.from_dict(data["lengths"])
+        stats.qualities = LinearHistogram.from_dict(data["qualities"])
+        return stats
+
+
+# Bins of the 2-D histogram of read lengths and mean qualities: lengths are
+# binned logarithmically, HISTOGRAM_BINS_PER_DECADE bins per power of ten,
+# and qualities to whole Phred scores
+HISTOGRAM_BINS_PER_DECADE = 20
+HISTOGRAM_DECADES = 8
+
+
+class LengthQualityHistogram:
+    """2-D histogram of the lengths and mean qualities of a stream of reads,
+    whose size does not depend on the number of reads. It replaces plots
+    with one point per read"""
+
+    def __init__(self):
+        self.counts = np.zeros(
+            (HISTOGRAM_DECADES * HISTOGRAM_BINS_PER_DECADE, MAX_QUALITY + 1),
+            dtype=np.int64,
+        )
+
+    def add(self, batch):
+        if not len(batch):
+            return
+        lengths = np.fromiter(map(len, batch.seqs), dtype=np.int64, count=len(batch))
+        self.add_reads(lengths, mean_qualities(batch.quals))
+
+    # Adds reads given by their lengths and mean qualities, e.g. from a
+    # sequencing summary
+    def add_reads(self, lengths, qualities):
+        if not len(lengths):
+            return
+        length_bins = np.floor(
+            np.log10(np.maximum(lengths, 1)) * HISTOGRAM_BINS_PER_DECADE
+        ).astype(np.int64)
+        length_bins = np.minimum(length_bins, self.counts.shape[0] - 1)
+        quality_bins = np.clip(np.floor(np.round(qualities, 6)), 0, MAX_QUALITY).astype(
+            np.int64
+        )
+        flat = length_bins * self.counts.shape[1] + quality_bins
+        self.counts += np.bincount(flat, minlength=self.counts.size).reshape(
+            self.counts.shape
+        )
+
+    def merge(self, other):
+        self.counts += other.counts
+        return self
+
+    # Lower and upper length edges of every length bin
+    @staticmethod
+    def length_edges() -> np.ndarray:
+        n_bins = HISTOGRAM_DECADES * HISTOGRAM_BINS_PER_DECADE
+        return 10 ** (np.arange(n_bins + 1) / HISTOGRAM_BINS_PER_DECADE)
+
+    # The smallest block of bins holding all reads, as (length edges,
+    # quality edges, counts), with counts indexed by quality, then length
+    def cropped(self):
+        lengths, qualities = np.nonzero(self.counts)
+        if not len(lengths):
+            return np.array([]), np.array([]), np.zeros((0, 0), dtype=np.int64)
+        l_start, l_stop = lengths.min(), lengths.max() + 1
+        q_start, q_stop = qualities.min(), qualities.max() + 1
+        return (
+            self.length_edges()[l_start : l_stop + 1],
+            np.arange(q_start, q_stop + 1),
+            self.counts[l_start:l_stop, q_start:q_stop].T,
+        )
+
+    # Non-empty bins as (lower length edge, quality, count)
+    def bins(self):
+        lengths, qualities = np.nonzero(self.counts)
+        edges = self.length_edges()
+        for length, quality in zip(lengths, qualities):
+            yield float(edges[length]), int(quality), int(self.counts[length, quality])
+
+
+# Streams the reads of gzipped FASTQ files batch by batch, once, adding
+# every batch to each of the collectors
+def scan_reads(paths, collectors):
+    for path in paths:
+        with open_gzip(path) as fh:
+            for batch in read_batches(fh):
+                for collector in collectors:
+                    collector.add(batch)
+
+
+# NanoStats of the reads of gzipped FASTQ files, streamed batch by batch
+def collect_nanostats(paths) -> NanoStats:
+    stats = NanoStats()
+    scan_reads(paths, [stats])
+    return stats
@@ -0,0 +1,102 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2024, QIIME 2 development team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file LICENSE, distributed with this software.
+# ----------------------------------------------------------------------------
+import numpy as np
+import pandas as pd
+
+from q2_long_reads_qc._stats import NanoStats
+
+# Columns of a basecaller sequencing summary that are parsed, with their
+# types. All other columns, e.g. the read ids or the channels, are skipped
+SUMMARY_COLUMNS = {
+    "start_time": np.float64,
+    "sequence_length_template": np.int64,
+    "mean_qscore_template": np.float64,
+}
+
+# Number of rows of a sequencing summary parsed at a time
+SUMMARY_CHUNK_ROWS = 1_000_000
+
+# Width of the time bins of the yield over time, in seconds
+YIELD_BIN_SECONDS = 600
+
+
+# Streams the columns of SUMMARY_COLUMNS of a sequencing summary as data
+# frames of at most 'chunk_rows' rows
+def read_summary_chunks(path, chunk_rows=SUMMARY_CHUNK_ROWS):
+    with pd.read_csv(
+        path,
+        sep="\t",
+        usecols=list(SUMMARY_COLUMNS),
+        dtype=SUMMARY_COLUMNS,
+        chunksize=chunk_rows,
+    ) as reader:
+        yield from reader
+
+
+class YieldOverTime:
+    """Numbers of reads and bases of a run in bins of 'bin_seconds' by the
+    start times of the reads, in memory proportional to the duration of the
+    run, not to its number of reads. Yields with the same bins merge
+    exactly"""
+
+    def __init__(self, bin_seconds=YIELD_BIN_SECONDS):
+        self.bin_seconds = bin_seconds
+        self.reads = np.zeros(0, dtype=np.int64)
+        self.bases = np.zeros(0, dtype=np.int64)
+
+    def _grow(self, n_bins):
+        if n_bins > len(self.reads):
+            self.reads = np.pad(self.reads, (0, n_bins - len(self.reads)))
+            self.bases = np.pad(self.bases, (0, n_bins - len(self.bases)))
+
+    def add(self, start_times, lengths):
+        if not len(start_times):
+            return
+        bins = np.floor(np.maximum(start_times, 0) / self.bin_seconds)
+        bins = bins.astype(np.int64)
+        n_bins = int(bins.max()) + 1
+        self._grow(n_bins)
+        self.reads[:n_bins] += np.bincount(bins, minlength=n_bins)
+        self.bases[:n_bins] += np.bincount(
+            bins, weights=lengths, minlength=n_bins
+        ).astype(np.int64)
+
+    def merge(self, other):
+        if self.bin_seconds != other.bin_seconds:
+            raise ValueError("Only yields with the same bins can be merged.")
+        self._grow(len(other.reads))
+        self.reads[: len(other.reads)] += other.reads
+        self.bases[: len(other.bases)] += other.bases
+        return self
+
+    # Start of every bin in hours, with the cumulative numbers of reads and
+    # bases sequenced by its end
+    def cumulative(self):
+        hours = np.arange(len(self.reads)) * self.bin_seconds / 3600
+        return hours, np.cumsum(self.reads), np.cumsum(self.bases)
+
+
+# Streams the reads of sequencing summaries chunk by chunk, once, adding the
+# lengths and mean qualities of every chunk to each of the collectors, and
+# the start times and lengths to 'yields' if given
+def scan_summaries(paths, collectors, yields=None):
+    for path in paths:
+        for chunk in read_summary_chunks(path):
+            lengths = chunk["sequence_length_template"].to_numpy()
+            qualities = chunk["mean_qscore_template"].to_numpy()
+            for collector in collectors:
+                collector.add_reads(lengths, qualities)
+            if yields is not None:
+                yields.add(chunk["start_time"].to_numpy(), lengths)
+
+
+# NanoStats and yield over time of the reads of sequencing summaries
+def summarize_summaries(paths):
+    stats, yields = NanoStats(), YieldOverTime()
+    scan_summaries(paths, [stats], yields)
+    return stats, yields
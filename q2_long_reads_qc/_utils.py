@@ -5,7 +5,22 @@
 #
 # The full license is in the file LICENSE, distributed with this software.
 # ----------------------------------------------------------------------------
+import contextlib
+import functools
+import os
+import queue
+import shutil
+import signal
 import subprocess
+import sys
+import threading
+import time
+
+# fcntl only exists on POSIX systems, where pipes can be enlarged
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
 
 EXTERNAL_CMD_WARNING = (
     "Running external command line application(s). "
@@ -15,35 +30,353 @@ EXTERNAL_CMD_WARNING = (
     "temporary files that no longer exist."
 )
 
+# Size of the chunks copied from an in-process source into a pipeline
+COPY_BUFFER_SIZE = 4 * 1024**2
+
+# Buffer size requested for the pipes between the stages of a pipeline. The
+# Linux default of 64 KiB makes the stages switch back and forth for every
+# few reads; 1 MiB is the default limit for unprivileged processes
+PIPE_BUFFER_SIZE = 1024**2
+
+# fcntl command setting the buffer size of a pipe (Linux, Python < 3.10)
+_F_SETPIPE_SZ = getattr(fcntl, "F_SETPIPE_SZ", 1031)
+
+
+# Process group of the jobs run by the current thread, see process_group
+_local = threading.local()
+
+
+class ProcessGroup:
+    """Processes started on behalf of a group of jobs, e.g. the samples of a
+    trim run, so that all of them can be killed at once"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._processes = set()
+        self.killed = False
+
+    def add(self, process):
+        with self._lock:
+            if self.killed:
+                process.kill()
+            self._processes.add(process)
+
+    def discard(self, process):
+        with self._lock:
+            self._processes.discard(process)
+
+    def kill(self):
+        with self._lock:
+            self.killed = True
+            for process in self._processes:
+                process.kill()
+
+
+# Makes the commands started by the current thread join the given group
+@contextlib.contextmanager
+def process_group(group):
+    previous = getattr(_local, "group", None)
+    _local.group = group
+    try:
+        yield group
+    finally:
+        _local.group = previous
+
+
+def _popen(cmd, **kwargs):
+    process = subprocess.Popen(cmd, **kwargs)
+    group = getattr(_local, "group", None)
+    if group is not None:
+        group.add(process)
+    return process
+
+
+def _release(processes):
+    group = getattr(_local, "group", None)
+    if group is not None:
+        for process in processes:
+            group.discard(process)
+
+
+def print_command(cmd_str):
+    print(EXTERNAL_CMD_WARNING)
+    print("\nCommand:", end=" ")
+    print(cmd_str, end="\n\n")
+
 
 def run_command(cmd, verbose=True):
     if verbose:
-        print(EXTERNAL_CMD_WARNING)
-        print("\nCommand:", end=" ")
-        print(" ".join(cmd), end="\n\n")
+        print_command(" ".join(cmd))
     subprocess.run(cmd, check=True)
 
 
 def run_commands_with_pipe(cmd1, cmd2, cmd3, outfile_path, verbose=True):
-    """Runs two consecutive commands using a pipe"""
+    """Runs three consecutive commands using pipes"""
+    run_pipeline([cmd1, cmd2, cmd3], outfile_path, verbose=verbose)
+
+
+def read_in_chunks(fh, chunk_size=COPY_BUFFER_SIZE):
+    return iter(functools.partial(fh.read, chunk_size), b"")
+
+
+# Grows the kernel buffer of a pipe given as a file descriptor or file
+# object. Only supported on Linux; elsewhere, or if the system limits do not
+# allow it, the pipe is left as is
+def enlarge_pipe(pipe, size=PIPE_BUFFER_SIZE):
+    if fcntl is None or not sys.platform.startswith("linux"):
+        return
+    fd = pipe if isinstance(pipe, int) else pipe.fileno()
+    try:
+        fcntl.fcntl(fd, _F_SETPIPE_SZ, size)
+    except OSError:
+        pass
+
+
+# Writes the byte strings of 'source' to sink and closes it. Errors are
+# collected in 'errors' to be re-raised by the calling thread
+def _feed(source, sink, errors):
+    try:
+        for chunk in source:
+            sink.write(chunk)
+    except BrokenPipeError:
+        pass  # The consuming command exited early
+    except Exception as e:
+        errors.append(e)
+    finally:
+        try:
+            sink.close()
+        except BrokenPipeError:
+            pass
+
+
+def _kill(processes):
+    for process in processes:
+        if process.poll() is None:
+            process.kill()
+    for process in processes:
+        process.wait()
+
+
+def _watch(index, process, events):
+    process.wait()
+    events.put(index)
+
+
+# Whether the stage at 'index' of a pipeline of n_stages failed. As in
+# shells, a stage receiving SIGPIPE only fails if a later one does, as that
+# one may just have stopped reading early
+def stage_failed(returncode, index, n_stages) -> bool:
+    return returncode != 0 and not (
+        returncode == -signal.SIGPIPE and index < n_stages - 1
+    )
+
+
+# Index of the stage to blame for the failure of the stage at 'index': the
+# first stage that failed for another reason than SIGPIPE, not counting the
+# stages killed because of the failure
+def blame_stage(processes, killed, index) -> int:
+    for i, process in enumerate(processes):
+        returncode = process.returncode
+        if returncode not in (0, -signal.SIGPIPE) and process not in killed:
+            return i
+    return index
+
+
+def supervise(processes, cmds, timeout=None):
+    """Waits for the processes of a pipeline running the commands 'cmds'. As
+    soon as one of them fails, or the pipeline runs for longer than
+    'timeout' seconds, all others are killed and CalledProcessError or
+    TimeoutExpired is raised, respectively"""
+    events = queue.Queue()
+    for index, process in enumerate(processes):
+        threading.Thread(
+            target=_watch, args=(index, process, events), daemon=True
+        ).start()
+
+    deadline = None if timeout is None else time.monotonic() + timeout
+    for _ in processes:
+        try:
+            remaining = None
+            if deadline is not None:
+                remaining = max(0, deadline - time.monotonic())
+            index = events.get(timeout=remaining)
+        except queue.Empty:
+            _kill(processes)
+            raise subprocess.TimeoutExpired(
+                " | ".join(" ".join(cmd) for cmd in cmds), timeout
+            )
+        if stage_failed(processes[index].returncode, index, len(processes)):
+            break
+    else:
+        return
+
+    running = [process for process in processes if process.poll() is None]
+    _kill(running)
+    index = blame_stage(processes, running, index)
+    raise subprocess.CalledProcessError(processes[index].returncode, cmds[index])
+
+
+def run_pipeline(cmds, outfile_path, source=None, verbose=True, timeout=None):
+    """Runs consecutive commands connected by pipes and writes the output of
+    the last one to outfile_path. If given, the content of the file-like
+    'source' is fed to the first command from a separate thread. The
+    pipeline is supervised, see supervise"""
     if verbose:
-        print(EXTERNAL_CMD_WARNING)
-        print("\nCommand:", end=" ")
-        cmd_str = " | ".join(" ".join(cmd) for cmd in (cmd1, cmd2, cmd3))
-        print(cmd_str, end="\n\n")
-
-    # Start the first command
-    p1 = subprocess.Popen(cmd1, stdout=subprocess.PIPE)
-    # Pipe the output of cmd1 to cmd2
-    p2 = subprocess.Popen(cmd2, stdin=p1.stdout, stdout=subprocess.PIPE)
-    p1.stdout.close()  # Allow p1 to receive a SIGPIPE if p2 exits
-
-    # Pipe output of cmd2 to cmd3, but manage the output file ourselves
+        cmd_str = " | ".join(" ".join(cmd) for cmd in cmds)
+        if source is not None:
+            cmd_str = f"<{getattr(source, 'name', 'stream')}> | {cmd_str}"
+        print_command(cmd_str)
+
+    processes = []
+    stdin = subprocess.PIPE if source is not None else None
+    # Manage the output file of the last command ourselves
     with open(outfile_path, "wb") as outfile:
-        p3 = subprocess.Popen(cmd3, stdin=p2.stdout, stdout=outfile)
-        p2.stdout.close()  # Allow p2 to receive a SIGPIPE if p3 exits
+        try:
+            for i, cmd in enumerate(cmds):
+                stdout = outfile if i == len(cmds) - 1 else subprocess.PIPE
+                processes.append(_popen(cmd, stdin=stdin, stdout=stdout))
+                if i == 0 and source is not None:
+                    enlarge_pipe(processes[0].stdin)
+                if i < len(cmds) - 1:
+                    enlarge_pipe(processes[i].stdout)
+                if i > 0:
+                    # Allow the previous command to receive a SIGPIPE if this
+                    # exits
+                    processes[i - 1].stdout.close()
+                stdin = processes[i].stdout
+        except OSError:
+            _kill(processes)
+            _release(processes)
+            raise
+
+    feeder_errors = []
+    if source is not None:
+        feeder = threading.Thread(
+            target=_feed,
+            args=(read_in_chunks(source), processes[0].stdin, feeder_errors),
+        )
+        feeder.start()
+
+    try:
+        supervise(processes, cmds, timeout)
+    finally:
+        _release(processes)
+        if source is not None:
+            feeder.join()
+
+    if feeder_errors:
+        raise feeder_errors[0]
+
+
+class Watchdog:
+    """Kills a process that is still running 'timeout' seconds after the
+    watchdog was created, if a timeout is given. 'expired' tells whether it
+    had to"""
+
+    def __init__(self, process, timeout=None):
+        self.expired = False
+        self._timer = None
+        if timeout is not None:
+            self._timer = threading.Timer(timeout, self._expire, args=(process,))
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _expire(self, process):
+        if process.poll() is None:
+            self.expired = True
+            process.kill()
+
+    def cancel(self):
+        if self._timer is not None:
+            self._timer.cancel()
+
+
+def stream_command(cmd, chunks, verbose=True, timeout=None):
+    """Runs a command fed with the byte strings of the 'chunks' iterable from
+    a separate thread and yields its standard output in chunks. Raises
+    CalledProcessError if the command fails and TimeoutExpired if it is
+    killed for running longer than 'timeout' seconds"""
+    if verbose:
+        print_command(f"<stream> | {' '.join(cmd)} | <stream>")
+
+    process = _popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+    watchdog = Watchdog(process, timeout)
+    enlarge_pipe(process.stdin)
+    enlarge_pipe(process.stdout)
+    feeder_errors = []
+    feeder = threading.Thread(target=_feed, args=(chunks, process.stdin, feeder_errors))
+    feeder.start()
+    try:
+        yield from read_in_chunks(process.stdout)
+    finally:
+        process.stdout.close()
+        process.wait()
+        watchdog.cancel()
+        _release([process])
+        feeder.join()
+
+    if watchdog.expired:
+        raise subprocess.TimeoutExpired(cmd, timeout)
+    if feeder_errors:
+        raise feeder_errors[0]
+    if process.returncode != 0:
+        raise subprocess.CalledProcessError(process.returncode, cmd)
+
+
+@contextlib.contextmanager
+def open_command_writer(cmd, outfile_path, verbose=True, timeout=None):
+    """Starts a command writing its output to outfile_path and yields a
+    buffered handle to its standard input. Raises CalledProcessError if the
+    command fails and TimeoutExpired if it is killed for running longer
+    than 'timeout' seconds"""
+    if verbose:
+        print_command(f"<stream> | {' '.join(cmd)}")
+
+    with open(outfile_path, "wb") as outfile:
+        process = _popen(
+            cmd, stdin=subprocess.PIPE, stdout=outfile, bufsize=COPY_BUFFER_SIZE
+        )
+        enlarge_pipe(process.stdin)
+    watchdog = Watchdog(process, timeout)
+    broken_pipe = None
+    try:
+        yield process.stdin
+    except BrokenPipeError as e:
+        # The command exited, or was killed by the watchdog, before reading
+        # all of its input. Its exit status tells which, see below
+        broken_pipe = e
+    finally:
+        try:
+            process.stdin.close()
+        except BrokenPipeError:
+            pass
+        process.wait()
+        watchdog.cancel()
+        _release([process])
+
+    if watchdog.expired:
+        raise subprocess.TimeoutExpired(cmd, timeout)
+    if process.returncode != 0:
+        raise subprocess.CalledProcessError(process.returncode, cmd)
+    if broken_pipe is not None:
+        # The command succeeded without reading all of its input
+        raise broken_pipe
+
+
+# Hardlinks src to dst, falling back to a copy across file systems or
+# where hardlinks are not supported
+def link_or_copy(src, dst):
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copyfile(src, dst)
+
 
-    # Wait for the processes to complete
-    p1.wait()
-    p2.wait()
-    p3.wait()
+# Files of the reads of every sample of a per-sample sequences directory
+# format, forward and reverse together. A missing reverse file is None or
+# NaN in the manifest
+def manifest_files(reads) -> dict:
+    return {
+        sample_id: [f for f in (fwd, rev) if isinstance(f, str)]
+        for sample_id, fwd, rev in reads.manifest.itertuples()
+    }
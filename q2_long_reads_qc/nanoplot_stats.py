@@ -5,58 +5,833 @@
 #
 # The full license is in the file LICENSE, distributed with this software.
 # ----------------------------------------------------------------------------
+import concurrent.futures
+import json
 import os
+import re
 import subprocess
 import tempfile
+import warnings
 from distutils.dir_util import copy_tree
 from importlib import resources
 
+import numpy as np
 import q2templates
+from plotly.offline import get_plotlyjs
 from q2_types.per_sample_sequences import (
     CasavaOneEightSingleLanePerSampleDirFmt,
 )
 
-from q2_long_reads_qc._utils import run_command
+from q2_long_reads_qc._executor import Pipeline, run_pipelines
+from q2_long_reads_qc._metrics import metrics_nanostats, write_read_metrics
+from q2_long_reads_qc._resources import plan_sample_threads
+from q2_long_reads_qc._sampling import Reservoir
+from q2_long_reads_qc._stats import (
+    LengthQualityHistogram,
+    NanoStats,
+    ReadStats,
+    collect_nanostats,
+    retained_fraction,
+    scan_reads,
+)
+from q2_long_reads_qc._summary import scan_summaries, summarize_summaries
+from q2_long_reads_qc._utils import link_or_copy, manifest_files
+from q2_long_reads_qc.types import (
+    NanoStatsDirFmt,
+    ReadMetricsDirFmt,
+    ReadStatsDirFmt,
+    SequencingSummaryDirFmt,
+)
 
 TEMPLATES = resources.files("q2_long_reads_qc") / "assets" / "nanoplot"
+READ_STATS_TEMPLATES = resources.files("q2_long_reads_qc") / "assets" / "read_stats"
+NANOSTATS_TEMPLATES = resources.files("q2_long_reads_qc") / "assets" / "nanostats"
+
+# Column of the statistics of the reads of all samples together
+ALL_SAMPLES = "All samples"
+
+
+# Sequencing summary of every sample
+def _summary_files(sequencing_summary) -> dict:
+    return {
+        path.stem: [str(path)] for path in sorted(sequencing_summary.path.glob("*.txt"))
+    }
+
+
+# Options of the NanoPlot runs, and of the reads they get, set by every
+# preset. Options given explicitly take precedence
+NANOPLOT_PRESETS = {
+    "full": {
+        "static_plots": True,
+        "only_report": False,
+        "drop_outliers": False,
+        "raw_data": False,
+        "bivariate_plots": ["kde", "dot"],
+        "subsample": 0,
+    },
+    # Interactive plots only, of a sample of the reads
+    "fast": {
+        "static_plots": False,
+        "only_report": True,
+        "drop_outliers": False,
+        "raw_data": False,
+        "bivariate_plots": ["dot"],
+        "subsample": 100000,
+    },
+}
+
+
+# Options of a preset, overridden by the options that are not None
+def resolve_nanoplot_options(preset, **options) -> dict:
+    return {
+        **NANOPLOT_PRESETS[preset],
+        **{name: value for name, value in options.items() if value is not None},
+    }
+
+
+# NanoPlot command for the files of a sample, reads with input_format
+# "fastq" or basecaller sequencing summaries with "summary"
+def construct_nanoplot_command(
+    input_files,
+    output_dir,
+    threads=1,
+    static_plots=True,
+    only_report=False,
+    drop_outliers=False,
+    maxlength=None,
+    raw_data=False,
+    bivariate_plots=None,
+    input_format="fastq",
+) -> list:
+    cmd = [
+        "NanoPlot",
+        f"--{input_format}",
+        *input_files,
+        "-o",
+        output_dir,
+        "--threads",
+        str(threads),
+        "--tsv_stats",
+    ]
+    # Rendering static images through kaleido is the slowest part of a run
+    if not static_plots:
+        cmd.append("--no_static")
+    if only_report:
+        cmd.append("--only-report")
+    if drop_outliers:
+        cmd.append("--drop_outliers")
+    if maxlength is not None:
+        cmd.extend(["--maxlength", str(maxlength)])
+    if raw_data:
+        cmd.append("--raw")
+    # An empty list turns the bivariate plots off
+    if bivariate_plots is not None:
+        cmd.extend(["--plots", *bivariate_plots])
+    return cmd
+
+
+# Streams the reads of a sample once, drawing a random sample of at most
+# 'subsample' reads into subsampled_file and binning their lengths and mean
+# qualities, as requested. Returns the exact numbers of reads and bases
+# (None without subsampling) and the histogram (None without binning)
+def _scan_sample(files, subsample, seed, subsampled_file, binned_plots):
+    reservoir = histogram = None
+    if subsample:
+        reservoir = Reservoir(subsample, np.random.default_rng(seed))
+    if binned_plots:
+        histogram = LengthQualityHistogram()
+    scan_reads(files, [c for c in (reservoir, histogram) if c is not None])
 
+    if reservoir is None:
+        return None, histogram
+    reservoir.write(subsampled_file)
+    return (reservoir.reads, reservoir.bases), histogram
 
-# Run NanoPlot on sequence files in the specified directory
-def _run_nanoplot(sequences_path, nanoplot_output):
-    fastq_files = [
-        os.path.join(sequences_path, f)
-        for f in os.listdir(sequences_path)
-        if f.endswith(".fastq.gz")
+
+# Scans the reads of every sample with _scan_sample, 'workers' samples at a
+# time. Returns the files NanoPlot should run on, i.e. the subsampled reads
+# if any, the exact totals of every sample and the histograms of every
+# sample, the latter two as None if not requested
+def _scan_sequences(sample_files, subsample, seed, binned_plots, output_dir, workers=1):
+    if not subsample and not binned_plots:
+        return sample_files, None, None
+
+    subsampled_files = {
+        sample_id: os.path.join(output_dir, f"{sample_id}.fastq.gz")
+        for sample_id in sample_files
+    }
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            sample_id: executor.submit(
+                _scan_sample,
+                files,
+                subsample,
+                seed,
+                subsampled_files[sample_id],
+                binned_plots,
+            )
+            for sample_id, files in sample_files.items()
+        }
+        results = {sample_id: f.result() for sample_id, f in futures.items()}
+
+    totals = histograms = None
+    if subsample:
+        sample_files = {k: [path] for k, path in subsampled_files.items()}
+        totals = {sample_id: result[0] for sample_id, result in results.items()}
+    if binned_plots:
+        histograms = {sample_id: result[1] for sample_id, result in results.items()}
+    return sample_files, totals, histograms
+
+
+# Histograms of the lengths and mean qualities of the reads of the sequencing
+# summary of every sample, parsed 'workers' samples at a time, or None if
+# not requested
+def _scan_summaries(sample_files, binned_plots, workers=1):
+    if not binned_plots:
+        return None
+
+    def scan(files):
+        histogram = LengthQualityHistogram()
+        scan_summaries(files, [histogram])
+        return histogram
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            sample_id: executor.submit(scan, files)
+            for sample_id, files in sample_files.items()
+        }
+        return {sample_id: f.result() for sample_id, f in futures.items()}
+
+
+# Run NanoPlot on the files of every sample, each into a subdirectory of
+# nanoplot_output named after the sample. Samples are processed
+# parallel_samples at a time, sharing the threads between them. Other
+# options are passed on to construct_nanoplot_command
+def _run_nanoplot(
+    sample_files, nanoplot_output, threads=1, parallel_samples=1, **options
+):
+    workers, nanoplot_threads = plan_sample_threads(
+        threads, len(sample_files), parallel_samples
+    )
+    pipelines = [
+        Pipeline(
+            [
+                construct_nanoplot_command(
+                    files,
+                    os.path.join(nanoplot_output, sample_id),
+                    nanoplot_threads,
+                    **options,
+                )
+            ]
+        )
+        for sample_id, files in sample_files.items()
     ]
-    nanoplot_cmd = ["NanoPlot", "--fastq", *fastq_files, "-o", nanoplot_output]
     try:
-        # Run Nanoplot command
-        run_command(nanoplot_cmd, verbose=True)
+        run_pipelines(pipelines, workers)
     except subprocess.CalledProcessError as e:
         raise Exception(
             "An error was encountered while running nanoplot, "
             f"(return code {e.returncode}), please inspect "
             "stdout and stderr to learn more."
         )
+    return list(sample_files)
 
 
-def _create_visualization(output_dir, nanoplot_output):
+# NanoStats of a NanoPlot run written with --tsv_stats as {metric: value}
+def _read_nanostats(nanoplot_dir) -> dict:
+    with open(os.path.join(nanoplot_dir, "NanoStats.txt")) as fh:
+        lines = fh.read().splitlines()[1:]
+    return dict(line.split("\t", 1) for line in lines if "\t" in line)
+
+
+# Cohort table of the NanoStats of every sample, with the metrics as rows
+# and the samples as columns
+def _summarize_nanoplot(nanoplot_output, sample_ids):
+    nanostats = {
+        sample_id: _read_nanostats(os.path.join(nanoplot_output, sample_id))
+        for sample_id in sample_ids
+    }
+    metrics = list(dict.fromkeys(m for stats in nanostats.values() for m in stats))
+    return [
+        {
+            "metric": metric,
+            "values": [stats.get(metric, "") for stats in nanostats.values()],
+        }
+        for metric in metrics
+    ]
+
+
+# Copy of plotly.js shared by all plots of the visualization, at its root
+PLOTLY_JS = "plotly.min.js"
+
+# Opening tag of a script. As in browsers, a script ends at the first
+# "</script>" after it, whatever its content
+SCRIPT_TAG = re.compile(r"<script\b[^>]*>", re.IGNORECASE)
+SCRIPT_END = "</script>"
+
+# Reference to plotly.js on the plotly CDN, and the license banner that
+# plotly.js bundles start with
+PLOTLY_CDN = re.compile(r"src=\"https://cdn\.plot\.ly/")
+PLOTLY_BANNER = re.compile(r"/\*\*?\s*\*\s*plotly\.js v")
+
+# Relative links of a page to other files
+LINKED_FILE = re.compile(r"(?:src|href)=\"([^\"#?:]+)\"")
+
+# Files of a NanoPlot run that are shown in the visualization, besides the
+# ones its report links to. The per-read data is only there if requested
+NANOPLOT_KEPT_FILES = ("NanoPlot-report.html", "NanoPlot-data.tsv.gz")
+
+
+# Whether a script is a copy of plotly.js: the bundle of the installed
+# plotly, which is the one NanoPlot inlines, any bundle starting with the
+# plotly.js license banner or a reference to the plotly CDN
+def _is_plotly(tag, content, plotly_js) -> bool:
+    content = content.strip()
+    return bool(
+        PLOTLY_CDN.search(tag) or content == plotly_js or PLOTLY_BANNER.match(content)
+    )
+
+
+# Replaces the copies of plotly.js in a page by a reference to the shared
+# one at 'plotly_path'. Returns the page and whether it still has a copy of
+# its own, i.e. whether it uses Plotly without any recognized copy of it
+def _share_plotly(html, plotly_path, plotly_js=None):
+    if plotly_js is None:
+        plotly_js = get_plotlyjs()
+
+    parts, pos, shared = [], 0, False
+    while tag := SCRIPT_TAG.search(html, pos):
+        content_end = html.find(SCRIPT_END, tag.end())
+        if content_end < 0:
+            break
+        end = content_end + len(SCRIPT_END)
+        parts.append(html[pos : tag.start()])
+        if not _is_plotly(tag.group(), html[tag.end() : content_end], plotly_js):
+            parts.append(html[tag.start() : end])
+        elif not shared:
+            parts.append(f'<script src="{plotly_path}"></script>')
+            shared = True
+        pos = end
+    parts.append(html[pos:])
+    return "".join(parts), not shared and "Plotly." in html
+
+
+# Copies the output of a NanoPlot run that is shown in the visualization,
+# i.e. its report and the files the report links to, pointing their pages
+# to the shared plotly.js. Intermediate files and the pages of single plots,
+# which the report already includes, are left out
+def _copy_nanoplot_report(nanoplot_dir, destination, plotly_path, plotly_js=None):
+    with open(os.path.join(nanoplot_dir, "NanoPlot-report.html")) as fh:
+        report = fh.read()
+    linked = {os.path.normpath(link) for link in LINKED_FILE.findall(report)}
+
+    os.makedirs(destination, exist_ok=True)
+    for filename in sorted(os.listdir(nanoplot_dir)):
+        if filename not in linked and filename not in NANOPLOT_KEPT_FILES:
+            continue
+        source = os.path.join(nanoplot_dir, filename)
+        if filename.endswith(".html"):
+            with open(source) as fh:
+                html, own_copy = _share_plotly(fh.read(), plotly_path, plotly_js)
+            # The page is kept as it is, working but larger
+            if own_copy:
+                warnings.warn(
+                    f"No copy of plotly.js was recognized in {source}, which "
+                    "keeps its own copy instead of sharing that of the "
+                    "visualization."
+                )
+            with open(os.path.join(destination, filename), "w") as fh:
+                fh.write(html)
+        elif os.path.isfile(source):
+            link_or_copy(source, os.path.join(destination, filename))
+
+
+# Plotly heatmap of the length-quality histogram of a sample. Its size
+# depends on the number of bins, not on the number of reads
+def _binned_plot(histogram) -> dict:
+    length_edges, quality_edges, counts = histogram.cropped()
+    return {
+        "data": [
+            {
+                "type": "heatmap",
+                "x": length_edges.tolist(),
+                "y": quality_edges.tolist(),
+                # Empty bins are left blank
+                "z": [[count or None for count in row] for row in counts.tolist()],
+                "colorscale": "Viridis",
+                "colorbar": {"title": {"text": "Reads"}},
+            }
+        ],
+        "layout": {
+            "title": {"text": "Read lengths vs mean read qualities"},
+            "xaxis": {"title": {"text": "Read length"}, "type": "log"},
+            "yaxis": {"title": {"text": "Mean read quality"}},
+        },
+    }
+
+
+def _create_visualization(
+    output_dir,
+    nanoplot_output,
+    sample_ids,
+    totals=None,
+    subsample=0,
+    histograms=None,
+):
     # Copy Nanoplot templates to the output directory
     copy_tree(TEMPLATES, output_dir)
 
-    # Copy Nanoplot data from the temporary directory to the output directory
-    copy_tree(nanoplot_output, os.path.join(output_dir, "nanoplot_data"))
+    # Copy the NanoPlot reports, all sharing a single copy of plotly.js
+    plotly_js = get_plotlyjs()
+    with open(os.path.join(output_dir, PLOTLY_JS), "w") as fh:
+        fh.write(plotly_js)
+    for sample_id in sample_ids:
+        _copy_nanoplot_report(
+            os.path.join(nanoplot_output, sample_id),
+            os.path.join(output_dir, "nanoplot_data", sample_id),
+            f"../../{PLOTLY_JS}",
+            plotly_js,
+        )
+
+    rows = _summarize_nanoplot(nanoplot_output, sample_ids)
 
-    # Generate an index.html file for Nanoplot in the output directory
-    context = {"tabs": [{"title": "Nanoplot", "url": "index.html"}]}
+    # Exact numbers of reads and bases counted while subsampling the reads
+    # NanoPlot ran on
+    total_rows = []
+    if totals is not None:
+        for i, metric in enumerate(["total_reads", "total_bases"]):
+            values = [str(totals[sample_id][i]) for sample_id in sample_ids]
+            total_rows.append({"metric": metric, "values": values})
+
+    with open(os.path.join(output_dir, "nanostats.tsv"), "w") as fh:
+        fh.write("\t".join(["metric", *sample_ids]) + "\n")
+        for row in total_rows + rows:
+            fh.write("\t".join([row["metric"], *row["values"]]) + "\n")
+
+    binned_plots = {}
+    if histograms is not None:
+        with open(os.path.join(output_dir, "length_quality_histogram.tsv"), "w") as fh:
+            fh.write("sample_id\tlength\tquality\tcount\n")
+            for sample_id in sample_ids:
+                for length, quality, count in histograms[sample_id].bins():
+                    fh.write(f"{sample_id}\t{length:g}\t{quality}\t{count}\n")
+        binned_plots = {
+            sample_id: json.dumps(_binned_plot(histograms[sample_id]))
+            for sample_id in sample_ids
+        }
+
+    # Generate an index.html file with the cohort summary and a tab with the
+    # NanoPlot report of every sample
+    context = {
+        "tabs": [{"title": "Nanoplot", "url": "index.html"}],
+        "samples": sample_ids,
+        "rows": rows,
+        "totals": total_rows,
+        "subsample": subsample,
+        "binned_plots": binned_plots,
+    }
     index = os.path.join(TEMPLATES, "index.html")
     q2templates.render([index], output_dir, context=context)
 
 
+# Summary of the statistics collected by trim_with_stats for every sample,
+# as rows of the filtered reads with the retained fractions of the input
+def _summarize_read_stats(read_stats):
+    rows, lengths, qualities = [], {}, {}
+    for path in sorted(read_stats.path.glob("*.json")):
+        sample_id = path.stem
+        with open(path) as fh:
+            data = json.load(fh)
+        input_stats = ReadStats.from_dict(data["input"])
+        filtered = ReadStats.from_dict(data["filtered"])
+        rows.append(
+            {
+                "sample_id": sample_id,
+                "reads": filtered.reads,
+                "bases": filtered.bases,
+                "mean_length": filtered.mean_length,
+                "n50": filtered.n50,
+                "mean_quality": filtered.mean_quality,
+                "reads_retained": retained_fraction(filtered.reads, input_stats.reads),
+                "bases_retained": retained_fraction(filtered.bases, input_stats.bases),
+            }
+        )
+        lengths[sample_id] = filtered.lengths
+        qualities[sample_id] = filtered.qualities
+    return rows, lengths, qualities
+
+
+# Writes distributions given as {sample: {value: count}} as a long TSV table
+def _write_distribution(path, column, distributions):
+    with open(path, "w") as fh:
+        fh.write(f"sample_id\t{column}\tcount\n")
+        for sample_id, counts in distributions.items():
+            for value, count in sorted(counts.items()):
+                fh.write(f"{sample_id}\t{value}\t{count}\n")
+
+
+def _visualize_read_stats(output_dir, read_stats):
+    rows, lengths, qualities = _summarize_read_stats(read_stats)
+
+    columns = list(rows[0]) if rows else ["sample_id"]
+    with open(os.path.join(output_dir, "read_stats.tsv"), "w") as fh:
+        fh.write("\t".join(columns) + "\n")
+        for row in rows:
+            fh.write("\t".join(str(row[column]) for column in columns) + "\n")
+    _write_distribution(
+        os.path.join(output_dir, "length_distribution.tsv"), "length", lengths
+    )
+    _write_distribution(
+        os.path.join(output_dir, "quality_distribution.tsv"), "quality", qualities
+    )
+
+    index = os.path.join(READ_STATS_TEMPLATES, "index.html")
+    q2templates.render([index], output_dir, context={"rows": rows})
+
+
+# NanoStats of the reads of every sample, computed in-process
+def _summarize_sequences(sequences):
+    return {
+        sample_id: collect_nanostats(files)
+        for sample_id, files in manifest_files(sequences).items()
+    }
+
+
+# NanoStats of every sample of a NanoStats artifact
+def _load_nanostats(nanostats) -> dict:
+    sample_stats = {}
+    for path in sorted(nanostats.path.glob("*.json")):
+        with open(path) as fh:
+            sample_stats[path.stem] = NanoStats.from_dict(json.load(fh))
+    return sample_stats
+
+
+def _save_nanostats(sample_stats) -> NanoStatsDirFmt:
+    nanostats = NanoStatsDirFmt()
+    for sample_id, stats in sample_stats.items():
+        with open(nanostats.path / f"{sample_id}.json", "w") as fh:
+            json.dump(stats.to_dict(), fh)
+    return nanostats
+
+
+# Computes the NanoStats of the reads of every sample in-process, to be
+# visualized by stats, possibly after collating those of several partitions
+def compute_nanostats(
+    sequences: CasavaOneEightSingleLanePerSampleDirFmt,
+) -> NanoStatsDirFmt:
+    return _save_nanostats(_summarize_sequences(sequences))
+
+
+# Merges the NanoStats of partitions of samples. The statistics of a sample
+# present in several partitions are merged exactly, bin by bin
+def collate_nanostats(nanostats: NanoStatsDirFmt) -> NanoStatsDirFmt:
+    sample_stats = {}
+    for partition in nanostats:
+        for sample_id, stats in _load_nanostats(partition).items():
+            if sample_id in sample_stats:
+                sample_stats[sample_id].merge(stats)
+            else:
+                sample_stats[sample_id] = stats
+    return _save_nanostats(dict(sorted(sample_stats.items())))
+
+
+# Computes the metrics of every read of every sample, one Arrow IPC file per
+# sample, checking the reads against trimming filters. Samples are processed
+# parallel_samples at a time
+def compute_read_metrics(
+    sequences: CasavaOneEightSingleLanePerSampleDirFmt,
+    parallel_samples: int = 1,
+    quality: int = 0,
+    maxqual: int = 1000,
+    minlength: int = 1,
+    maxlength: int = 2147483647,
+    headcrop: int = 0,
+    tailcrop: int = 0,
+) -> ReadMetricsDirFmt:
+    read_metrics = ReadMetricsDirFmt()
+    filters = {
+        "quality": quality,
+        "maxqual": maxqual,
+        "minlength": minlength,
+        "maxlength": maxlength,
+        "headcrop": headcrop,
+        "tailcrop": tailcrop,
+    }
+    with concurrent.futures.ThreadPoolExecutor(
+        max_workers=parallel_samples
+    ) as executor:
+        futures = [
+            executor.submit(
+                write_read_metrics,
+                files,
+                read_metrics.path / f"{sample_id}.arrow",
+                filters,
+            )
+            for sample_id, files in manifest_files(sequences).items()
+        ]
+        for future in futures:
+            future.result()
+    return read_metrics
+
+
+# NanoStats of the reads of every sample of a read metrics artifact
+def _read_metrics_nanostats(read_metrics) -> dict:
+    return {
+        path.stem: metrics_nanostats(path)
+        for path in sorted(read_metrics.path.glob("*.arrow"))
+    }
+
+
+# NanoStats and yield over time of the reads of the sequencing summary of
+# every sample
+def _summarize_sequencing_summaries(sequencing_summary):
+    sample_stats, yields = {}, {}
+    for sample_id, files in _summary_files(sequencing_summary).items():
+        sample_stats[sample_id], yields[sample_id] = summarize_summaries(files)
+    return sample_stats, yields
+
+
+# Plotly line plot of the cumulative yield of every sample over the time of
+# its run. Its size depends on the duration of the runs, not on the number
+# of reads
+def _yield_plot(yields) -> dict:
+    data = []
+    for sample_id, sample_yield in yields.items():
+        hours, _, bases = sample_yield.cumulative()
+        data.append(
+            {
+                "type": "scatter",
+                "mode": "lines",
+                "name": sample_id,
+                "x": hours.tolist(),
+                "y": (bases / 1e9).tolist(),
+            }
+        )
+    return {
+        "data": data,
+        "layout": {
+            "title": {"text": "Cumulative yield over time"},
+            "xaxis": {"title": {"text": "Run time (hours)"}},
+            "yaxis": {"title": {"text": "Cumulative yield (Gb)"}},
+        },
+    }
+
+
+# Writes the yield over time of every sample as a long TSV table of the
+# numbers of reads and bases in every time bin, and their running totals
+def _write_yields(path, yields):
+    with open(path, "w") as fh:
+        fh.write("sample_id\thours\treads\tbases\tcumulative_reads\tcumulative_bases\n")
+        for sample_id, sample_yield in yields.items():
+            hours, cumulative_reads, cumulative_bases = sample_yield.cumulative()
+            rows = zip(
+                hours,
+                sample_yield.reads,
+                sample_yield.bases,
+                cumulative_reads,
+                cumulative_bases,
+            )
+            for row in rows:
+                fh.write("\t".join([sample_id, f"{row[0]:g}", *map(str, row[1:])]))
+                fh.write("\n")
+
+
+# Writes metrics given as {column: {metric: value}} as a TSV table with the
+# metrics as rows, and returns its rows
+def _write_metrics(path, columns) -> list:
+    metrics = list(next(iter(columns.values())))
+    rows = [
+        {
+            "metric": metric,
+            "values": [values[metric] for values in columns.values()],
+        }
+        for metric in metrics
+    ]
+    with open(path, "w") as fh:
+        fh.write("\t".join(["metric", *columns]) + "\n")
+        for row in rows:
+            fh.write("\t".join([row["metric"], *map(str, row["values"])]) + "\n")
+    return rows
+
+
+# Visualizes the NanoStats of every sample, with the yield over time of
+# every sample if known, i.e. from sequencing summaries
+def _visualize_nanostats(output_dir, sample_stats, yields=None):
+    total = NanoStats()
+    for stats in sample_stats.values():
+        total.merge(stats)
+    columns = {ALL_SAMPLES: total, **sample_stats}
+
+    rows = _write_metrics(
+        os.path.join(output_dir, "nanostats.tsv"),
+        {name: stats.summary() for name, stats in columns.items()},
+    )
+    percentile_rows = _write_metrics(
+        os.path.join(output_dir, "percentiles.tsv"),
+        {name: stats.percentiles() for name, stats in columns.items()},
+    )
+    _write_distribution(
+        os.path.join(output_dir, "length_histogram.tsv"),
+        "length",
+        {name: stats.length_histogram() for name, stats in sample_stats.items()},
+    )
+    _write_distribution(
+        os.path.join(output_dir, "quality_histogram.tsv"),
+        "quality",
+        {name: stats.quality_histogram() for name, stats in sample_stats.items()},
+    )
+
+    yield_plot = None
+    if yields is not None:
+        _write_yields(os.path.join(output_dir, "yield_over_time.tsv"), yields)
+        with open(os.path.join(output_dir, PLOTLY_JS), "w") as fh:
+            fh.write(get_plotlyjs())
+        yield_plot = json.dumps(_yield_plot(yields))
+
+    index = os.path.join(NANOSTATS_TEMPLATES, "index.html")
+    context = {
+        "columns": list(columns),
+        "rows": rows,
+        "percentile_rows": percentile_rows,
+        "yield_plot": yield_plot,
+    }
+    q2templates.render([index], output_dir, context=context)
+
+
 def stats(
     output_dir: str,
-    sequences: CasavaOneEightSingleLanePerSampleDirFmt,
+    sequences: CasavaOneEightSingleLanePerSampleDirFmt = None,
+    read_stats: ReadStatsDirFmt = None,
+    nanostats: NanoStatsDirFmt = None,
+    read_metrics: ReadMetricsDirFmt = None,
+    sequencing_summary: SequencingSummaryDirFmt = None,
+    plots: bool = True,
+    threads: int = 4,
+    parallel_samples: int = 1,
+    subsample: int = None,
+    random_seed: int = 0,
+    preset: str = "full",
+    static_plots: bool = None,
+    only_report: bool = None,
+    drop_outliers: bool = None,
+    maxlength: int = None,
+    raw_data: bool = None,
+    bivariate_plots: list = None,
+    binned_plots: bool = None,
 ):
-    with tempfile.TemporaryDirectory() as nanoplot_output:
-        _run_nanoplot(sequences.path, nanoplot_output)
-        _create_visualization(output_dir, nanoplot_output)
+    inputs = (sequences, read_stats, nanostats, read_metrics, sequencing_summary)
+    if sum(x is not None for x in inputs) != 1:
+        raise ValueError(
+            "Either sequences, read statistics collected while trimming, "
+            "NanoStats, per-read metrics or sequencing summaries must be "
+            "provided, but not more than one of them."
+        )
+
+    # Statistics collected while trimming are shown without reading the
+    # sequences again
+    if read_stats is not None:
+        _visualize_read_stats(output_dir, read_stats)
+        return
+
+    # NanoStats computed beforehand, e.g. by stats_partitioned
+    if nanostats is not None:
+        _visualize_nanostats(output_dir, _load_nanostats(nanostats))
+        return
+
+    # Per-read metrics are summarized from their memory-mapped columns
+    if read_metrics is not None:
+        _visualize_nanostats(output_dir, _read_metrics_nanostats(read_metrics))
+        return
+
+    # Without plots the summary numbers are computed in-process, streaming
+    # the reads in constant memory instead of loading them all into NanoPlot
+    if not plots and sequencing_summary is not None:
+        _visualize_nanostats(
+            output_dir, *_summarize_sequencing_summaries(sequencing_summary)
+        )
+        return
+    if not plots:
+        _visualize_nanostats(output_dir, _summarize_sequences(sequences))
+        return
+
+    options = resolve_nanoplot_options(
+        preset,
+        static_plots=static_plots,
+        only_report=only_report,
+        drop_outliers=drop_outliers,
+        raw_data=raw_data,
+        bivariate_plots=bivariate_plots,
+        subsample=subsample,
+    )
+    subsample = options.pop("subsample")
+
+    # NanoPlot plots sequencing summaries, with the yield over time, in a
+    # fraction of the time it takes to parse the reads, so these are never
+    # subsampled
+    if sequencing_summary is not None:
+        sample_files = _summary_files(sequencing_summary)
+        input_format, subsample = "summary", 0
+    else:
+        sample_files = manifest_files(sequences)
+        input_format = "fastq"
+
+    # Unless requested explicitly, the binned plots are only computed when
+    # the reads are streamed anyway to subsample them, so that NanoPlot's
+    # input is not parsed twice. They replace NanoPlot's plots with one point
+    # per read, unless those are requested explicitly too
+    if binned_plots is None:
+        binned_plots = bool(subsample)
+    if binned_plots and bivariate_plots is None:
+        options["bivariate_plots"] = []
+    with tempfile.TemporaryDirectory() as subsampled_dir, (
+        tempfile.TemporaryDirectory()
+    ) as nanoplot_output:
+        # NanoPlot loads all reads into memory, so when subsampling it only
+        # gets a random sample of them. The exact totals and the binned plots
+        # are computed from all reads in the same pass
+        workers, _ = plan_sample_threads(threads, len(sample_files), parallel_samples)
+        if sequencing_summary is not None:
+            totals = None
+            histograms = _scan_summaries(sample_files, binned_plots, workers)
+        else:
+            sample_files, totals, histograms = _scan_sequences(
+                sample_files,
+                subsample,
+                random_seed,
+                binned_plots,
+                subsampled_dir,
+                workers,
+            )
+
+        sample_ids = _run_nanoplot(
+            sample_files,
+            nanoplot_output,
+            threads,
+            parallel_samples,
+            maxlength=maxlength,
+            input_format=input_format,
+            **options,
+        )
+        _create_visualization(
+            output_dir, nanoplot_output, sample_ids, totals, subsample, histograms
+        )
+
+
+# Visualizes the NanoStats of the reads of every sample, computed in
+# partitions of samples by separate actions. With QIIME 2's parallel
+# executor, e.g. Parsl, the partitions are distributed over its workers and
+# their NanoStats are merged before being visualized
+def stats_partitioned(ctx, sequences, num_partitions=None):
+    partition_method = ctx.get_action("long_reads_qc", "partition_reads")
+    compute_method = ctx.get_action("long_reads_qc", "compute_nanostats")
+    collate_method = ctx.get_action("long_reads_qc", "collate_nanostats")
+    stats_visualizer = ctx.get_action("long_reads_qc", "stats")
+
+    (partitioned_sequences,) = partition_method(sequences, num_partitions)
+    partition_stats = []
+    for partition in partitioned_sequences.values():
+        (nanostats,) = compute_method(partition)
+        partition_stats.append(nanostats)
+    (nanostats,) = collate_method(partition_stats)
+    (visualization,) = stats_visualizer(nanostats=nanostats)
+    return visualization
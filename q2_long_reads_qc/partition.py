@@ -0,0 +1,68 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2024, QIIME 2 development team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file LICENSE, distributed with this software.
+# ----------------------------------------------------------------------------
+import os
+import warnings
+
+import numpy as np
+from q2_types.per_sample_sequences import (
+    CasavaOneEightSingleLanePerSampleDirFmt,
+)
+
+from q2_long_reads_qc._utils import link_or_copy, manifest_files
+
+
+# Splits the samples of an artifact into partitions of consecutive samples
+# that can be processed independently, e.g. by QIIME 2's parallel
+# executor. Every sample gets its own partition unless 'num_partitions' is
+# given. The reads are linked, not copied, where possible
+def partition_reads(
+    reads: CasavaOneEightSingleLanePerSampleDirFmt, num_partitions: int = None
+) -> CasavaOneEightSingleLanePerSampleDirFmt:
+    sample_files = manifest_files(reads)
+    sample_ids = list(sample_files)
+
+    if num_partitions is None:
+        num_partitions = len(sample_ids)
+    elif num_partitions > len(sample_ids):
+        warnings.warn(
+            f"You have requested a number of partitions ({num_partitions}) "
+            f"that is greater than your number of samples ({len(sample_ids)}). "
+            f"Your data will be partitioned by sample into {len(sample_ids)} "
+            "partitions."
+        )
+        num_partitions = len(sample_ids)
+
+    # Partitions of single samples are named after them, others by index
+    partitions = {}
+    for i, group in enumerate(np.array_split(sample_ids, num_partitions)):
+        partition = CasavaOneEightSingleLanePerSampleDirFmt()
+        for sample_id in group:
+            for f in sample_files[sample_id]:
+                link_or_copy(f, os.path.join(partition.path, os.path.basename(f)))
+        key = group[0] if num_partitions == len(sample_ids) else str(i)
+        partitions[str(key)] = partition
+    return partitions
+
+
+# Merges partitions of samples back into a single artifact. Every sample
+# must be in a single partition
+def collate_reads(
+    reads: CasavaOneEightSingleLanePerSampleDirFmt,
+) -> CasavaOneEightSingleLanePerSampleDirFmt:
+    collated = CasavaOneEightSingleLanePerSampleDirFmt()
+    seen = set()
+    for partition in reads:
+        for sample_id, files in manifest_files(partition).items():
+            if sample_id in seen:
+                raise ValueError(
+                    f"Sample '{sample_id}' is present in more than one partition."
+                )
+            seen.add(sample_id)
+            for f in files:
+                link_or_copy(f, os.path.join(collated.path, os.path.basename(f)))
+    return collated
@@ -6,19 +6,72 @@
 # The full license is in the file LICENSE, distributed with this software.
 # ----------------------------------------------------------------------------
 
+from q2_types.sample_data import SampleData
 from qiime2.plugin import Citations, Plugin
 
 import q2_long_reads_qc
 from q2_long_reads_qc import __version__
 from q2_long_reads_qc._params import (
+    collate_nanostats_input_descriptions,
+    collate_nanostats_inputs,
+    collate_nanostats_output_descriptions,
+    collate_nanostats_outputs,
+    collate_reads_input_descriptions,
+    collate_reads_inputs,
+    collate_reads_output_descriptions,
+    collate_reads_outputs,
+    compute_nanostats_input_descriptions,
+    compute_nanostats_inputs,
+    compute_nanostats_output_descriptions,
+    compute_nanostats_outputs,
+    compute_read_metrics_input_descriptions,
+    compute_read_metrics_inputs,
+    compute_read_metrics_output_descriptions,
+    compute_read_metrics_outputs,
+    compute_read_metrics_parameter_descriptions,
+    compute_read_metrics_parameters,
+    partition_reads_input_descriptions,
+    partition_reads_inputs,
+    partition_reads_output_descriptions,
+    partition_reads_outputs,
+    partition_reads_parameter_descriptions,
+    partition_reads_parameters,
     stats_input_descriptions,
     stats_inputs,
+    stats_parameter_descriptions,
+    stats_parameters,
+    stats_partitioned_input_descriptions,
+    stats_partitioned_inputs,
+    stats_partitioned_output_descriptions,
+    stats_partitioned_outputs,
+    stats_partitioned_parameter_descriptions,
+    stats_partitioned_parameters,
     trim_input_descriptions,
     trim_inputs,
     trim_output_descriptions,
     trim_outputs,
     trim_parameter_descriptions,
     trim_parameters,
+    trim_partitioned_parameter_descriptions,
+    trim_partitioned_parameters,
+    trim_with_stats_output_descriptions,
+    trim_with_stats_outputs,
+    trim_with_stats_parameter_descriptions,
+    trim_with_stats_parameters,
+)
+from q2_long_reads_qc.types import (
+    NanoStats,
+    NanoStatsDirFmt,
+    NanoStatsFormat,
+    ReadMetrics,
+    ReadMetricsDirFmt,
+    ReadMetricsFormat,
+    ReadStats,
+    ReadStatsDirFmt,
+    ReadStatsFormat,
+    SequencingSummary,
+    SequencingSummaryDirFmt,
+    SequencingSummaryFormat,
 )
 
 citations = Citations.load("citations.bib", package="q2_long_reads_qc")
@@ -37,14 +90,44 @@ plugin = Plugin(
     short_description="QIIME2 plugin for quality control of long sequences.",
 )
 
+plugin.register_formats(
+    ReadStatsFormat,
+    ReadStatsDirFmt,
+    NanoStatsFormat,
+    NanoStatsDirFmt,
+    ReadMetricsFormat,
+    ReadMetricsDirFmt,
+    SequencingSummaryFormat,
+    SequencingSummaryDirFmt,
+)
+plugin.register_semantic_types(ReadStats, NanoStats, ReadMetrics, SequencingSummary)
+plugin.register_semantic_type_to_format(
+    SampleData[ReadStats], artifact_format=ReadStatsDirFmt
+)
+plugin.register_semantic_type_to_format(
+    SampleData[NanoStats], artifact_format=NanoStatsDirFmt
+)
+plugin.register_semantic_type_to_format(
+    SampleData[ReadMetrics], artifact_format=ReadMetricsDirFmt
+)
+plugin.register_semantic_type_to_format(
+    SampleData[SequencingSummary], artifact_format=SequencingSummaryDirFmt
+)
+
 plugin.visualizers.register_function(
     function=q2_long_reads_qc.stats,
     inputs=stats_inputs,
-    parameters="",
+    parameters=stats_parameters,
     input_descriptions=stats_input_descriptions,
-    parameter_descriptions={},
+    parameter_descriptions=stats_parameter_descriptions,
     name="Quality control statistics of long sequences.",
-    description="Quality control statistics of long sequences using NanoPlot.",
+    description=(
+        "Quality control statistics of long sequences using NanoPlot, or "
+        "only its summary statistics computed in-process, or of the read "
+        "statistics collected while trimming them, of NanoStats or "
+        "per-read metrics computed beforehand, or of the sequencing "
+        "summaries of the basecaller."
+    ),
     citations=[citations["Nanopack2"]],
 )
 
@@ -60,3 +143,128 @@ plugin.methods.register_function(
     description="Trim long demultiplexed sequences using Chopper tool.",
     citations=[citations["Nanopack2"]],
 )
+
+plugin.methods.register_function(
+    function=q2_long_reads_qc.trim_with_stats,
+    inputs=trim_inputs,
+    outputs=trim_with_stats_outputs,
+    parameters=trim_with_stats_parameters,
+    input_descriptions=trim_input_descriptions,
+    output_descriptions=trim_with_stats_output_descriptions,
+    parameter_descriptions=trim_with_stats_parameter_descriptions,
+    name="Trim long sequences and collect read statistics.",
+    description=(
+        "Trim long demultiplexed sequences using Chopper tool, collecting "
+        "statistics of the reads before and after trimming in the same pass. "
+        "The statistics can be visualized with the stats action without "
+        "reading the sequences again."
+    ),
+    citations=[citations["Nanopack2"]],
+)
+
+plugin.methods.register_function(
+    function=q2_long_reads_qc.partition_reads,
+    inputs=partition_reads_inputs,
+    outputs=partition_reads_outputs,
+    parameters=partition_reads_parameters,
+    input_descriptions=partition_reads_input_descriptions,
+    output_descriptions=partition_reads_output_descriptions,
+    parameter_descriptions=partition_reads_parameter_descriptions,
+    name="Partition sequences.",
+    description="Split demultiplexed sequences into partitions of samples.",
+)
+
+plugin.methods.register_function(
+    function=q2_long_reads_qc.collate_reads,
+    inputs=collate_reads_inputs,
+    outputs=collate_reads_outputs,
+    parameters={},
+    input_descriptions=collate_reads_input_descriptions,
+    output_descriptions=collate_reads_output_descriptions,
+    name="Collate sequences.",
+    description="Merge partitions of demultiplexed sequences into one artifact.",
+)
+
+plugin.pipelines.register_function(
+    function=q2_long_reads_qc.trim_partitioned,
+    inputs=trim_inputs,
+    outputs=trim_outputs,
+    parameters=trim_partitioned_parameters,
+    input_descriptions=trim_input_descriptions,
+    output_descriptions=trim_output_descriptions,
+    parameter_descriptions=trim_partitioned_parameter_descriptions,
+    name="Trim long sequences in partitions of samples.",
+    description=(
+        "Trim long demultiplexed sequences using Chopper tool like trim, "
+        "splitting the samples into partitions that are trimmed separately "
+        "and collated afterwards. With QIIME 2's parallel execution (e.g. "
+        "--parallel or a Parsl configuration), the partitions are trimmed "
+        "concurrently and may be distributed across the nodes of a cluster."
+    ),
+    citations=[citations["Nanopack2"]],
+)
+
+plugin.methods.register_function(
+    function=q2_long_reads_qc.compute_nanostats,
+    inputs=compute_nanostats_inputs,
+    outputs=compute_nanostats_outputs,
+    parameters={},
+    input_descriptions=compute_nanostats_input_descriptions,
+    output_descriptions=compute_nanostats_output_descriptions,
+    name="Compute NanoStats of long sequences.",
+    description=(
+        "Compute NanoPlot's summary statistics of the reads of every sample "
+        "in-process, streaming the reads in constant memory. The statistics "
+        "of several artifacts can be merged exactly with collate-nanostats "
+        "and visualized with stats."
+    ),
+    citations=[citations["Nanopack2"]],
+)
+
+plugin.methods.register_function(
+    function=q2_long_reads_qc.collate_nanostats,
+    inputs=collate_nanostats_inputs,
+    outputs=collate_nanostats_outputs,
+    parameters={},
+    input_descriptions=collate_nanostats_input_descriptions,
+    output_descriptions=collate_nanostats_output_descriptions,
+    name="Collate NanoStats.",
+    description="Merge the NanoStats of partitions of samples into one artifact.",
+)
+
+plugin.pipelines.register_function(
+    function=q2_long_reads_qc.stats_partitioned,
+    inputs=stats_partitioned_inputs,
+    outputs=stats_partitioned_outputs,
+    parameters=stats_partitioned_parameters,
+    input_descriptions=stats_partitioned_input_descriptions,
+    output_descriptions=stats_partitioned_output_descriptions,
+    parameter_descriptions=stats_partitioned_parameter_descriptions,
+    name="Quality control statistics of long sequences in partitions.",
+    description=(
+        "NanoPlot's summary statistics of long sequences computed in "
+        "partitions of samples, merged and visualized like stats without "
+        "plots. With QIIME 2's parallel execution (e.g. --parallel or a "
+        "Parsl configuration), the partitions are processed concurrently and "
+        "may be distributed across the nodes of a cluster."
+    ),
+    citations=[citations["Nanopack2"]],
+)
+
+plugin.methods.register_function(
+    function=q2_long_reads_qc.compute_read_metrics,
+    inputs=compute_read_metrics_inputs,
+    outputs=compute_read_metrics_outputs,
+    parameters=compute_read_metrics_parameters,
+    input_descriptions=compute_read_metrics_input_descriptions,
+    output_descriptions=compute_read_metrics_output_descriptions,
+    parameter_descriptions=compute_read_metrics_parameter_descriptions,
+    name="Compute per-read metrics of long sequences.",
+    description=(
+        "Compute the length, mean quality and GC fraction of every read and "
+        "whether it passes the given trimming filters, stored in a columnar "
+        "format (Arrow IPC) that is much faster to query than the FASTQ "
+        "files. The metrics can be visualized with stats."
+    ),
+    citations=[citations["Nanopack2"]],
+)
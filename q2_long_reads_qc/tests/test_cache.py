@@ -0,0 +1,118 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2024, QIIME 2 development team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file LICENSE, distributed with this software.
+# ----------------------------------------------------------------------------
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from q2_long_reads_qc._cache import ResultCache, file_digest, link_or_copy
+
+
+class TestResultCache(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.cache = ResultCache(os.path.join(self.temp_dir.name, "cache"), 100)
+        self.input_file = self._write("input.fastq.gz", b"input")
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def _write(self, name, content):
+        path = os.path.join(self.temp_dir.name, name)
+        with open(path, "wb") as fh:
+            fh.write(content)
+        return path
+
+    def _read(self, path):
+        with open(path, "rb") as fh:
+            return fh.read()
+
+    def test_file_digest(self):
+        self.assertEqual(
+            file_digest(self.input_file),
+            "c96c6d5be8d08a12e7b5cdc1b207fa6b2430974c86803d8891675e76fd992c20",
+        )
+
+    def test_key(self):
+        key = self.cache.key([self.input_file], {"quality": 10})
+        self.assertEqual(key, self.cache.key([self.input_file], {"quality": 10}))
+        self.assertNotEqual(key, self.cache.key([self.input_file], {"quality": 20}))
+
+        other_file = self._write("other.fastq.gz", b"other")
+        self.assertNotEqual(key, self.cache.key([other_file], {"quality": 10}))
+
+    def test_fetch_miss(self):
+        output_file = os.path.join(self.temp_dir.name, "out.fastq.gz")
+        self.assertFalse(self.cache.fetch("key", [output_file]))
+        self.assertFalse(os.path.exists(output_file))
+
+    def test_store_and_fetch(self):
+        fwd = self._write("fwd.fastq.gz", b"fwd")
+        rev = self._write("rev.fastq.gz", b"rev")
+        self.cache.store("key", [fwd, rev])
+
+        fwd_out = os.path.join(self.temp_dir.name, "fwd_out.fastq.gz")
+        rev_out = os.path.join(self.temp_dir.name, "rev_out.fastq.gz")
+        self.assertTrue(self.cache.fetch("key", [fwd_out, rev_out]))
+        self.assertEqual(self._read(fwd_out), b"fwd")
+        self.assertEqual(self._read(rev_out), b"rev")
+
+    def test_fetch_incomplete_entry(self):
+        self.cache.store("key", [self._write("fwd.fastq.gz", b"fwd")])
+        fwd_out = os.path.join(self.temp_dir.name, "fwd_out.fastq.gz")
+        rev_out = os.path.join(self.temp_dir.name, "rev_out.fastq.gz")
+        self.assertFalse(self.cache.fetch("key", [fwd_out, rev_out]))
+        self.assertFalse(os.path.exists(fwd_out))
+
+    def test_fetch_entry_evicted_concurrently(self):
+        fwd = self._write("fwd.fastq.gz", b"fwd")
+        rev = self._write("rev.fastq.gz", b"rev")
+        self.cache.store("key", [fwd, rev])
+        fwd_out = os.path.join(self.temp_dir.name, "fwd_out.fastq.gz")
+        rev_out = os.path.join(self.temp_dir.name, "rev_out.fastq.gz")
+
+        # Another run evicts the reverse entry once the forward one is linked
+        def link_then_evict(src, dst):
+            link_or_copy(src, dst)
+            os.unlink(os.path.join(self.cache.directory, "key.1.fastq.gz"))
+
+        with patch("q2_long_reads_qc._cache.link_or_copy", side_effect=link_then_evict):
+            self.assertFalse(self.cache.fetch("key", [fwd_out, rev_out]))
+        self.assertFalse(os.path.exists(fwd_out))
+        self.assertFalse(os.path.exists(rev_out))
+
+    def test_evict_least_recently_used(self):
+        for i, key in enumerate(("old", "used", "new")):
+            self.cache.store(key, [self._write(f"{key}.fastq.gz", b"x" * 40)])
+            entry = os.path.join(self.cache.directory, f"{key}.0.fastq.gz")
+            os.utime(entry, (i, i))
+
+        # Fetching marks the entry as recently used
+        output_file = os.path.join(self.temp_dir.name, "out.fastq.gz")
+        self.assertTrue(self.cache.fetch("used", [output_file]))
+
+        self.cache.evict()
+        self.assertEqual(
+            sorted(os.listdir(self.cache.directory)),
+            ["new.0.fastq.gz", "used.0.fastq.gz"],
+        )
+
+    def test_store_and_fetch_data(self):
+        self.assertIsNone(self.cache.fetch_data("key"))
+
+        self.cache.store_data("key", {"input": {"reads": 2}})
+        self.assertEqual(self.cache.fetch_data("key"), {"input": {"reads": 2}})
+
+        # Cached data counts towards the size of the cache
+        self.cache.max_size = 0
+        self.cache.evict()
+        self.assertIsNone(self.cache.fetch_data("key"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,191 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2024, QIIME 2 development team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file LICENSE, distributed with this software.
+# ----------------------------------------------------------------------------
+import asyncio
+import os
+import subprocess
+import tempfile
+import time
+import unittest
+
+from q2_long_reads_qc._executor import (
+    Pipeline,
+    run_pipeline_async,
+    run_pipelines,
+    run_tasks,
+)
+from q2_long_reads_qc._utils import run_pipeline
+
+
+class TestRunPipelines(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def _path(self, name):
+        return os.path.join(self.temp_dir.name, name)
+
+    def _read(self, name):
+        with open(self._path(name)) as fh:
+            return fh.read()
+
+    def test_run_pipelines(self):
+        pipelines = [
+            Pipeline([["echo", f"hello {i}\nworld"], ["grep", "hello"]], self._path(i))
+            for i in map(str, range(20))
+        ]
+        done = []
+
+        run_pipelines(pipelines, 4, on_done=done.append, verbose=False)
+
+        self.assertEqual(sorted(done), list(range(20)))
+        for i in map(str, range(20)):
+            self.assertEqual(self._read(i), f"hello {i}\n")
+
+    def test_stderr_capture(self):
+        pipeline = Pipeline(
+            [["sh", "-c", "echo hello; echo first >&2"], ["sh", "-c", "cat >&2"]]
+        )
+        (stderr,) = run_pipelines([pipeline], 1, verbose=False)
+        self.assertEqual(stderr, [b"first\n", b"hello\n"])
+
+    def test_failing_stage(self):
+        failing_cmd = ["sh", "-c", "echo broken >&2; exit 3"]
+        pipelines = [
+            Pipeline([["sleep", "30"], failing_cmd], self._path("failing")),
+            Pipeline([["sleep", "30"]], self._path("sibling")),
+        ]
+
+        start = time.monotonic()
+        with self.assertRaises(subprocess.CalledProcessError) as context:
+            run_pipelines(pipelines, 2, verbose=False)
+
+        # Both the rest of the pipeline and the sibling pipeline are killed
+        self.assertLess(time.monotonic() - start, 10)
+        self.assertEqual(context.exception.returncode, 3)
+        self.assertEqual(context.exception.cmd, failing_cmd)
+        self.assertEqual(context.exception.stderr, b"broken\n")
+
+    @unittest.skipUnless(os.path.isdir("/proc/self/fd"), "needs /proc/self/fd")
+    def test_missing_command(self):
+        fds = len(os.listdir("/proc/self/fd"))
+        pipeline = Pipeline(
+            [["echo", "hi"], ["no-such-command-xyz"], ["cat"]], self._path("out")
+        )
+
+        # The error of the missing stage is raised and no pipe end leaks
+        with self.assertRaises(FileNotFoundError):
+            run_pipelines([pipeline], 1, verbose=False)
+        self.assertEqual(len(os.listdir("/proc/self/fd")), fds)
+
+    def test_sigpipe_is_not_a_failure(self):
+        run_pipelines(
+            [Pipeline([["yes"], ["head", "-n", "1"]], self._path("out"))],
+            1,
+            verbose=False,
+        )
+        self.assertEqual(self._read("out"), "y\n")
+
+    def test_timeout(self):
+        start = time.monotonic()
+        with self.assertRaises(subprocess.TimeoutExpired):
+            run_pipelines(
+                [Pipeline([["sleep", "30"], ["cat"]], self._path("out"), 0.5)],
+                1,
+                verbose=False,
+            )
+        self.assertLess(time.monotonic() - start, 10)
+
+    def test_cancellation(self):
+        async def cancel():
+            task = asyncio.ensure_future(
+                run_pipeline_async(Pipeline([["sleep", "30"]]), verbose=False)
+            )
+            await asyncio.sleep(0.5)
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+
+        start = time.monotonic()
+        asyncio.run(cancel())
+        self.assertLess(time.monotonic() - start, 10)
+
+    def test_bounded_concurrency(self):
+        # Every pipeline writes the times it started and stopped
+        script = "date +%s.%N; sleep 0.3; date +%s.%N"
+        pipelines = [
+            Pipeline([["sh", "-c", script]], self._path(str(i))) for i in range(6)
+        ]
+        run_pipelines(pipelines, 2, verbose=False)
+
+        events = []
+        for i in range(6):
+            start, stop = map(float, self._read(str(i)).split())
+            events += [(start, 1), (stop, -1)]
+        running = [0]
+        for _, change in sorted(events):
+            running.append(running[-1] + change)
+        self.assertEqual(max(running), 2)
+
+
+class TestRunTasks(unittest.TestCase):
+    def test_pipelines_and_jobs(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = os.path.join(temp_dir, "out")
+            done = []
+
+            results = run_tasks(
+                [Pipeline([["echo", "hello"]], path), lambda: "job"],
+                2,
+                on_done=done.append,
+                verbose=False,
+            )
+
+            self.assertEqual(results, [[b""], "job"])
+            self.assertEqual(sorted(done), [0, 1])
+            with open(path) as fh:
+                self.assertEqual(fh.read(), "hello\n")
+
+    def test_jobs_and_pipelines_run_together(self):
+        # The job only finishes once the pipeline started alongside it did
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = os.path.join(temp_dir, "out")
+
+            def job():
+                deadline = time.monotonic() + 10
+                while not os.path.getsize(path):
+                    if time.monotonic() > deadline:
+                        raise Exception("The pipeline did not run")
+                    time.sleep(0.05)
+
+            open(path, "w").close()
+            run_tasks(
+                [job, Pipeline([["sh", "-c", "sleep 0.2; echo done"]], path)],
+                2,
+                verbose=False,
+            )
+
+    def test_failure_kills_all_tasks(self):
+        def failing_job():
+            time.sleep(0.5)
+            raise Exception("job failed")
+
+        def hung_job():
+            run_pipeline([["sleep", "30"]], os.devnull, verbose=False)
+
+        start = time.monotonic()
+        with self.assertRaisesRegex(Exception, "job failed"):
+            run_tasks(
+                [Pipeline([["sleep", "30"]]), hung_job, failing_job], 3, verbose=False
+            )
+        self.assertLess(time.monotonic() - start, 10)
+
+
+if __name__ == "__main__":
+    unittest.main()
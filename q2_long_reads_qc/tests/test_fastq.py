@@ -0,0 +1,271 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2024, QIIME 2 development team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file LICENSE, distributed with this software.
+# ----------------------------------------------------------------------------
+import io
+import unittest
+
+import numpy as np
+
+from q2_long_reads_qc._fastq import (
+    Batch,
+    filter_mask,
+    filter_pairs,
+    filter_reads,
+    format_records,
+    mean_qualities,
+    read_batches,
+    read_chunks,
+    read_id,
+    split_tagged,
+    tag_records,
+)
+from q2_long_reads_qc._stats import ReadStats
+
+FILTERS = {
+    "quality": 10,
+    "maxqual": 1000,
+    "minlength": 1,
+    "maxlength": 2147483647,
+    "headcrop": 0,
+    "tailcrop": 0,
+}
+
+
+def fastq(*reads):
+    return io.BytesIO(
+        b"".join(b"@%s\n%s\n+\n%s\n" % (name, seq, qual) for name, seq, qual in reads)
+    )
+
+
+class TestReadBatches(unittest.TestCase):
+    def test_read_batches(self):
+        reads = [(b"r%d x" % i, b"ACGT" * i, b"I" * 4 * i) for i in range(1, 50)]
+
+        batches = list(read_batches(fastq(*reads), batch_size=64))
+
+        self.assertGreater(len(batches), 1)
+        self.assertEqual(
+            [r for b in batches for r in zip(b.headers, b.seqs, b.quals)],
+            [(b"@" + h, s, q) for h, s, q in reads],
+        )
+
+    def test_no_trailing_newline(self):
+        batches = list(read_batches(io.BytesIO(b"@r1\nACGT\n+\nIIII")))
+        self.assertEqual(batches, [Batch([b"@r1"], [b"ACGT"], [b"IIII"])])
+
+    def test_crlf(self):
+        batches = list(read_batches(io.BytesIO(b"@r1\r\nACGT\r\n+\r\nIIII\r\n")))
+        self.assertEqual(batches, [Batch([b"@r1"], [b"ACGT"], [b"IIII"])])
+
+    def test_truncated_record(self):
+        with self.assertRaisesRegex(ValueError, "Truncated"):
+            list(read_batches(io.BytesIO(b"@r1\nACGT\n+\n")))
+
+    def test_invalid_record(self):
+        with self.assertRaisesRegex(ValueError, "does not start with '@'"):
+            list(read_batches(io.BytesIO(b"r1\nACGT\n+\nIIII\n")))
+
+
+class TestReadChunks(unittest.TestCase):
+    def test_read_chunks(self):
+        reads = [(b"r%d" % i, b"ACGT" * i, b"I" * 4 * i) for i in range(1, 50)]
+        data = fastq(*reads).getvalue()
+
+        chunks = list(read_chunks(io.BytesIO(data), chunk_size=100))
+
+        self.assertGreater(len(chunks), 1)
+        self.assertEqual(b"".join(chunks), data)
+        for chunk in chunks:
+            self.assertEqual(chunk.count(b"\n") % 4, 0)
+            self.assertTrue(chunk.startswith(b"@r"))
+
+    def test_record_longer_than_chunk(self):
+        data = fastq((b"r1", b"A" * 1000, b"I" * 1000), (b"r2", b"C", b"I")).getvalue()
+
+        chunks = list(read_chunks(io.BytesIO(data), chunk_size=10))
+
+        self.assertEqual(b"".join(chunks), data)
+        self.assertTrue(chunks[1].startswith(b"@r2"))
+
+    def test_no_trailing_newline(self):
+        data = b"@r1\nACGT\n+\nIIII\n@r2\nACGT\n+\nIIII"
+
+        chunks = list(read_chunks(io.BytesIO(data), chunk_size=20))
+
+        self.assertEqual(chunks, [b"@r1\nACGT\n+\nIIII\n", b"@r2\nACGT\n+\nIIII"])
+
+
+class TestReadId(unittest.TestCase):
+    def test_read_id(self):
+        self.assertEqual(read_id(b"@SRR1.5 5 length=299"), b"SRR1.5")
+        self.assertEqual(read_id(b"@read7/2"), b"read7")
+        self.assertEqual(read_id(b"@"), b"")
+
+
+class TestMeanQualities(unittest.TestCase):
+    def test_mean_qualities(self):
+        # Q10 and Q30 average to an error probability of 0.0505, not Q20
+        np.testing.assert_allclose(
+            mean_qualities([b"5555", b"+?", b"", b"I"]),
+            [20.0, 12.967, 0.0, 40.0],
+            atol=1e-3,
+        )
+
+
+class TestFilterMask(unittest.TestCase):
+    def mask(self, seqs, quals, **filters):
+        batch = Batch([b"@r"] * len(seqs), seqs, quals)
+        return filter_mask(batch, **{**FILTERS, **filters}).tolist()
+
+    def test_quality(self):
+        self.assertEqual(
+            self.mask([b"ACGT", b"ACGT"], [b"5555", b"''''"]), [True, False]
+        )
+
+    def test_maxqual(self):
+        self.assertEqual(
+            self.mask([b"ACGT", b"ACGT"], [b"5555", b"IIII"], maxqual=30),
+            [True, False],
+        )
+
+    def test_length_before_cropping(self):
+        self.assertEqual(
+            self.mask([b"ACGT", b"ACG"], [b"5555", b"555"], minlength=4, headcrop=1),
+            [True, False],
+        )
+
+    def test_maxlength(self):
+        self.assertEqual(
+            self.mask([b"ACGT", b"ACG"], [b"5555", b"555"], maxlength=3),
+            [False, True],
+        )
+
+    def test_cropped_away(self):
+        self.assertEqual(
+            self.mask([b"ACGT", b"ACGTA"], [b"5555", b"55555"], headcrop=2, tailcrop=2),
+            [False, True],
+        )
+
+
+class TestFormatRecords(unittest.TestCase):
+    def test_format_records(self):
+        batch = Batch(
+            [b"@r1", b"@r2", b"@r3"], [b"ACGTA", b"AC", b"GG"], [b"12345", b"12", b"34"]
+        )
+        self.assertEqual(
+            format_records(batch, [0, 1], headcrop=1, tailcrop=2),
+            b"@r1\nCG\n+\n23\n@r2\nAC\n+\n12\n",
+        )
+
+    def test_no_records(self):
+        self.assertEqual(format_records(Batch([], [], []), [], 0, 0), b"")
+
+
+class TestTaggedRecords(unittest.TestCase):
+    def test_tag_records(self):
+        (batch,) = read_batches(fastq((b"r1 desc", b"ACGT", b"IIII")))
+        self.assertEqual(tag_records(batch, 3), b"@3|r1 desc\nACGT\n+\nIIII\n")
+
+    def test_split_tagged(self):
+        tagged = b"".join(
+            tag_records(batch, tag)
+            for tag, reads in enumerate(
+                [[(b"r1", b"AC", b"II")], [(b"r2", b"G", b"I"), (b"r3", b"T", b"#")]]
+            )
+            for batch in read_batches(fastq(*reads))
+        )
+        (batch,) = read_batches(io.BytesIO(tagged))
+        self.assertEqual(
+            split_tagged(batch),
+            {
+                0: b"@r1\nAC\n+\nII\n",
+                1: b"@r2\nG\n+\nI\n@r3\nT\n+\n#\n",
+            },
+        )
+
+
+class TestFilterReads(unittest.TestCase):
+    def test_filter_reads(self):
+        fh_out = io.BytesIO()
+        reads = (b"r1", b"ACGTA", b"55555"), (b"r2", b"ACGTA", b"'''''")
+
+        filter_reads(fastq(*reads), fh_out, **{**FILTERS, "tailcrop": 1})
+
+        self.assertEqual(fh_out.getvalue(), b"@r1\nACGT\n+\n5555\n")
+
+    def test_filter_reads_stats(self):
+        stats = (ReadStats(), ReadStats())
+        reads = (b"r1", b"ACGTA", b"55555"), (b"r2", b"ACGTA", b"'''''")
+
+        filter_reads(fastq(*reads), io.BytesIO(), stats, **{**FILTERS, "tailcrop": 1})
+
+        input_stats, filtered_stats = stats
+        self.assertEqual((input_stats.reads, input_stats.bases), (2, 10))
+        # The filtered reads are counted after cropping
+        self.assertEqual((filtered_stats.reads, filtered_stats.bases), (1, 4))
+
+
+class TestFilterPairs(unittest.TestCase):
+    def setUp(self):
+        self.fwd = ((b"p1/1", b"ACGT", b"5555"), (b"p2/1", b"ACGT", b"5555"))
+        self.rev = ((b"p1/2", b"ACGT", b"5555"), (b"p2/2", b"ACGT", b"''''"))
+
+    def run_filter(self, policy, fwd=None, rev=None):
+        fwd_out, rev_out = io.BytesIO(), io.BytesIO()
+        filter_pairs(
+            fastq(*(fwd or self.fwd)),
+            fastq(*(rev or self.rev)),
+            fwd_out,
+            rev_out,
+            policy,
+            **FILTERS,
+        )
+        return fwd_out.getvalue(), rev_out.getvalue()
+
+    def test_stats(self):
+        stats = (ReadStats(), ReadStats())
+        filter_pairs(
+            fastq(*self.fwd),
+            fastq(*self.rev),
+            io.BytesIO(),
+            io.BytesIO(),
+            "both",
+            stats,
+            **FILTERS,
+        )
+        self.assertEqual(stats[0].reads, 4)
+        self.assertEqual(stats[1].reads, 2)
+
+    def test_both(self):
+        fwd, rev = self.run_filter("both")
+        self.assertEqual(fwd, b"@p1/1\nACGT\n+\n5555\n")
+        self.assertEqual(rev, b"@p1/2\nACGT\n+\n5555\n")
+
+    def test_either(self):
+        fwd, rev = self.run_filter("either")
+        self.assertEqual(fwd, fastq(*self.fwd).getvalue())
+        self.assertEqual(rev, fastq(*self.rev).getvalue())
+
+    def test_unknown_policy(self):
+        with self.assertRaisesRegex(ValueError, "policy"):
+            self.run_filter("independent")
+
+    def test_mates_out_of_order(self):
+        with self.assertRaisesRegex(ValueError, "not in the same order.*p1/1"):
+            self.run_filter("both", rev=self.rev[::-1])
+
+    def test_fewer_reverse_reads(self):
+        with self.assertRaisesRegex(ValueError, "reverse.*fewer"):
+            self.run_filter("both", rev=self.rev[:1])
+
+    def test_fewer_forward_reads(self):
+        with self.assertRaisesRegex(ValueError, "forward.*fewer"):
+            self.run_filter("both", fwd=self.fwd[:1])
+
+
+if __name__ == "__main__":
+    unittest.main()
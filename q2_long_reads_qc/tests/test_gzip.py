@@ -0,0 +1,45 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2024, QIIME 2 development team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file LICENSE, distributed with this software.
+# ----------------------------------------------------------------------------
+import gzip
+import unittest
+from unittest.mock import patch
+
+from q2_long_reads_qc._gzip import compress, construct_compression_command
+
+
+class TestConstructCompressionCommand(unittest.TestCase):
+    @patch("shutil.which", return_value="/usr/bin/pigz")
+    def test_pigz(self, _):
+        self.assertEqual(
+            construct_compression_command(level=4, threads=8),
+            ["pigz", "-c", "-4", "-p", "8"],
+        )
+
+    @patch("shutil.which", return_value=None)
+    def test_pigz_missing(self, _):
+        self.assertEqual(
+            construct_compression_command(level=4, threads=8),
+            ["gzip", "-c", "-4"],
+        )
+
+    @patch("shutil.which", return_value="/usr/bin/pigz")
+    def test_single_thread(self, _):
+        self.assertEqual(construct_compression_command(), ["gzip", "-c", "-6"])
+
+
+class TestCompress(unittest.TestCase):
+    def test_compress(self):
+        self.assertEqual(gzip.decompress(compress(b"ACGT" * 100, 1)), b"ACGT" * 100)
+
+    def test_concatenated_members(self):
+        data = compress(b"@r1\nACGT\n+\nIIII\n") + compress(b"@r2\nAC\n+\nII\n")
+        self.assertEqual(gzip.decompress(data), b"@r1\nACGT\n+\nIIII\n@r2\nAC\n+\nII\n")
+
+
+if __name__ == "__main__":
+    unittest.main()
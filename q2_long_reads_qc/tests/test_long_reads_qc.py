@@ -14,3 +14,19 @@ class LongReadsQCTestsBase(TestPluginBase):
 
     def setUp(self):
         super().setUp()
+
+
+# Pipeline context running the given actions in-process, one after another,
+# and recording their calls
+class FakeContext:
+    def __init__(self, actions):
+        self.actions = actions
+        self.calls = []
+
+    def get_action(self, plugin, action):
+        def run(*args, **kwargs):
+            self.calls.append((action, kwargs))
+            result = self.actions[action](*args, **kwargs)
+            return result if isinstance(result, tuple) else (result,)
+
+        return run
@@ -0,0 +1,82 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2024, QIIME 2 development team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file LICENSE, distributed with this software.
+# ----------------------------------------------------------------------------
+import gzip
+import os
+import tempfile
+import unittest
+
+import numpy as np
+import pyarrow as pa
+
+from q2_long_reads_qc._metrics import (
+    READ_METRICS_SCHEMA,
+    gc_fractions,
+    metrics_nanostats,
+    write_read_metrics,
+)
+from q2_long_reads_qc._stats import collect_nanostats
+
+FILTERS = {
+    "quality": 20,
+    "maxqual": 1000,
+    "minlength": 1,
+    "maxlength": 2147483647,
+    "headcrop": 0,
+    "tailcrop": 0,
+}
+
+
+class TestGCFractions(unittest.TestCase):
+    def test_gc_fractions(self):
+        np.testing.assert_allclose(
+            gc_fractions([b"GCGC", b"ATGc", b"", b"NNAT"]), [1, 0.5, 0, 0]
+        )
+
+
+class TestReadMetrics(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.temp_dir.cleanup)
+        self.files = []
+        for mate, quals in ((1, "I+"), (2, "II")):
+            path = os.path.join(self.temp_dir.name, f"R{mate}.fastq.gz")
+            with gzip.open(path, "wt") as fh:
+                for i, qual in enumerate(quals):
+                    seq = "ACGG" * (i + 1)
+                    fh.write(f"@r{i}/{mate} desc\n{seq}\n+\n{qual * len(seq)}\n")
+            self.files.append(path)
+        self.output = os.path.join(self.temp_dir.name, "s1.arrow")
+
+    def test_write_read_metrics(self):
+        write_read_metrics(self.files, self.output, FILTERS)
+
+        with pa.memory_map(self.output) as source:
+            table = pa.ipc.open_file(source).read_all()
+        self.assertEqual(table.schema, READ_METRICS_SCHEMA)
+        self.assertEqual(
+            table.to_pydict(),
+            {
+                "read_id": ["r0", "r1", "r0", "r1"],
+                "mate": [1, 1, 2, 2],
+                "length": [4, 8, 4, 8],
+                "mean_quality": [40.0, 10.0, 40.0, 40.0],
+                "gc_fraction": [0.75] * 4,
+                "passed": [True, False, True, True],
+            },
+        )
+
+    def test_metrics_nanostats(self):
+        write_read_metrics(self.files, self.output, FILTERS)
+
+        stats = metrics_nanostats(self.output)
+
+        self.assertEqual(stats.to_dict(), collect_nanostats(self.files).to_dict())
+
+
+if __name__ == "__main__":
+    unittest.main()
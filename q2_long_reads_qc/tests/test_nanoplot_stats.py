@@ -5,69 +5,171 @@
 #
 # The full license is in the file LICENSE, distributed with this software.
 # ----------------------------------------------------------------------------
+import functools
+import gzip
+import json
 import os
 import subprocess
 import tempfile
 import unittest
 from unittest.mock import patch
 
+import pyarrow as pa
 from q2_types.per_sample_sequences import (
     CasavaOneEightSingleLanePerSampleDirFmt,
 )
 
+from q2_long_reads_qc._fastq import Batch
+from q2_long_reads_qc._stats import LengthQualityHistogram, NanoStats, ReadStats
+from q2_long_reads_qc._utils import manifest_files
 from q2_long_reads_qc.nanoplot_stats import (
+    NANOPLOT_PRESETS,
+    TEMPLATES,
+    _copy_nanoplot_report,
     _create_visualization,
     _run_nanoplot,
+    _share_plotly,
+    collate_nanostats,
+    compute_nanostats,
+    compute_read_metrics,
+    construct_nanoplot_command,
+    resolve_nanoplot_options,
     stats,
-    TEMPLATES,
+    stats_partitioned,
+)
+from q2_long_reads_qc.partition import partition_reads
+from q2_long_reads_qc.tests.test_long_reads_qc import (
+    FakeContext,
+    LongReadsQCTestsBase,
+)
+from q2_long_reads_qc.tests.test_summary import write_summary
+from q2_long_reads_qc.types import (
+    NanoStatsDirFmt,
+    ReadStatsDirFmt,
+    SequencingSummaryDirFmt,
 )
-from q2_long_reads_qc.tests.test_long_reads_qc import LongReadsQCTestsBase
 
 
-class TestRunNanoPlot(LongReadsQCTestsBase):
-    @patch("q2_long_reads_qc.nanoplot_stats.run_command")
-    def test_run_nanoplot_success(self, mock_run_command):
-        """Test that _run_nanoplot runs successfully."""
-        sequences_path = self.get_data_path("nanoplot/")
-        with tempfile.TemporaryDirectory() as output_dir:
+def write_sample(dir_path, sample_id, reads=1, suffixes=("R1",)):
+    for suffix in suffixes:
+        file_path = os.path.join(dir_path, f"{sample_id}_0_L001_{suffix}_001.fastq.gz")
+        with gzip.open(file_path, "wb") as fh:
+            fh.write(b"@r\nACGT\n+\nIIII\n" * reads)
 
-            # Mock run_command to simulate successful execution
-            mock_run_command.return_value = None
 
-            # Call the function
-            _run_nanoplot(sequences_path, output_dir)
+def write_nanoplot_output(dir_path, sample_id, nanostats):
+    os.makedirs(os.path.join(dir_path, sample_id))
+    with open(os.path.join(dir_path, sample_id, "NanoStats.txt"), "w") as fh:
+        fh.write(nanostats)
+    with open(os.path.join(dir_path, sample_id, "NanoPlot-report.html"), "w") as fh:
+        fh.write("<html></html>")
 
-            # Check that run_command was called correctly
-            fastq_files = [
-                os.path.join(sequences_path, f)
-                for f in os.listdir(sequences_path)
-                if f.endswith(".fastq.gz")
-            ]
-            nanoplot_cmd = [
+
+class TestRunNanoPlot(LongReadsQCTestsBase):
+    def setUp(self):
+        super().setUp()
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.temp_dir.cleanup)
+        write_sample(self.temp_dir.name, "s1", suffixes=("R1", "R2"))
+        write_sample(self.temp_dir.name, "s2")
+        self.sequences = CasavaOneEightSingleLanePerSampleDirFmt(
+            self.temp_dir.name, mode="r"
+        )
+
+    def test_construct_nanoplot_command(self):
+        self.assertEqual(
+            construct_nanoplot_command(["a.fastq.gz", "b.fastq.gz"], "out", 3),
+            [
                 "NanoPlot",
                 "--fastq",
-                *fastq_files,
+                "a.fastq.gz",
+                "b.fastq.gz",
                 "-o",
-                output_dir,
-            ]
-            mock_run_command.assert_called_once_with(nanoplot_cmd, verbose=True)
+                "out",
+                "--threads",
+                "3",
+                "--tsv_stats",
+            ],
+        )
+
+    def test_construct_nanoplot_command_options(self):
+        cmd = construct_nanoplot_command(
+            ["a.fastq.gz"],
+            "out",
+            static_plots=False,
+            only_report=True,
+            drop_outliers=True,
+            maxlength=5000,
+            raw_data=True,
+            bivariate_plots=["kde", "dot"],
+        )
+        self.assertEqual(
+            cmd[8:],
+            [
+                "--no_static",
+                "--only-report",
+                "--drop_outliers",
+                "--maxlength",
+                "5000",
+                "--raw",
+                "--plots",
+                "kde",
+                "dot",
+            ],
+        )
+
+    def test_construct_nanoplot_command_no_bivariate_plots(self):
+        cmd = construct_nanoplot_command(["a.fastq.gz"], "out", bivariate_plots=[])
+        self.assertEqual(cmd[-1], "--plots")
+
+    def test_construct_nanoplot_command_summary(self):
+        cmd = construct_nanoplot_command(["sample1.txt"], "out", input_format="summary")
+        self.assertEqual(cmd[:3], ["NanoPlot", "--summary", "sample1.txt"])
 
-    @patch("q2_long_reads_qc.nanoplot_stats.run_command")
-    def test_run_nanoplot_exception(self, mock_run_command):
+    def test_resolve_nanoplot_options(self):
+        options = resolve_nanoplot_options(
+            "fast", static_plots=True, subsample=None, bivariate_plots=None
+        )
+        self.assertEqual(options, {**NANOPLOT_PRESETS["fast"], "static_plots": True})
+
+    @patch("q2_long_reads_qc.nanoplot_stats.run_pipelines")
+    def test_run_nanoplot_success(self, mock_run_pipelines):
+        """Test that _run_nanoplot runs one NanoPlot job per sample."""
+        sample_ids = _run_nanoplot(
+            manifest_files(self.sequences),
+            "/fake/output",
+            threads=4,
+            parallel_samples=2,
+        )
+
+        self.assertEqual(sample_ids, ["s1", "s2"])
+        (pipelines, workers), _ = mock_run_pipelines.call_args
+        self.assertEqual(workers, 2)
+        files = [
+            os.path.join(self.temp_dir.name, f"{sample}_0_L001_{suffix}_001.fastq.gz")
+            for sample, suffix in (("s1", "R1"), ("s1", "R2"), ("s2", "R1"))
+        ]
+        self.assertEqual(
+            [pipeline.cmds for pipeline in pipelines],
+            [
+                [construct_nanoplot_command(files[:2], "/fake/output/s1", 2)],
+                [construct_nanoplot_command(files[2:], "/fake/output/s2", 2)],
+            ],
+        )
+
+    @patch("q2_long_reads_qc.nanoplot_stats.run_pipelines")
+    def test_run_nanoplot_exception(self, mock_run_pipelines):
         """Test that _run_nanoplot raises an exception when NanoPlot
         fails."""
-        sequences_path = self.get_data_path("nanoplot/")
-        with tempfile.TemporaryDirectory() as output_dir:
-            # Mock run_command to raise CalledProcessError
-            mock_run_command.side_effect = subprocess.CalledProcessError(
-                returncode=1, cmd="NanoPlot"
-            )
-            with self.assertRaises(Exception) as context:
-                _run_nanoplot(sequences_path, output_dir)
-            self.assertIn(
-                "An error was encountered while running nanoplot",
-                str(context.exception),
-            )
+        mock_run_pipelines.side_effect = subprocess.CalledProcessError(
+            returncode=1, cmd="NanoPlot"
+        )
+        with self.assertRaises(Exception) as context:
+            _run_nanoplot(manifest_files(self.sequences), "/fake/output")
+        self.assertIn(
+            "An error was encountered while running nanoplot",
+            str(context.exception),
+        )
 
 
 class TestCreateVisualization(LongReadsQCTestsBase):
@@ -75,46 +177,539 @@ class TestCreateVisualization(LongReadsQCTestsBase):
     @patch("q2_long_reads_qc.nanoplot_stats.copy_tree")
     def test_create_visualization(self, mock_copy_tree, mock_render):
         """Test that copies templates and data, and renders the index.html."""
-        output_dir = "/fake/output/dir"
-        nanoplot_output = "/fake/nanoplot/output"
+        with tempfile.TemporaryDirectory() as nanoplot_output, (
+            tempfile.TemporaryDirectory()
+        ) as output_dir:
+            write_nanoplot_output(
+                nanoplot_output, "s1", "Metrics\tdataset\nnumber_of_reads\t10\n"
+            )
+            write_nanoplot_output(
+                nanoplot_output,
+                "s2",
+                "Metrics\tdataset\nnumber_of_reads\t20\nn50\t1000.0\n",
+            )
+
+            _create_visualization(output_dir, nanoplot_output, ["s1", "s2"])
+
+            # Check that the templates, the reports and plotly.js were copied
+            mock_copy_tree.assert_called_once_with(TEMPLATES, output_dir)
+            for sample_id in ("s1", "s2"):
+                self.assertTrue(
+                    os.path.exists(
+                        os.path.join(
+                            output_dir,
+                            "nanoplot_data",
+                            sample_id,
+                            "NanoPlot-report.html",
+                        )
+                    )
+                )
+            self.assertTrue(os.path.exists(os.path.join(output_dir, "plotly.min.js")))
+
+            # Check that q2templates.render was called correctly
+            expected_rows = [
+                {"metric": "number_of_reads", "values": ["10", "20"]},
+                {"metric": "n50", "values": ["", "1000.0"]},
+            ]
+            expected_context = {
+                "tabs": [{"title": "Nanoplot", "url": "index.html"}],
+                "samples": ["s1", "s2"],
+                "rows": expected_rows,
+                "totals": [],
+                "subsample": 0,
+                "binned_plots": {},
+            }
+            expected_index = os.path.join(TEMPLATES, "index.html")
+            mock_render.assert_called_once_with(
+                [expected_index],
+                output_dir,
+                context=expected_context,
+            )
+            with open(os.path.join(output_dir, "nanostats.tsv")) as fh:
+                self.assertEqual(
+                    fh.read(),
+                    "metric\ts1\ts2\nnumber_of_reads\t10\t20\nn50\t\t1000.0\n",
+                )
+
+    @patch("q2_long_reads_qc.nanoplot_stats.q2templates.render")
+    @patch("q2_long_reads_qc.nanoplot_stats.copy_tree")
+    def test_create_visualization_subsampled(self, mock_copy_tree, mock_render):
+        with tempfile.TemporaryDirectory() as nanoplot_output, (
+            tempfile.TemporaryDirectory()
+        ) as output_dir:
+            write_nanoplot_output(
+                nanoplot_output, "s1", "Metrics\tdataset\nnumber_of_reads\t10\n"
+            )
 
-        # Call the function
-        _create_visualization(output_dir, nanoplot_output)
+            _create_visualization(
+                output_dir, nanoplot_output, ["s1"], {"s1": (100, 5000)}, 10
+            )
+
+            context = mock_render.call_args.kwargs["context"]
+            self.assertEqual(context["subsample"], 10)
+            self.assertEqual(
+                context["totals"],
+                [
+                    {"metric": "total_reads", "values": ["100"]},
+                    {"metric": "total_bases", "values": ["5000"]},
+                ],
+            )
+            with open(os.path.join(output_dir, "nanostats.tsv")) as fh:
+                self.assertEqual(
+                    fh.read(),
+                    "metric\ts1\ntotal_reads\t100\ntotal_bases\t5000\n"
+                    "number_of_reads\t10\n",
+                )
 
-        # Check that copy_tree was called correctly for templates and data
-        mock_copy_tree.assert_any_call(TEMPLATES, output_dir)
-        mock_copy_tree.assert_any_call(
-            nanoplot_output,
-            os.path.join(output_dir, "nanoplot_data"),
+    @patch("q2_long_reads_qc.nanoplot_stats.q2templates.render")
+    @patch("q2_long_reads_qc.nanoplot_stats.copy_tree")
+    def test_create_visualization_binned(self, mock_copy_tree, mock_render):
+        histogram = LengthQualityHistogram()
+        histogram.add(
+            Batch([b"@r1", b"@r2"], [b"A" * 10, b"A" * 100], [b"I" * 10, b"+" * 100])
         )
+        with tempfile.TemporaryDirectory() as nanoplot_output, (
+            tempfile.TemporaryDirectory()
+        ) as output_dir:
+            write_nanoplot_output(nanoplot_output, "s1", "Metrics\tdataset\n")
 
-        # Check that q2templates.render was called correctly
-        expected_context = {"tabs": [{"title": "Nanoplot", "url": "index.html"}]}
-        expected_index = os.path.join(TEMPLATES, "index.html")
-        mock_render.assert_called_once_with(
-            [expected_index],
-            output_dir,
-            context=expected_context,
+            _create_visualization(
+                output_dir, nanoplot_output, ["s1"], histograms={"s1": histogram}
+            )
+
+            self.assertTrue(os.path.exists(os.path.join(output_dir, "plotly.min.js")))
+            with open(os.path.join(output_dir, "length_quality_histogram.tsv")) as fh:
+                self.assertEqual(
+                    fh.read(),
+                    "sample_id\tlength\tquality\tcount\n"
+                    "s1\t10\t40\t1\ns1\t100\t10\t1\n",
+                )
+            context = mock_render.call_args.kwargs["context"]
+            (trace,) = json.loads(context["binned_plots"]["s1"])["data"]
+            self.assertEqual(trace["type"], "heatmap")
+            self.assertEqual((len(trace["x"]), len(trace["y"])), (22, 32))
+            self.assertEqual(
+                (trace["z"][30][0], trace["z"][0][20], trace["z"][0][0]), (1, 1, None)
+            )
+
+
+class TestCopyNanoPlotReport(unittest.TestCase):
+    PLOTLY = '<script type="text/javascript">/**\n* plotly.js v2.0.0\n*/ x</script>'
+    CDN = '<script src="https://cdn.plot.ly/plotly-2.0.0.min.js"></script>'
+
+    def test_share_plotly(self):
+        html = f"<head>{self.PLOTLY}</head><body>{self.CDN}<div></div></body>"
+        self.assertEqual(
+            _share_plotly(html, "../plotly.min.js", "bundle"),
+            (
+                '<head><script src="../plotly.min.js"></script></head>'
+                "<body><div></div></body>",
+                False,
+            ),
+        )
+
+    def test_share_plotly_installed_bundle(self):
+        # The bundle of the installed plotly is recognized by its content,
+        # whatever its banner, and the script ends at the first </script>
+        html = (
+            '<script>var s = "<script>";</script>'
+            "<script>\n/* plotly */ bundle\n</script>"
+            "<script>Plotly.newPlot('x')</script>"
+        )
+        self.assertEqual(
+            _share_plotly(html, "plotly.min.js", "/* plotly */ bundle"),
+            (
+                '<script>var s = "<script>";</script>'
+                '<script src="plotly.min.js"></script>'
+                "<script>Plotly.newPlot('x')</script>",
+                False,
+            ),
         )
 
+    def test_share_plotly_without_plotly(self):
+        html = "<script>var x = 1;</script>"
+        self.assertEqual(_share_plotly(html, "plotly.min.js", "bundle"), (html, False))
+
+    def test_share_plotly_unrecognized_copy(self):
+        html = "<script>/* other */ bundle</script><script>Plotly.newPlot()</script>"
+        self.assertEqual(_share_plotly(html, "plotly.min.js", "bundle"), (html, True))
+
+    def test_copy_nanoplot_report(self):
+        with tempfile.TemporaryDirectory() as nanoplot_dir, (
+            tempfile.TemporaryDirectory()
+        ) as destination:
+            files = {
+                "NanoPlot-report.html": f'{self.PLOTLY}<img src="LengthHistogram.png">',
+                "LengthHistogram.png": "png",
+                "LengthHistogram.html": self.PLOTLY,
+                "NanoStats.txt": "stats",
+                "NanoPlot-data.tsv.gz": "data",
+                "NanoPlot_20240101.log": "log",
+            }
+            for filename, content in files.items():
+                with open(os.path.join(nanoplot_dir, filename), "w") as fh:
+                    fh.write(content)
+
+            _copy_nanoplot_report(
+                nanoplot_dir, destination, "../plotly.min.js", "bundle"
+            )
+
+            self.assertEqual(
+                sorted(os.listdir(destination)),
+                [
+                    "LengthHistogram.png",
+                    "NanoPlot-data.tsv.gz",
+                    "NanoPlot-report.html",
+                ],
+            )
+            with open(os.path.join(destination, "NanoPlot-report.html")) as fh:
+                self.assertEqual(
+                    fh.read(),
+                    '<script src="../plotly.min.js"></script>'
+                    '<img src="LengthHistogram.png">',
+                )
+
+    def test_copy_nanoplot_report_unrecognized_plotly(self):
+        with tempfile.TemporaryDirectory() as nanoplot_dir, (
+            tempfile.TemporaryDirectory()
+        ) as destination:
+            report = (
+                "<script>/* other */ bundle</script><script>Plotly.react()</script>"
+            )
+            with open(os.path.join(nanoplot_dir, "NanoPlot-report.html"), "w") as fh:
+                fh.write(report)
+
+            with self.assertWarnsRegex(UserWarning, "keeps its own copy"):
+                _copy_nanoplot_report(nanoplot_dir, destination, "p.js", "bundle")
+
+            with open(os.path.join(destination, "NanoPlot-report.html")) as fh:
+                self.assertEqual(fh.read(), report)
+
 
 class TestStats(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.temp_dir.cleanup)
+        write_sample(self.temp_dir.name, "s1", reads=20, suffixes=("R1", "R2"))
+        self.sequences = CasavaOneEightSingleLanePerSampleDirFmt(
+            self.temp_dir.name, mode="r"
+        )
+
     @patch("q2_long_reads_qc.nanoplot_stats._create_visualization")
-    @patch("q2_long_reads_qc.nanoplot_stats._run_nanoplot")
+    @patch("q2_long_reads_qc.nanoplot_stats._run_nanoplot", return_value=["s1"])
     def test_stats(self, mock_run_nanoplot, mock_create_visualization):
         """Test the stats function."""
-        # Create the necessary objects
         output_dir = "/fake/output/dir"
-        sequences = CasavaOneEightSingleLanePerSampleDirFmt()
-        sequences.path = "/fake/sequences/path"  # Set a fake path attribute
 
-        # Call the stats function
-        stats(output_dir, sequences)
+        stats(output_dir, self.sequences, threads=8, parallel_samples=2)
 
-        # Check that _run_nanoplot was called with the correct first argument
+        # Check that _run_nanoplot was called with the files and threads
         args, _ = mock_run_nanoplot.call_args
-        self.assertEqual(args[0], sequences.path)
+        self.assertEqual(
+            (args[0], args[2], args[3]), (manifest_files(self.sequences), 8, 2)
+        )
+
+        # Check that _create_visualization was called with correct arguments.
+        # Without subsampling, the reads are not parsed for binned plots
+        args, _ = mock_create_visualization.call_args
+        self.assertEqual(args, (output_dir, args[1], ["s1"], None, 0, None))
+        self.assertEqual(
+            mock_run_nanoplot.call_args.kwargs["bivariate_plots"], ["kde", "dot"]
+        )
+
+    @patch("q2_long_reads_qc.nanoplot_stats._create_visualization")
+    @patch("q2_long_reads_qc.nanoplot_stats._run_nanoplot", return_value=["s1"])
+    def test_stats_binned_plots(self, mock_run_nanoplot, mock_create_visualization):
+        stats("/fake/output/dir", self.sequences, binned_plots=True)
+
+        # Binned plots of all reads replace NanoPlot's bivariate plots
+        args, _ = mock_create_visualization.call_args
+        self.assertEqual(args[5]["s1"].counts.sum(), 40)
+        self.assertEqual(mock_run_nanoplot.call_args.kwargs["bivariate_plots"], [])
+
+    @patch("q2_long_reads_qc.nanoplot_stats._create_visualization")
+    @patch("q2_long_reads_qc.nanoplot_stats._run_nanoplot", return_value=["s1"])
+    def test_stats_subsample(self, mock_run_nanoplot, mock_create_visualization):
+        def check_subsample(sample_files, *args, **kwargs):
+            ((subsampled_file,),) = sample_files.values()
+            with gzip.open(subsampled_file) as fh:
+                self.assertEqual(fh.read(), b"@r\nACGT\n+\nIIII\n" * 5)
+            return ["s1"]
+
+        mock_run_nanoplot.side_effect = check_subsample
+
+        stats("/fake/output/dir", self.sequences, subsample=5, random_seed=1)
+
+        mock_run_nanoplot.assert_called_once()
+        # The totals count all reads of both mates
+        args, _ = mock_create_visualization.call_args
+        self.assertEqual(args[3:5], ({"s1": (40, 160)}, 5))
+        # All reads are streamed anyway, so they are binned by default
+        self.assertEqual(args[5]["s1"].counts.sum(), 40)
+
+    @patch("q2_long_reads_qc.nanoplot_stats._scan_sequences")
+    @patch("q2_long_reads_qc.nanoplot_stats._create_visualization")
+    @patch("q2_long_reads_qc.nanoplot_stats._run_nanoplot", return_value=["s1"])
+    def test_stats_fast_preset(
+        self, mock_run_nanoplot, mock_create_visualization, mock_scan
+    ):
+        mock_scan.return_value = ({"s1": ["sub.fastq.gz"]}, {"s1": (40, 160)}, None)
+
+        stats("/fake/output/dir", self.sequences, preset="fast", maxlength=100)
+
+        self.assertEqual(mock_scan.call_args.args[1], 100000)
+        _, kwargs = mock_run_nanoplot.call_args
+        self.assertEqual(
+            kwargs,
+            {
+                "maxlength": 100,
+                "input_format": "fastq",
+                "static_plots": False,
+                "only_report": True,
+                "drop_outliers": False,
+                "raw_data": False,
+                "bivariate_plots": [],
+            },
+        )
+
+    def test_stats_requires_one_input(self):
+        with self.assertRaisesRegex(ValueError, "not more than one"):
+            stats("/fake/output/dir")
+        with self.assertRaisesRegex(ValueError, "not more than one"):
+            stats(
+                "/fake/output/dir",
+                CasavaOneEightSingleLanePerSampleDirFmt(),
+                ReadStatsDirFmt(),
+            )
+
+    @patch("q2_long_reads_qc.nanoplot_stats.q2templates.render")
+    @patch("q2_long_reads_qc.nanoplot_stats._run_nanoplot")
+    def test_stats_read_stats(self, mock_run_nanoplot, mock_render):
+        input_stats, filtered = ReadStats(), ReadStats()
+        input_stats.add(Batch([b"@r1", b"@r2"], [b"ACGT", b"AC"], [b"IIII", b"''"]))
+        filtered.add(Batch([b"@r1"], [b"ACGT"], [b"IIII"]))
+        read_stats = ReadStatsDirFmt()
+        with open(read_stats.path / "sample1.json", "w") as fh:
+            json.dump(
+                {"input": input_stats.to_dict(), "filtered": filtered.to_dict()}, fh
+            )
+
+        with tempfile.TemporaryDirectory() as output_dir:
+            stats(output_dir, read_stats=read_stats)
+
+            # The reads are not read again
+            mock_run_nanoplot.assert_not_called()
+            (row,) = mock_render.call_args.kwargs["context"]["rows"]
+            self.assertEqual(row["sample_id"], "sample1")
+            self.assertEqual(
+                (row["reads"], row["n50"], row["mean_quality"]), (1, 4, 40)
+            )
+            self.assertEqual(row["reads_retained"], 0.5)
+            self.assertAlmostEqual(row["bases_retained"], 4 / 6)
+            with open(os.path.join(output_dir, "length_distribution.tsv")) as fh:
+                self.assertEqual(fh.read(), "sample_id\tlength\tcount\nsample1\t4\t1\n")
+            with open(os.path.join(output_dir, "read_stats.tsv")) as fh:
+                self.assertEqual(len(fh.read().splitlines()), 2)
+
+    @patch("q2_long_reads_qc.nanoplot_stats.q2templates.render")
+    @patch("q2_long_reads_qc.nanoplot_stats._run_nanoplot")
+    def test_stats_without_plots(self, mock_run_nanoplot, mock_render):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            write_sample(temp_dir, "s1")
+            write_sample(temp_dir, "s2", reads=2)
+            sequences = CasavaOneEightSingleLanePerSampleDirFmt(temp_dir, mode="r")
+
+            with tempfile.TemporaryDirectory() as output_dir:
+                stats(output_dir, sequences, plots=False)
+
+                mock_run_nanoplot.assert_not_called()
+                context = mock_render.call_args.kwargs["context"]
+                self.assertEqual(context["columns"], ["All samples", "s1", "s2"])
+                rows = {row["metric"]: row["values"] for row in context["rows"]}
+                self.assertEqual(rows["number_of_reads"], [3, 1, 2])
+                self.assertEqual(rows["n50"], [4, 4, 4])
+                self.assertEqual(rows[">Q15"], [3, 1, 2])
+                with open(os.path.join(output_dir, "length_histogram.tsv")) as fh:
+                    self.assertEqual(
+                        fh.read(), "sample_id\tlength\tcount\ns1\t4\t1\ns2\t4\t2\n"
+                    )
+                with open(os.path.join(output_dir, "nanostats.tsv")) as fh:
+                    self.assertEqual(fh.readline(), "metric\tAll samples\ts1\ts2\n")
+                percentiles = {
+                    row["metric"]: row["values"] for row in context["percentile_rows"]
+                }
+                self.assertEqual(percentiles["n50"], [4, 4, 4])
+                with open(os.path.join(output_dir, "percentiles.tsv")) as fh:
+                    self.assertEqual(fh.readline(), "metric\tAll samples\ts1\ts2\n")
+
+
+class TestPartitionedStats(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.temp_dir.cleanup)
+        write_sample(self.temp_dir.name, "s1")
+        write_sample(self.temp_dir.name, "s2", reads=2, suffixes=("R1", "R2"))
+        self.sequences = CasavaOneEightSingleLanePerSampleDirFmt(
+            self.temp_dir.name, mode="r"
+        )
+
+    def load(self, nanostats):
+        return {
+            path.name: json.loads(path.read_text())
+            for path in sorted(nanostats.path.glob("*.json"))
+        }
+
+    def test_compute_nanostats(self):
+        nanostats = self.load(compute_nanostats(self.sequences))
+
+        self.assertEqual(list(nanostats), ["s1.json", "s2.json"])
+        self.assertEqual(
+            (nanostats["s2.json"]["reads"], nanostats["s2.json"]["bases"]), (4, 16)
+        )
+
+    def test_collate_nanostats_merges_samples(self):
+        first = compute_nanostats(self.sequences)
+        second = NanoStatsDirFmt()
+        other = NanoStats()
+        other.add(Batch([b"@r"], [b"ACGTACGT"], [b"++++++++"]))
+        with open(second.path / "s1.json", "w") as fh:
+            json.dump(other.to_dict(), fh)
+
+        collated = self.load(collate_nanostats([first, second]))
 
-        # Check that _create_visualization was called with correct argument
+        self.assertEqual(list(collated), ["s1.json", "s2.json"])
+        s1 = NanoStats.from_dict(collated["s1.json"])
+        self.assertEqual((s1.reads, s1.bases, s1.longest), (2, 12, 8))
+        self.assertEqual(collated["s2.json"], self.load(first)["s2.json"])
+
+    @patch("q2_long_reads_qc.nanoplot_stats.q2templates.render")
+    def test_stats_nanostats(self, mock_render):
+        with tempfile.TemporaryDirectory() as output_dir:
+            stats(output_dir, sequences=self.sequences, plots=False)
+            expected = mock_render.call_args.kwargs["context"]
+
+        with tempfile.TemporaryDirectory() as output_dir:
+            stats(output_dir, nanostats=compute_nanostats(self.sequences))
+            self.assertEqual(mock_render.call_args.kwargs["context"], expected)
+
+    @patch("q2_long_reads_qc.nanoplot_stats.q2templates.render")
+    def test_stats_partitioned(self, mock_render):
+        with tempfile.TemporaryDirectory() as output_dir:
+            stats(output_dir, sequences=self.sequences, plots=False)
+            expected = mock_render.call_args.kwargs["context"]
+
+        with tempfile.TemporaryDirectory() as output_dir:
+            ctx = FakeContext(
+                {
+                    "partition_reads": partition_reads,
+                    "compute_nanostats": compute_nanostats,
+                    "collate_nanostats": collate_nanostats,
+                    "stats": functools.partial(stats, output_dir),
+                }
+            )
+            stats_partitioned(ctx, self.sequences)
+
+            # Every sample is analyzed separately
+            actions = [action for action, _ in ctx.calls]
+            self.assertEqual(actions.count("compute_nanostats"), 2)
+            self.assertEqual(mock_render.call_args.kwargs["context"], expected)
+
+
+class TestReadMetrics(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.temp_dir.cleanup)
+        write_sample(self.temp_dir.name, "s1")
+        write_sample(self.temp_dir.name, "s2", reads=2, suffixes=("R1", "R2"))
+        self.sequences = CasavaOneEightSingleLanePerSampleDirFmt(
+            self.temp_dir.name, mode="r"
+        )
+
+    def test_compute_read_metrics(self):
+        read_metrics = compute_read_metrics(
+            self.sequences, parallel_samples=2, minlength=5
+        )
+
+        self.assertEqual(
+            sorted(os.listdir(str(read_metrics))), ["s1.arrow", "s2.arrow"]
+        )
+        with pa.memory_map(str(read_metrics.path / "s2.arrow")) as source:
+            table = pa.ipc.open_file(source).read_all()
+        self.assertEqual(table.column("mate").to_pylist(), [1, 1, 2, 2])
+        self.assertEqual(table.column("passed").to_pylist(), [False] * 4)
+
+    @patch("q2_long_reads_qc.nanoplot_stats.q2templates.render")
+    def test_stats_read_metrics(self, mock_render):
+        with tempfile.TemporaryDirectory() as output_dir:
+            stats(output_dir, sequences=self.sequences, plots=False)
+            expected = mock_render.call_args.kwargs["context"]
+
+        with tempfile.TemporaryDirectory() as output_dir:
+            stats(output_dir, read_metrics=compute_read_metrics(self.sequences))
+            self.assertEqual(mock_render.call_args.kwargs["context"], expected)
+
+
+class TestSequencingSummaryStats(unittest.TestCase):
+    def setUp(self):
+        self.sequencing_summary = SequencingSummaryDirFmt()
+        write_summary(
+            self.sequencing_summary.path / "s1.txt",
+            [(10.0, 1000, 12.5), (700.0, 2000, 8.0)],
+        )
+        write_summary(self.sequencing_summary.path / "s2.txt", [(0.0, 500, 20.0)])
+
+    @patch("q2_long_reads_qc.nanoplot_stats._create_visualization")
+    @patch("q2_long_reads_qc.nanoplot_stats._run_nanoplot", return_value=["s1", "s2"])
+    def test_stats_sequencing_summary(
+        self, mock_run_nanoplot, mock_create_visualization
+    ):
+        stats(
+            "/fake/output/dir",
+            sequencing_summary=self.sequencing_summary,
+            subsample=5,
+            binned_plots=True,
+        )
+
+        # NanoPlot runs on the summaries, which are never subsampled
+        args, kwargs = mock_run_nanoplot.call_args
+        self.assertEqual(
+            args[0],
+            {
+                "s1": [str(self.sequencing_summary.path / "s1.txt")],
+                "s2": [str(self.sequencing_summary.path / "s2.txt")],
+            },
+        )
+        self.assertEqual(kwargs["input_format"], "summary")
         args, _ = mock_create_visualization.call_args
-        self.assertEqual(args[0], output_dir)
+        self.assertEqual(args[3:5], (None, 0))
+        self.assertEqual(args[5]["s1"].counts.sum(), 2)
+        self.assertEqual(args[5]["s2"].counts.sum(), 1)
+
+    @patch("q2_long_reads_qc.nanoplot_stats.q2templates.render")
+    @patch("q2_long_reads_qc.nanoplot_stats._run_nanoplot")
+    def test_stats_sequencing_summary_without_plots(
+        self, mock_run_nanoplot, mock_render
+    ):
+        with tempfile.TemporaryDirectory() as output_dir:
+            stats(output_dir, sequencing_summary=self.sequencing_summary, plots=False)
+
+            mock_run_nanoplot.assert_not_called()
+            context = mock_render.call_args.kwargs["context"]
+            self.assertEqual(context["columns"], ["All samples", "s1", "s2"])
+            rows = {row["metric"]: row["values"] for row in context["rows"]}
+            self.assertEqual(rows["number_of_reads"], [3, 2, 1])
+            self.assertEqual(rows["number_of_bases"], [3500, 3000, 500])
+
+            figure = json.loads(context["yield_plot"])
+            self.assertEqual([trace["name"] for trace in figure["data"]], ["s1", "s2"])
+            self.assertEqual(figure["data"][0]["y"], [1e-06, 3e-06])
+            with open(os.path.join(output_dir, "yield_over_time.tsv")) as fh:
+                self.assertEqual(
+                    fh.read().splitlines()[1:],
+                    [
+                        "s1\t0\t1\t1000\t1\t1000",
+                        "s1\t0.166667\t1\t2000\t2\t3000",
+                        "s2\t0\t1\t500\t1\t500",
+                    ],
+                )
+            self.assertTrue(os.path.exists(os.path.join(output_dir, "plotly.min.js")))
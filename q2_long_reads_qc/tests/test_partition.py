@@ -0,0 +1,84 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2024, QIIME 2 development team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file LICENSE, distributed with this software.
+# ----------------------------------------------------------------------------
+import gzip
+import os
+import tempfile
+import unittest
+
+from q2_types.per_sample_sequences import (
+    CasavaOneEightSingleLanePerSampleDirFmt,
+)
+
+from q2_long_reads_qc.partition import collate_reads, partition_reads
+
+
+def write_sample(dir_path, sample_id, suffixes=("R1",)):
+    for suffix in suffixes:
+        file_path = os.path.join(dir_path, f"{sample_id}_0_L001_{suffix}_001.fastq.gz")
+        with gzip.open(file_path, "wb") as fh:
+            fh.write(f"@{sample_id}\nACGT\n+\nIIII\n".encode())
+
+
+def sample_ids(reads):
+    return sorted(reads.manifest.index)
+
+
+class TestPartitionReads(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.temp_dir.cleanup)
+        write_sample(self.temp_dir.name, "s1", suffixes=("R1", "R2"))
+        write_sample(self.temp_dir.name, "s2", suffixes=("R1", "R2"))
+        write_sample(self.temp_dir.name, "s3", suffixes=("R1", "R2"))
+        self.reads = CasavaOneEightSingleLanePerSampleDirFmt(
+            self.temp_dir.name, mode="r"
+        )
+
+    def test_partition_by_sample(self):
+        partitions = partition_reads(self.reads)
+
+        self.assertEqual(list(partitions), ["s1", "s2", "s3"])
+        for sample_id, partition in partitions.items():
+            self.assertEqual(sample_ids(partition), [sample_id])
+            self.assertEqual(
+                sorted(os.listdir(partition.path)),
+                [
+                    f"{sample_id}_0_L001_R1_001.fastq.gz",
+                    f"{sample_id}_0_L001_R2_001.fastq.gz",
+                ],
+            )
+
+    def test_partition_in_groups(self):
+        partitions = partition_reads(self.reads, num_partitions=2)
+
+        self.assertEqual(list(partitions), ["0", "1"])
+        self.assertEqual(sample_ids(partitions["0"]), ["s1", "s2"])
+        self.assertEqual(sample_ids(partitions["1"]), ["s3"])
+
+    def test_more_partitions_than_samples(self):
+        with self.assertWarnsRegex(UserWarning, "greater than your number"):
+            partitions = partition_reads(self.reads, num_partitions=5)
+        self.assertEqual(list(partitions), ["s1", "s2", "s3"])
+
+    def test_collate_reads(self):
+        partitions = partition_reads(self.reads, num_partitions=2)
+
+        collated = collate_reads(list(partitions.values()))
+
+        self.assertEqual(sample_ids(collated), ["s1", "s2", "s3"])
+        self.assertEqual(
+            sorted(os.listdir(collated.path)), sorted(os.listdir(self.reads.path))
+        )
+
+    def test_collate_duplicate_samples(self):
+        with self.assertRaisesRegex(ValueError, "'s1' is present in more"):
+            collate_reads([self.reads, self.reads])
+
+
+if __name__ == "__main__":
+    unittest.main()
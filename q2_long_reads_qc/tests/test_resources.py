@@ -0,0 +1,249 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2024, QIIME 2 development team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file LICENSE, distributed with this software.
+# ----------------------------------------------------------------------------
+import unittest
+from unittest.mock import patch
+
+from q2_long_reads_qc._resources import (
+    THREAD_MEMORY,
+    WORKER_BASE_MEMORY,
+    ShardPlan,
+    ThreadPlan,
+    available_cpus,
+    available_memory,
+    plan_sample_threads,
+    plan_shards,
+    plan_threads,
+)
+
+
+def fake_files(contents):
+    return lambda path: contents.get(path)
+
+
+class TestAvailableCpus(unittest.TestCase):
+    @patch("q2_long_reads_qc._resources._read_first_line")
+    @patch("os.sched_getaffinity", create=True)
+    def test_affinity_only(self, mock_affinity, mock_read):
+        mock_affinity.return_value = set(range(8))
+        mock_read.side_effect = fake_files({})
+        self.assertEqual(available_cpus(), 8)
+
+    @patch("q2_long_reads_qc._resources._read_first_line")
+    @patch("os.sched_getaffinity", create=True)
+    def test_cgroup_v2_quota(self, mock_affinity, mock_read):
+        mock_affinity.return_value = set(range(64))
+        mock_read.side_effect = fake_files({"/sys/fs/cgroup/cpu.max": "250000 100000"})
+        self.assertEqual(available_cpus(), 3)
+
+    @patch("q2_long_reads_qc._resources._read_first_line")
+    @patch("os.sched_getaffinity", create=True)
+    def test_cgroup_v2_unlimited(self, mock_affinity, mock_read):
+        mock_affinity.return_value = set(range(4))
+        mock_read.side_effect = fake_files({"/sys/fs/cgroup/cpu.max": "max 100000"})
+        self.assertEqual(available_cpus(), 4)
+
+    @patch("q2_long_reads_qc._resources._read_first_line")
+    @patch("os.sched_getaffinity", create=True)
+    def test_cgroup_v1_quota(self, mock_affinity, mock_read):
+        mock_affinity.return_value = set(range(64))
+        mock_read.side_effect = fake_files(
+            {
+                "/sys/fs/cgroup/cpu/cpu.cfs_quota_us": "400000",
+                "/sys/fs/cgroup/cpu/cpu.cfs_period_us": "100000",
+            }
+        )
+        self.assertEqual(available_cpus(), 4)
+
+    @patch("q2_long_reads_qc._resources._read_first_line")
+    @patch("os.sched_getaffinity", create=True)
+    def test_affinity_smaller_than_quota(self, mock_affinity, mock_read):
+        mock_affinity.return_value = {0, 1}
+        mock_read.side_effect = fake_files({"/sys/fs/cgroup/cpu.max": "800000 100000"})
+        self.assertEqual(available_cpus(), 2)
+
+    @patch("q2_long_reads_qc._resources._read_lines")
+    @patch("q2_long_reads_qc._resources._read_first_line")
+    @patch("os.sched_getaffinity", create=True)
+    def test_nested_cgroup_v2_quota(self, mock_affinity, mock_read, mock_lines):
+        # A SLURM job step without a cgroup namespace: the quota is set on
+        # the job, an ancestor of the step the process runs in
+        mock_affinity.return_value = set(range(64))
+        mock_lines.return_value = ["0::/system.slice/slurmstepd.scope/job_42/step_0"]
+        mock_read.side_effect = fake_files(
+            {
+                "/sys/fs/cgroup/system.slice/slurmstepd.scope/job_42/cpu.max": (
+                    "200000 100000"
+                ),
+                "/sys/fs/cgroup/system.slice/slurmstepd.scope/job_42/step_0/"
+                "cpu.max": "max 100000",
+            }
+        )
+        self.assertEqual(available_cpus(), 2)
+
+    @patch("q2_long_reads_qc._resources._read_lines")
+    @patch("q2_long_reads_qc._resources._read_first_line")
+    @patch("os.sched_getaffinity", create=True)
+    def test_nested_cgroup_v1_quota(self, mock_affinity, mock_read, mock_lines):
+        mock_affinity.return_value = set(range(64))
+        mock_lines.return_value = [
+            "7:memory:/slurm/uid_1000/job_42",
+            "4:cpu,cpuacct:/slurm/uid_1000/job_42",
+        ]
+        mock_read.side_effect = fake_files(
+            {
+                "/sys/fs/cgroup/cpu/slurm/uid_1000/job_42/cpu.cfs_quota_us": "300000",
+                "/sys/fs/cgroup/cpu/slurm/uid_1000/job_42/cpu.cfs_period_us": (
+                    "100000"
+                ),
+            }
+        )
+        self.assertEqual(available_cpus(), 3)
+
+
+class TestAvailableMemory(unittest.TestCase):
+    @patch("builtins.open", side_effect=OSError)
+    @patch("q2_long_reads_qc._resources._read_lines")
+    @patch("q2_long_reads_qc._resources._read_first_line")
+    def test_nested_cgroup_v2_limit(self, mock_read, mock_lines, _):
+        # The smallest limit on the way up to the root wins
+        mock_lines.return_value = ["0::/slurm/job_42/step_0"]
+        mock_read.side_effect = fake_files(
+            {
+                "/sys/fs/cgroup/memory.max": "max",
+                "/sys/fs/cgroup/slurm/memory.max": "8388608",
+                "/sys/fs/cgroup/slurm/job_42/memory.max": "2097152",
+                "/sys/fs/cgroup/slurm/job_42/step_0/memory.max": "4194304",
+            }
+        )
+        self.assertEqual(available_memory(), 2097152)
+
+    @patch("builtins.open", side_effect=OSError)
+    @patch("q2_long_reads_qc._resources._read_lines")
+    @patch("q2_long_reads_qc._resources._read_first_line")
+    def test_nested_cgroup_v1_limit(self, mock_read, mock_lines, _):
+        mock_lines.return_value = ["7:memory:/slurm/uid_1000/job_42"]
+        mock_read.side_effect = fake_files(
+            {
+                "/sys/fs/cgroup/memory/memory.limit_in_bytes": str(2**63 - 4096),
+                "/sys/fs/cgroup/memory/slurm/uid_1000/job_42/"
+                "memory.limit_in_bytes": "1048576",
+            }
+        )
+        self.assertEqual(available_memory(), 1048576)
+
+    @patch("builtins.open", side_effect=OSError)
+    @patch("q2_long_reads_qc._resources._read_first_line")
+    def test_cgroup_v2_limit(self, mock_read, _):
+        mock_read.side_effect = fake_files({"/sys/fs/cgroup/memory.max": "1048576"})
+        self.assertEqual(available_memory(), 1048576)
+
+    @patch("builtins.open", side_effect=OSError)
+    @patch("q2_long_reads_qc._resources._read_first_line")
+    def test_cgroup_v1_unlimited(self, mock_read, _):
+        mock_read.side_effect = fake_files(
+            {"/sys/fs/cgroup/memory/memory.limit_in_bytes": str(2**63 - 4096)}
+        )
+        self.assertIsNone(available_memory())
+
+
+class TestPlanThreads(unittest.TestCase):
+    def test_single_worker(self):
+        plan = plan_threads(4, n_files=10, parallel_samples=1, memory=2**40)
+        self.assertEqual(plan, ThreadPlan(1, 2, 1))
+
+    def test_split_between_workers(self):
+        plan = plan_threads(32, n_files=10, parallel_samples=4, memory=2**40)
+        self.assertEqual(plan, ThreadPlan(4, 6, 1))
+
+    def test_workers_capped_by_files(self):
+        plan = plan_threads(16, n_files=2, parallel_samples=8, memory=2**40)
+        self.assertEqual(plan, ThreadPlan(2, 6, 1))
+
+    def test_workers_capped_by_threads(self):
+        plan = plan_threads(2, n_files=10, parallel_samples=8, memory=2**40)
+        self.assertEqual(plan, ThreadPlan(2, 1, 1))
+
+    def test_workers_capped_by_memory(self):
+        memory = 2 * (WORKER_BASE_MEMORY + 8 * THREAD_MEMORY)
+        plan = plan_threads(16, n_files=10, parallel_samples=8, memory=memory)
+        self.assertEqual(plan.workers, 2)
+
+    def test_parallel_compression(self):
+        plan = plan_threads(
+            32,
+            n_files=10,
+            parallel_samples=4,
+            memory=2**40,
+            parallel_compression=True,
+        )
+        self.assertEqual(plan, ThreadPlan(4, 3, 4))
+
+    def test_parallel_compression_small_budget(self):
+        plan = plan_threads(
+            2, n_files=1, parallel_samples=1, memory=2**40, parallel_compression=True
+        )
+        self.assertEqual(plan, ThreadPlan(1, 1, 1))
+
+    def test_no_trimmer(self):
+        plan = plan_threads(
+            32,
+            n_files=10,
+            parallel_samples=4,
+            memory=2**40,
+            parallel_compression=True,
+            trimmer=False,
+        )
+        self.assertEqual(plan, ThreadPlan(4, 0, 7))
+
+    def test_no_trimmer_memory(self):
+        # Without chopper threads, workers only need their base memory
+        memory = 4 * WORKER_BASE_MEMORY
+        plan = plan_threads(16, n_files=10, parallel_samples=4, memory=memory)
+        self.assertEqual(plan.workers, 1)
+        plan = plan_threads(
+            16, n_files=10, parallel_samples=4, memory=memory, trimmer=False
+        )
+        self.assertEqual(plan.workers, 4)
+
+    @patch("q2_long_reads_qc._resources.available_cpus", return_value=12)
+    def test_auto(self, _):
+        plan = plan_threads("auto", n_files=10, parallel_samples=3, memory=2**40)
+        self.assertEqual(plan, ThreadPlan(3, 2, 1))
+
+
+class TestPlanShards(unittest.TestCase):
+    def test_trimmer(self):
+        plan = plan_shards(8, 2**20, memory=2**40)
+        self.assertEqual(plan, ShardPlan(4, 8))
+
+    def test_no_trimmer(self):
+        plan = plan_shards(8, 2**20, trimmer=False, memory=2**40)
+        self.assertEqual(plan, ShardPlan(8, 16))
+
+    def test_window_capped_by_memory(self):
+        plan = plan_shards(8, 2**20, memory=9 * 2**20)
+        self.assertEqual(plan, ShardPlan(3, 3))
+
+    def test_tight_memory(self):
+        plan = plan_shards(8, 2**20, memory=2**20)
+        self.assertEqual(plan, ShardPlan(1, 1))
+
+
+class TestPlanSampleThreads(unittest.TestCase):
+    def test_split_between_samples(self):
+        self.assertEqual(plan_sample_threads(8, 10, 4), (4, 2))
+
+    def test_capped_by_samples(self):
+        self.assertEqual(plan_sample_threads(8, 2, 4), (2, 4))
+
+    def test_capped_by_threads(self):
+        self.assertEqual(plan_sample_threads(2, 10, 4), (2, 1))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,85 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2024, QIIME 2 development team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file LICENSE, distributed with this software.
+# ----------------------------------------------------------------------------
+import gzip
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from q2_long_reads_qc._fastq import Batch
+from q2_long_reads_qc._sampling import Reservoir, subsample_reads
+
+
+def batch(start, stop):
+    return Batch(
+        [b"@r%d" % i for i in range(start, stop)],
+        [b"A" * (i % 7 + 1) for i in range(start, stop)],
+        [b"I" * (i % 7 + 1) for i in range(start, stop)],
+    )
+
+
+def sample(size, n_reads, seed, batch_size=37):
+    reservoir = Reservoir(size, np.random.default_rng(seed))
+    for start in range(0, n_reads, batch_size):
+        reservoir.add(batch(start, min(start + batch_size, n_reads)))
+    return reservoir
+
+
+class TestReservoir(unittest.TestCase):
+    def test_fewer_reads_than_size(self):
+        reservoir = sample(100, 50, seed=1)
+        self.assertEqual(reservoir.to_batch(), batch(0, 50))
+
+    def test_counts_are_exact(self):
+        reservoir = sample(10, 1000, seed=1)
+        self.assertEqual(len(reservoir.to_batch()), 10)
+        self.assertEqual(reservoir.reads, 1000)
+        self.assertEqual(reservoir.bases, sum(i % 7 + 1 for i in range(1000)))
+
+    def test_seeded(self):
+        self.assertEqual(
+            sample(10, 1000, seed=1).to_batch(), sample(10, 1000, seed=1).to_batch()
+        )
+        self.assertNotEqual(
+            sample(10, 1000, seed=1).to_batch(), sample(10, 1000, seed=2).to_batch()
+        )
+
+    def test_sample_is_uniform(self):
+        counts = np.zeros(100)
+        for seed in range(2000):
+            for header in sample(10, 100, seed).headers:
+                counts[int(header[2:])] += 1
+        # Every read is drawn with probability 10 / 100
+        np.testing.assert_allclose(counts / 2000, 0.1, atol=0.025)
+
+    def test_empty_reservoir(self):
+        reservoir = sample(0, 100, seed=1)
+        self.assertEqual(len(reservoir.to_batch()), 0)
+        self.assertEqual(reservoir.reads, 100)
+
+
+class TestSubsampleReads(unittest.TestCase):
+    def test_subsample_reads(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            input_files = []
+            for i in range(2):
+                input_files.append(os.path.join(temp_dir, f"{i}.fastq.gz"))
+                with gzip.open(input_files[-1], "wb") as fh:
+                    fh.write(b"@r\nACGT\n+\nIIII\n" * 30)
+            output_file = os.path.join(temp_dir, "sample.fastq.gz")
+
+            totals = subsample_reads(input_files, output_file, 5, seed=0)
+
+            self.assertEqual(totals, (60, 240))
+            with gzip.open(output_file) as fh:
+                self.assertEqual(fh.read(), b"@r\nACGT\n+\nIIII\n" * 5)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,122 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2024, QIIME 2 development team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file LICENSE, distributed with this software.
+# ----------------------------------------------------------------------------
+import json
+import unittest
+
+import numpy as np
+
+from q2_long_reads_qc._sketch import LinearHistogram, LogHistogram
+
+
+def nx(values, q):
+    values = np.sort(values)[::-1]
+    return values[np.searchsorted(np.cumsum(values), values.sum() * q)]
+
+
+class TestLogHistogram(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(42)
+        self.values = rng.lognormal(8, 1, 10000).astype(np.int64) + 1
+        self.sketch = LogHistogram(128, 40)
+        for start in range(0, len(self.values), 1000):
+            self.sketch.add(self.values[start : start + 1000])
+
+    def test_counts_are_exact(self):
+        self.assertEqual(self.sketch.count, len(self.values))
+        self.assertEqual(self.sketch.total, self.values.sum())
+
+    def test_quantiles(self):
+        for q in (0.05, 0.25, 0.5, 0.75, 0.95):
+            self.assertAlmostEqual(
+                self.sketch.quantile(q) / np.quantile(self.values, q), 1, delta=0.006
+            )
+
+    def test_weighted_quantiles(self):
+        for q in (0.1, 0.5, 0.9):
+            self.assertAlmostEqual(
+                self.sketch.weighted_quantile(q) / nx(self.values, q), 1, delta=0.006
+            )
+
+    def test_small_values_are_exact(self):
+        sketch = LogHistogram(128, 40)
+        sketch.add(np.array([2, 3, 5]))
+        self.assertEqual(sketch.quantile(0.5), 3)
+        self.assertEqual(sketch.weighted_quantile(0.5), 5)
+        lower_bounds, counts = sketch.nonzero()
+        self.assertEqual((lower_bounds.tolist(), counts.tolist()), ([2, 3, 5], [1] * 3))
+
+    def test_values_beyond_the_last_bin(self):
+        sketch = LogHistogram(1, 2)
+        sketch.add(np.array([100]))
+        self.assertEqual(sketch.counts[-1], 1)
+        self.assertEqual(sketch.quantile(0.5), 100)
+
+    def test_merge_is_exact(self):
+        first, second = LogHistogram(128, 40), LogHistogram(128, 40)
+        first.add(self.values[:5000])
+        second.add(self.values[5000:])
+        merged = first.merge(second)
+        np.testing.assert_array_equal(merged.counts, self.sketch.counts)
+        np.testing.assert_array_equal(merged.sums, self.sketch.sums)
+
+    def test_merge_different_bins(self):
+        with self.assertRaisesRegex(ValueError, "same bins"):
+            self.sketch.merge(LogHistogram(64, 40))
+
+    def test_dict_round_trip(self):
+        data = json.loads(json.dumps(self.sketch.to_dict()))
+        sketch = LogHistogram.from_dict(data)
+        np.testing.assert_array_equal(sketch.counts, self.sketch.counts)
+        np.testing.assert_array_equal(sketch.sums, self.sketch.sums)
+        self.assertEqual(sketch.quantile(0.5), self.sketch.quantile(0.5))
+
+    def test_empty(self):
+        sketch = LogHistogram(128, 40)
+        sketch.add(np.array([], dtype=np.int64))
+        self.assertEqual((sketch.quantile(0.5), sketch.weighted_quantile(0.5)), (0, 0))
+
+
+class TestLinearHistogram(unittest.TestCase):
+    def test_quantiles(self):
+        rng = np.random.default_rng(42)
+        values = rng.uniform(5, 40, 10000)
+        sketch = LinearHistogram(10, 93)
+        sketch.add(values)
+
+        self.assertEqual(sketch.count, 10000)
+        for q in (0.05, 0.5, 0.95):
+            self.assertAlmostEqual(
+                sketch.quantile(q), np.quantile(values, q), delta=0.1
+            )
+
+    def test_values_are_clipped(self):
+        sketch = LinearHistogram(10, 93)
+        sketch.add(np.array([-1.0, 100.0]))
+        lower_bounds, counts = sketch.nonzero()
+        self.assertEqual(lower_bounds.tolist(), [0.0, 93.0])
+        self.assertEqual(counts.tolist(), [1, 1])
+
+    def test_merge_and_round_trip(self):
+        first, second = LinearHistogram(10, 93), LinearHistogram(10, 93)
+        first.add(np.array([10.0, 20.0]))
+        second.add(np.array([20.05]))
+        merged = LinearHistogram.from_dict(
+            json.loads(json.dumps(first.merge(second).to_dict()))
+        )
+        self.assertEqual(
+            dict(zip(*map(np.ndarray.tolist, merged.nonzero()))), {10.0: 1, 20.0: 2}
+        )
+        self.assertEqual(merged.quantile(0.5), 20.05)
+
+    def test_merge_different_bins(self):
+        with self.assertRaisesRegex(ValueError, "same bins"):
+            LinearHistogram(10, 93).merge(LinearHistogram(1, 93))
+
+
+if __name__ == "__main__":
+    unittest.main()
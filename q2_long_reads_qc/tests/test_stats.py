@@ -0,0 +1,215 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2024, QIIME 2 development team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file LICENSE, distributed with this software.
+# ----------------------------------------------------------------------------
+import gzip
+import json
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from q2_long_reads_qc._fastq import Batch
+from q2_long_reads_qc._stats import (
+    LengthQualityHistogram,
+    NanoStats,
+    ReadStats,
+    collect_nanostats,
+    retained_fraction,
+)
+
+
+def batch(*reads):
+    return Batch(
+        [b"@r%d" % i for i in range(len(reads))],
+        [seq for seq, _ in reads],
+        [qual for _, qual in reads],
+    )
+
+
+class TestReadStats(unittest.TestCase):
+    def setUp(self):
+        # Phred 40 ("I") and Phred 10 ("+") reads
+        self.stats = ReadStats()
+        self.stats.add(batch((b"ACGT", b"IIII"), (b"AC", b"++")))
+        self.stats.add(batch((b"ACGTACGT", b"IIIIIIII")))
+
+    def test_add(self):
+        self.assertEqual(self.stats.reads, 3)
+        self.assertEqual(self.stats.bases, 14)
+        self.assertEqual(self.stats.lengths, {2: 1, 4: 1, 8: 1})
+        self.assertEqual(self.stats.qualities, {10: 1, 40: 2})
+        self.assertAlmostEqual(self.stats.mean_quality, 30)
+        self.assertAlmostEqual(self.stats.mean_length, 14 / 3)
+
+    def test_add_empty_batch(self):
+        self.stats.add(batch())
+        self.assertEqual(self.stats.reads, 3)
+
+    def test_n50(self):
+        self.assertEqual(self.stats.n50, 8)
+        self.stats.add(batch((b"ACGTAC", b"IIIIII"), (b"ACGTAC", b"IIIIII")))
+        # Half of the 26 bases are in reads of at least 6 bases
+        self.assertEqual(self.stats.n50, 6)
+        self.assertEqual(ReadStats().n50, 0)
+
+    def test_merge(self):
+        other = ReadStats()
+        other.add(batch((b"ACGT", b"++++")))
+        self.stats.merge(other)
+
+        self.assertEqual(self.stats.reads, 4)
+        self.assertEqual(self.stats.bases, 18)
+        self.assertEqual(self.stats.lengths, {2: 1, 4: 2, 8: 1})
+        self.assertEqual(self.stats.qualities, {10: 2, 40: 2})
+
+    def test_dict_round_trip(self):
+        restored = ReadStats.from_dict(self.stats.to_dict())
+        self.assertEqual(restored.to_dict(), self.stats.to_dict())
+        self.assertEqual(restored.lengths, self.stats.lengths)
+
+    def test_retained_fraction(self):
+        self.assertEqual(retained_fraction(1, 4), 0.25)
+        self.assertEqual(retained_fraction(0, 0), 0.0)
+
+
+class TestNanoStats(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(42)
+        self.lengths = rng.lognormal(8, 1, 2000).astype(int) + 1
+        self.quals = rng.integers(33, 73, 2000)
+        reads = [
+            (b"A" * length, bytes([qual]) * length)
+            for length, qual in zip(self.lengths, self.quals)
+        ]
+        self.stats = NanoStats()
+        for start in range(0, len(reads), 300):
+            self.stats.add(batch(*reads[start : start + 300]))
+
+    def test_exact_numbers(self):
+        self.assertEqual(self.stats.reads, 2000)
+        self.assertEqual(self.stats.bases, self.lengths.sum())
+        self.assertEqual(self.stats.longest, self.lengths.max())
+        self.assertAlmostEqual(self.stats.mean_length, self.lengths.mean())
+        self.assertAlmostEqual(self.stats.length_stdev, self.lengths.std())
+        self.assertAlmostEqual(self.stats.mean_quality, (self.quals - 33).mean())
+        self.assertEqual(
+            self.stats.quality_cutoffs,
+            {t: int(np.sum(self.quals - 33 > t)) for t in (5, 7, 10, 12, 15)},
+        )
+
+    def test_estimates(self):
+        self.assertAlmostEqual(
+            self.stats.median_length / np.median(self.lengths), 1, delta=0.006
+        )
+        self.assertAlmostEqual(
+            self.stats.median_quality, np.median(self.quals - 33), delta=0.1
+        )
+
+        lengths = np.sort(self.lengths)[::-1]
+        n50 = lengths[np.searchsorted(np.cumsum(lengths), lengths.sum() / 2)]
+        self.assertAlmostEqual(self.stats.n50 / n50, 1, delta=0.006)
+
+    def test_percentiles(self):
+        percentiles = self.stats.percentiles()
+
+        self.assertEqual(percentiles["read_length_p50"], self.stats.median_length)
+        self.assertEqual(percentiles["n50"], self.stats.n50)
+        self.assertAlmostEqual(
+            percentiles["read_length_p90"] / np.quantile(self.lengths, 0.9),
+            1,
+            delta=0.006,
+        )
+        self.assertLess(percentiles["n90"], percentiles["n10"])
+        self.assertAlmostEqual(
+            percentiles["qual_p25"], np.quantile(self.quals - 33, 0.25), delta=0.1
+        )
+
+    def test_short_reads_are_exact(self):
+        stats = NanoStats()
+        stats.add(batch((b"AC", b"II"), (b"ACG", b"III"), (b"ACGTA", b"IIIII")))
+        self.assertEqual(stats.median_length, 3)
+        # Half of the 10 bases are in reads of at least 5 bases
+        self.assertEqual(stats.n50, 5)
+        self.assertEqual(stats.length_histogram(), {2: 1, 3: 1, 5: 1})
+        self.assertEqual(stats.quality_histogram(), {40.0: 3})
+
+    def test_merge(self):
+        other = NanoStats()
+        other.add(batch((b"ACGT", b"++++")))
+        total = NanoStats().merge(self.stats).merge(other)
+
+        self.assertEqual(total.reads, 2001)
+        self.assertEqual(total.bases, self.stats.bases + 4)
+        self.assertEqual(total.length_histogram()[4], 1 + np.sum(self.lengths == 4))
+        self.assertEqual(total.quality_cutoffs[5], self.stats.quality_cutoffs[5] + 1)
+
+    def test_dict_round_trip(self):
+        data = json.loads(json.dumps(self.stats.to_dict()))
+        stats = NanoStats.from_dict(data)
+
+        self.assertEqual(stats.summary(), self.stats.summary())
+        self.assertEqual(stats.percentiles(), self.stats.percentiles())
+        self.assertEqual(stats.to_dict(), self.stats.to_dict())
+
+    def test_empty(self):
+        summary = NanoStats().summary()
+        self.assertEqual(summary["number_of_reads"], 0)
+        self.assertEqual(summary["n50"], 0)
+        self.assertEqual(summary["median_qual"], 0)
+        self.assertEqual(summary[">Q5"], 0)
+
+    def test_collect_nanostats(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            paths = [os.path.join(temp_dir, f"{i}.fastq.gz") for i in range(2)]
+            for path in paths:
+                with gzip.open(path, "wb") as fh:
+                    fh.write(b"@r1\nACGT\n+\nIIII\n@r2\nAC\n+\n++\n")
+
+            stats = collect_nanostats(paths)
+
+        self.assertEqual((stats.reads, stats.bases), (4, 12))
+        self.assertEqual(stats.quality_cutoffs[12], 2)
+
+
+class TestLengthQualityHistogram(unittest.TestCase):
+    def setUp(self):
+        # Reads of 10 and 100 bases of Phred 40 ("I") and 10 ("+")
+        self.histogram = LengthQualityHistogram()
+        self.histogram.add(
+            batch(
+                (b"A" * 10, b"I" * 10), (b"A" * 10, b"I" * 10), (b"A" * 100, b"+" * 100)
+            )
+        )
+
+    def test_add(self):
+        self.assertEqual(self.histogram.counts.sum(), 3)
+        self.assertEqual(list(self.histogram.bins()), [(10.0, 40, 2), (100.0, 10, 1)])
+
+    def test_cropped(self):
+        length_edges, quality_edges, counts = self.histogram.cropped()
+
+        # 20 length bins per power of ten, from 10 to just over 100
+        self.assertEqual(len(length_edges), 22)
+        np.testing.assert_allclose(length_edges[[0, 20]], [10, 100])
+        np.testing.assert_array_equal(quality_edges, np.arange(10, 42))
+        self.assertEqual(counts.shape, (31, 21))
+        self.assertEqual((counts[30, 0], counts[0, 20], counts.sum()), (2, 1, 3))
+
+    def test_cropped_empty(self):
+        length_edges, quality_edges, counts = LengthQualityHistogram().cropped()
+        self.assertEqual((len(length_edges), counts.size), (0, 0))
+
+    def test_merge(self):
+        other = LengthQualityHistogram()
+        other.add(batch((b"A" * 10, b"I" * 10)))
+        self.histogram.merge(other)
+        self.assertEqual(list(self.histogram.bins())[0], (10.0, 40, 3))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,96 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2024, QIIME 2 development team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file LICENSE, distributed with this software.
+# ----------------------------------------------------------------------------
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from q2_long_reads_qc._stats import NanoStats
+from q2_long_reads_qc._summary import (
+    YieldOverTime,
+    read_summary_chunks,
+    summarize_summaries,
+)
+
+SUMMARY_HEADER = (
+    "filename\tread_id\tchannel\tstart_time\tduration\tpasses_filtering\t"
+    "sequence_length_template\tmean_qscore_template\n"
+)
+
+
+# Writes a sequencing summary of reads given as (start time, length, mean
+# quality)
+def write_summary(path, reads):
+    with open(path, "w") as fh:
+        fh.write(SUMMARY_HEADER)
+        for i, (start_time, length, quality) in enumerate(reads):
+            fh.write(
+                f"run.pod5\tread{i}\t{i + 1}\t{start_time}\t1.5\tTRUE\t"
+                f"{length}\t{quality}\n"
+            )
+
+
+class TestSequencingSummary(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.temp_dir.cleanup)
+        self.path = os.path.join(self.temp_dir.name, "sample1.txt")
+        self.reads = [(10.5, 1000, 12.5), (700.0, 2000, 8.0), (1900.0, 500, 20.0)]
+        write_summary(self.path, self.reads)
+
+    def test_read_summary_chunks(self):
+        chunks = list(read_summary_chunks(self.path, chunk_rows=2))
+
+        self.assertEqual([len(chunk) for chunk in chunks], [2, 1])
+        # Only the needed columns are parsed
+        self.assertEqual(
+            list(chunks[0].columns),
+            ["start_time", "sequence_length_template", "mean_qscore_template"],
+        )
+        self.assertEqual(chunks[1]["sequence_length_template"].tolist(), [500])
+
+    def test_summarize_summaries(self):
+        stats, yields = summarize_summaries([self.path, self.path])
+
+        expected = NanoStats()
+        for _ in range(2):
+            expected.add_reads(np.array([1000, 2000, 500]), np.array([12.5, 8.0, 20.0]))
+        self.assertEqual(stats.to_dict(), expected.to_dict())
+        self.assertEqual(yields.reads.tolist(), [2, 2, 0, 2])
+        self.assertEqual(yields.bases.tolist(), [2000, 4000, 0, 1000])
+
+
+class TestYieldOverTime(unittest.TestCase):
+    def test_add(self):
+        yields = YieldOverTime(bin_seconds=60)
+        yields.add(np.array([0.0, 59.9, 130.0]), np.array([10, 20, 30]))
+        yields.add(np.array([61.0]), np.array([5]))
+
+        self.assertEqual(yields.reads.tolist(), [2, 1, 1])
+        self.assertEqual(yields.bases.tolist(), [30, 5, 30])
+        hours, reads, bases = yields.cumulative()
+        np.testing.assert_allclose(hours, [0, 1 / 60, 2 / 60])
+        self.assertEqual((reads.tolist(), bases.tolist()), ([2, 3, 4], [30, 35, 65]))
+
+    def test_merge(self):
+        first, second = YieldOverTime(60), YieldOverTime(60)
+        first.add(np.array([0.0]), np.array([10]))
+        second.add(np.array([0.0, 200.0]), np.array([1, 2]))
+
+        merged = first.merge(second)
+        self.assertEqual(merged.reads.tolist(), [2, 0, 0, 1])
+        self.assertEqual(merged.bases.tolist(), [11, 0, 0, 2])
+
+    def test_merge_different_bins(self):
+        with self.assertRaisesRegex(ValueError, "same bins"):
+            YieldOverTime(60).merge(YieldOverTime(600))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -5,12 +5,16 @@
 #
 # The full license is in the file LICENSE, distributed with this software.
 # ----------------------------------------------------------------------------
+import functools
 import gzip
+import inspect
 import itertools
+import json
 import os
 import shutil
 import subprocess
 import tempfile
+import time
 import unittest
 from unittest.mock import patch
 
@@ -18,11 +22,31 @@ from q2_types.per_sample_sequences import (
     CasavaOneEightSingleLanePerSampleDirFmt,
 )
 
-from q2_long_reads_qc.tests.test_long_reads_qc import LongReadsQCTestsBase
+from q2_long_reads_qc._executor import Pipeline
+from q2_long_reads_qc._resources import ShardPlan, ThreadPlan, plan_shards
+from q2_long_reads_qc._stats import ReadStats
+from q2_long_reads_qc._utils import run_pipeline
+from q2_long_reads_qc.partition import collate_reads, partition_reads
+from q2_long_reads_qc.tests.test_long_reads_qc import (
+    FakeContext,
+    LongReadsQCTestsBase,
+)
 from q2_long_reads_qc.trim_long_reads import (
+    SHARD_SIZE,
+    _group_files,
+    _run_jobs,
+    _run_trimming_pipeline,
+    _Unit,
+    batch_and_rezip,
+    chopper_reads_gzip,
+    chopper_version,
     construct_chopper_command,
+    filter_and_rezip,
     process_and_rezip,
+    shard_and_rezip,
     trim,
+    trim_partitioned,
+    trim_with_stats,
 )
 
 seq_ids_maxlen10000 = [
@@ -185,6 +209,664 @@ class TestTrim(LongReadsQCTestsBase):
                         obs_id = obs_seq_h.split()[0]
                         self.assertTrue(obs_id in seq_ids_pe_minq_20)
 
+    def test_trimmed_pe_parallel_samples(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            temp_input_dir = os.path.join(temp_dir, "input")
+            shutil.copytree(self.source_dir_pe, temp_input_dir)
+            query_reads = CasavaOneEightSingleLanePerSampleDirFmt(
+                temp_input_dir, mode="r"
+            )
+
+            trimmed = trim(query_reads, quality=20, parallel_samples=4)
+
+            fastq_files = [
+                f for f in os.listdir(str(trimmed)) if f.endswith(".fastq.gz")
+            ]
+            self.assertEqual(len(fastq_files), 4)
+            for obs_fp in fastq_files:
+                with gzip.open(os.path.join(str(trimmed), obs_fp), "rt") as obs_fh:
+                    for records in itertools.zip_longest(*[obs_fh] * 4):
+                        obs_id = records[0].split()[0]
+                        self.assertTrue(obs_id in seq_ids_pe_minq_20)
+
+    def test_trimmed_se_compression_level(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            temp_input_dir = os.path.join(temp_dir, "input")
+            shutil.copytree(self.source_dir, temp_input_dir)
+            query_reads = CasavaOneEightSingleLanePerSampleDirFmt(
+                temp_input_dir, mode="r"
+            )
+
+            for level, xfl in ((1, 4), (9, 2)):
+                trimmed = trim(
+                    query_reads, maxlength=10000, threads=8, compression_level=level
+                )
+
+                for obs_fp in os.listdir(str(trimmed)):
+                    if not obs_fp.endswith(".fastq.gz"):
+                        continue
+                    obs_path = os.path.join(str(trimmed), obs_fp)
+                    # The extra flags of the gzip header tell the compression
+                    # level: 4 for the fastest and 2 for the best compression
+                    with open(obs_path, "rb") as obs_fh:
+                        self.assertEqual(obs_fh.read(9)[8], xfl)
+                    with gzip.open(obs_path, "rt") as obs_fh:
+                        for records in itertools.zip_longest(*[obs_fh] * 4):
+                            obs_id = records[0].strip("@\n")
+                            self.assertTrue(obs_id in seq_ids_maxlen10000)
+
+    def _write_pairs(self, dir_path, pairs):
+        for suffix, mates in (
+            ("R1", [p[0] for p in pairs]),
+            ("R2", [p[1] for p in pairs]),
+        ):
+            file_path = os.path.join(dir_path, f"sampleA_0_L001_{suffix}_001.fastq.gz")
+            with gzip.open(file_path, "wt") as fh:
+                for name, qual in mates:
+                    fh.write(f"@{name}\nACGTACGT\n+\n{qual * 8}\n")
+
+    def _trim_pairs(self, pair_policy):
+        pairs = [
+            (("p1/1", "I"), ("p1/2", "I")),
+            (("p2/1", "I"), ("p2/2", "'")),
+            (("p3/1", "'"), ("p3/2", "'")),
+        ]
+        with tempfile.TemporaryDirectory() as temp_dir:
+            self._write_pairs(temp_dir, pairs)
+            query_reads = CasavaOneEightSingleLanePerSampleDirFmt(temp_dir, mode="r")
+
+            trimmed = trim(query_reads, quality=20, pair_policy=pair_policy)
+
+            ids = []
+            for _, fwd, rev in trimmed.manifest.itertuples():
+                for file_path in (fwd, rev):
+                    with gzip.open(file_path, "rt") as fh:
+                        ids.append([line.strip() for line in fh.readlines()[::4]])
+            return ids
+
+    def test_trimmed_pe_pair_policy_both(self):
+        self.assertEqual(self._trim_pairs("both"), [["@p1/1"], ["@p1/2"]])
+
+    def test_trimmed_pe_pair_policy_either(self):
+        self.assertEqual(
+            self._trim_pairs("either"),
+            [["@p1/1", "@p2/1"], ["@p1/2", "@p2/2"]],
+        )
+
+    def test_trimmed_se_native_engine(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            temp_input_dir = os.path.join(temp_dir, "input")
+            shutil.copytree(self.source_dir, temp_input_dir)
+            query_reads = CasavaOneEightSingleLanePerSampleDirFmt(
+                temp_input_dir, mode="r"
+            )
+
+            trimmed = trim(query_reads, minlength=10000, engine="native")
+
+            for obs_fp in os.listdir(str(trimmed)):
+                if obs_fp.endswith(".fastq.gz"):
+                    with gzip.open(os.path.join(str(trimmed), obs_fp), "rt") as fh:
+                        obs_ids = [line.strip("@\n") for line in fh.readlines()[::4]]
+                    self.assertEqual(sorted(obs_ids), sorted(seq_ids_minlen10000))
+
+    @patch("q2_long_reads_qc.trim_long_reads.construct_chopper_command")
+    @patch(
+        "q2_long_reads_qc.trim_long_reads.plan_threads",
+        return_value=ThreadPlan(1, 0, 1),
+    )
+    def test_native_engine_reserves_no_chopper_threads(
+        self, mock_plan_threads, mock_construct_chopper_command
+    ):
+        query_reads = CasavaOneEightSingleLanePerSampleDirFmt(self.source_dir, mode="r")
+
+        trim(query_reads, engine="native")
+
+        _, kwargs = mock_plan_threads.call_args
+        self.assertFalse(kwargs["trimmer"])
+        mock_construct_chopper_command.assert_not_called()
+
+    def test_trim_keeps_input_untouched(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            temp_input_dir = os.path.join(temp_dir, "input")
+            shutil.copytree(self.source_dir, temp_input_dir)
+            before = {
+                f: os.path.getsize(os.path.join(temp_input_dir, f))
+                for f in os.listdir(temp_input_dir)
+            }
+            query_reads = CasavaOneEightSingleLanePerSampleDirFmt(
+                temp_input_dir, mode="r"
+            )
+
+            trimmed = trim(query_reads, minlength=10000)
+
+            self.assertNotEqual(str(trimmed), str(query_reads))
+            self.assertEqual(sorted(os.listdir(str(trimmed))), sorted(before))
+            after = {
+                f: os.path.getsize(os.path.join(temp_input_dir, f))
+                for f in os.listdir(temp_input_dir)
+            }
+            self.assertEqual(before, after)
+
+    def test_trim_cache(self):
+        query_reads = CasavaOneEightSingleLanePerSampleDirFmt(self.source_dir, mode="r")
+        with tempfile.TemporaryDirectory() as cache_dir:
+            first = trim(query_reads, engine="native", cache_dir=cache_dir)
+            self.assertEqual(len(os.listdir(cache_dir)), 2)
+
+            # The second run reuses both trimmed files from the cache
+            with patch(
+                "q2_long_reads_qc.trim_long_reads.filter_and_rezip"
+            ) as mock_filter_and_rezip:
+                second = trim(query_reads, engine="native", cache_dir=cache_dir)
+                mock_filter_and_rezip.assert_not_called()
+
+            for filename in os.listdir(str(first)):
+                with open(os.path.join(str(first), filename), "rb") as exp:
+                    with open(os.path.join(str(second), filename), "rb") as obs:
+                        self.assertEqual(obs.read(), exp.read())
+
+            # Other parameters make for other cache entries
+            trim(query_reads, engine="native", quality=10, cache_dir=cache_dir)
+            self.assertEqual(len(os.listdir(cache_dir)), 4)
+
+
+class TestTrimWithStats(LongReadsQCTestsBase):
+    def _check_stats(self, trimmed, read_stats, sample_ids):
+        self.assertEqual(
+            sorted(os.listdir(str(read_stats))), [f"{s}.json" for s in sample_ids]
+        )
+        for sample_id in sample_ids:
+            with open(os.path.join(str(read_stats), f"{sample_id}.json")) as fh:
+                data = json.load(fh)
+
+            # The statistics match the reads in the input and output files
+            for stage, directory in (("input", self.source_dir), ("filtered", trimmed)):
+                reads = bases = 0
+                for filename in os.listdir(str(directory)):
+                    if filename.startswith(f"{sample_id}_"):
+                        with gzip.open(os.path.join(str(directory), filename)) as fh:
+                            seqs = fh.read().splitlines()[1::4]
+                        reads += len(seqs)
+                        bases += sum(map(len, seqs))
+                self.assertEqual(data[stage]["reads"], reads)
+                self.assertEqual(data[stage]["bases"], bases)
+            self.assertLess(data["filtered"]["reads"], data["input"]["reads"])
+
+    def test_trim_with_stats_native(self):
+        self.source_dir = self.get_data_path("trim/single_end/")
+        query_reads = CasavaOneEightSingleLanePerSampleDirFmt(self.source_dir, mode="r")
+        trimmed, read_stats = trim_with_stats(
+            query_reads, engine="native", minlength=10000, headcrop=10
+        )
+        self._check_stats(trimmed, read_stats, ["sample1", "sample2"])
+
+    def test_trim_with_stats_pairs(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            self.source_dir = temp_dir
+            # The second pair fails on its reverse mate
+            for suffix, quals in (("R1", "II"), ("R2", "I'")):
+                file_path = os.path.join(
+                    temp_dir, f"sample1_0_L001_{suffix}_001.fastq.gz"
+                )
+                with gzip.open(file_path, "wt") as fh:
+                    for i, qual in enumerate(quals):
+                        fh.write(f"@p{i}/{suffix[1]}\nACGTACGT\n+\n{qual * 8}\n")
+            query_reads = CasavaOneEightSingleLanePerSampleDirFmt(temp_dir, mode="r")
+            trimmed, read_stats = trim_with_stats(
+                query_reads, engine="native", quality=20, pair_policy="both"
+            )
+            self._check_stats(trimmed, read_stats, ["sample1"])
+
+    def test_trim_with_stats_cache(self):
+        self.source_dir = self.get_data_path("trim/single_end/")
+        query_reads = CasavaOneEightSingleLanePerSampleDirFmt(self.source_dir, mode="r")
+        with tempfile.TemporaryDirectory() as cache_dir:
+            # Results cached without statistics are trimmed again
+            trim(query_reads, engine="native", minlength=10000, cache_dir=cache_dir)
+            trim_with_stats(
+                query_reads, engine="native", minlength=10000, cache_dir=cache_dir
+            )
+
+            # The second run takes both the reads and their statistics from
+            # the cache
+            with patch(
+                "q2_long_reads_qc.trim_long_reads.filter_and_rezip"
+            ) as mock_filter_and_rezip:
+                trimmed, read_stats = trim_with_stats(
+                    query_reads, engine="native", minlength=10000, cache_dir=cache_dir
+                )
+                mock_filter_and_rezip.assert_not_called()
+            self._check_stats(trimmed, read_stats, ["sample1", "sample2"])
+
+    def test_trim_with_stats_signature(self):
+        # Both actions declare the same parameters with the same defaults
+        parameters = inspect.signature(trim_with_stats).parameters
+        self.assertEqual(parameters, inspect.signature(trim).parameters)
+
+    @unittest.skipIf(shutil.which("chopper") is None, "chopper is not installed")
+    def test_trim_with_stats_chopper(self):
+        self.source_dir = self.get_data_path("trim/single_end/")
+        query_reads = CasavaOneEightSingleLanePerSampleDirFmt(self.source_dir, mode="r")
+        trimmed, read_stats = trim_with_stats(
+            query_reads, minlength=10000, parallel_samples=2
+        )
+        self._check_stats(trimmed, read_stats, ["sample1", "sample2"])
+
+
+class TestTrimPartitioned(LongReadsQCTestsBase):
+    def test_trim_partitioned(self):
+        query_reads = CasavaOneEightSingleLanePerSampleDirFmt(
+            self.get_data_path("trim/single_end/"), mode="r"
+        )
+        ctx = FakeContext(
+            {
+                "partition_reads": partition_reads,
+                "trim": trim,
+                "collate_reads": collate_reads,
+            }
+        )
+
+        trimmed = trim_partitioned(
+            ctx, query_reads, engine="native", minlength=10000, threads=2
+        )
+
+        # Every sample is trimmed separately with the given parameters
+        trim_calls = [kwargs for action, kwargs in ctx.calls if action == "trim"]
+        self.assertEqual(len(trim_calls), 2)
+        for kwargs in trim_calls:
+            self.assertEqual(
+                (kwargs["engine"], kwargs["minlength"], kwargs["threads"]),
+                ("native", 10000, 2),
+            )
+
+        expected = trim(query_reads, engine="native", minlength=10000, threads=2)
+        self.assertEqual(
+            sorted(trimmed.manifest.index), sorted(expected.manifest.index)
+        )
+        for filename in os.listdir(str(expected)):
+            if not filename.endswith(".fastq.gz"):
+                continue
+            with gzip.open(os.path.join(str(trimmed), filename)) as fh, gzip.open(
+                os.path.join(str(expected), filename)
+            ) as expected_fh:
+                self.assertEqual(fh.read(), expected_fh.read())
+
+    def test_trim_partitioned_signature(self):
+        # The parameters and defaults of trim, as QIIME 2 reads them
+        parameters = inspect.signature(trim_partitioned).parameters
+        trim_parameters = inspect.signature(trim).parameters
+        self.assertEqual(
+            list(parameters),
+            ["ctx", "query_reads", "num_partitions", *list(trim_parameters)[1:]],
+        )
+        for name, parameter in list(trim_parameters.items())[1:]:
+            self.assertEqual(parameters[name].default, parameter.default)
+
+
+@unittest.skipIf(shutil.which("chopper") is None, "chopper is not installed")
+class TestNativeEngineParity(LongReadsQCTestsBase):
+    """Checks that the native engine keeps exactly the reads chopper keeps."""
+
+    def _trimmed_reads(self, source_dir, engine, **params):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            temp_input_dir = os.path.join(temp_dir, "input")
+            shutil.copytree(self.get_data_path(source_dir), temp_input_dir)
+            query_reads = CasavaOneEightSingleLanePerSampleDirFmt(
+                temp_input_dir, mode="r"
+            )
+
+            trimmed = trim(query_reads, engine=engine, **params)
+
+            reads = {}
+            for obs_fp in os.listdir(str(trimmed)):
+                if obs_fp.endswith(".fastq.gz"):
+                    with gzip.open(os.path.join(str(trimmed), obs_fp), "rt") as fh:
+                        lines = fh.read().splitlines()
+                    # chopper may reorder reads when running multithreaded
+                    reads[obs_fp] = sorted(
+                        (lines[i], lines[i + 1], lines[i + 3])
+                        for i in range(0, len(lines), 4)
+                    )
+            return reads
+
+    def assertParity(self, source_dir, **params):
+        self.assertEqual(
+            self._trimmed_reads(source_dir, "native", **params),
+            self._trimmed_reads(source_dir, "chopper", **params),
+        )
+
+    def test_parity_se_defaults(self):
+        self.assertParity("trim/single_end/")
+
+    def test_parity_se_length(self):
+        self.assertParity("trim/single_end/", minlength=5000, maxlength=20000)
+
+    def test_parity_se_quality(self):
+        self.assertParity("trim/single_end/", quality=12, maxqual=20)
+
+    def test_parity_se_crop(self):
+        self.assertParity("trim/single_end/", headcrop=50, tailcrop=100)
+
+    def test_parity_pe_quality_crop(self):
+        self.assertParity(
+            "trim/paired_end/", quality=25, minlength=250, headcrop=10, tailcrop=20
+        )
+
+
+class TestFilterAndRezip(unittest.TestCase):
+    filters = {
+        "quality": 0,
+        "maxqual": 1000,
+        "minlength": 1,
+        "maxlength": 2147483647,
+        "headcrop": 0,
+        "tailcrop": 0,
+    }
+
+    def test_compressor_error(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            # More reads than the pipe to the compressor and its buffer hold
+            input_file = os.path.join(temp_dir, "in.fastq.gz")
+            with gzip.open(input_file, "wt", compresslevel=1) as fh:
+                for i in range(20000):
+                    fh.write(f"@r{i}\n{'A' * 500}\n+\n{'I' * 500}\n")
+
+            # The compressor exits before reading the filtered reads
+            with self.assertRaisesRegex(
+                Exception, r"sh on .*in.fastq.gz \(return code 3\)"
+            ):
+                filter_and_rezip(
+                    input_file,
+                    os.path.join(temp_dir, "out.fastq.gz"),
+                    self.filters,
+                    ["sh", "-c", "exit 3"],
+                )
+
+    def test_corrupt_input(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            input_file = os.path.join(temp_dir, "in.fastq.gz")
+            with open(input_file, "wb") as fh:
+                fh.write(b"not gzipped")
+
+            with self.assertRaisesRegex(
+                ValueError, r"in.fastq.gz is truncated or corrupt"
+            ):
+                filter_and_rezip(
+                    input_file,
+                    os.path.join(temp_dir, "out.fastq.gz"),
+                    self.filters,
+                    ["gzip", "-c"],
+                )
+
+
+class TestShardAndRezip(LongReadsQCTestsBase):
+    def setUp(self):
+        super().setUp()
+        self.input_file = self.get_data_path(
+            "trim/single_end/sample1_0_L001_R1_001.fastq.gz"
+        )
+        self.filters = {
+            "quality": 10,
+            "maxqual": 1000,
+            "minlength": 5000,
+            "maxlength": 2147483647,
+            "headcrop": 10,
+            "tailcrop": 10,
+        }
+
+    def _read_ids(self, file_path):
+        with gzip.open(file_path, "rt") as fh:
+            return [line.strip() for line in fh.readlines()[::4]]
+
+    @patch("q2_long_reads_qc.trim_long_reads.SHARD_SIZE", 5000)
+    def test_shard_and_rezip_native(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            sharded = os.path.join(temp_dir, "sharded.fastq.gz")
+            whole = os.path.join(temp_dir, "whole.fastq.gz")
+
+            shard_and_rezip(
+                self.input_file, sharded, None, self.filters, 6, ShardPlan(3, 6)
+            )
+            filter_and_rezip(self.input_file, whole, self.filters, ["gzip"])
+
+            # Shards are written in order as separate gzip members
+            with open(sharded, "rb") as fh:
+                self.assertGreater(fh.read().count(b"\x1f\x8b\x08"), 1)
+            with gzip.open(sharded) as obs, gzip.open(whole) as exp:
+                self.assertEqual(obs.read(), exp.read())
+
+    @patch("q2_long_reads_qc.trim_long_reads.SHARD_SIZE", 5000)
+    def test_shard_and_rezip_stats(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            sharded_stats = (ReadStats(), ReadStats())
+            whole_stats = (ReadStats(), ReadStats())
+
+            shard_and_rezip(
+                self.input_file,
+                os.path.join(temp_dir, "sharded.fastq.gz"),
+                None,
+                self.filters,
+                6,
+                ShardPlan(3, 6),
+                sharded_stats,
+            )
+            filter_and_rezip(
+                self.input_file,
+                os.path.join(temp_dir, "whole.fastq.gz"),
+                self.filters,
+                ["gzip"],
+                whole_stats,
+            )
+
+            # Only the order in which the qualities are summed differs
+            for sharded, whole in zip(sharded_stats, whole_stats):
+                sharded, whole = sharded.to_dict(), whole.to_dict()
+                self.assertAlmostEqual(
+                    sharded.pop("quality_sum"), whole.pop("quality_sum")
+                )
+                self.assertEqual(sharded, whole)
+
+    @unittest.skipIf(shutil.which("chopper") is None, "chopper is not installed")
+    @patch("q2_long_reads_qc.trim_long_reads.SHARD_SIZE", 5000)
+    def test_shard_and_rezip_chopper(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            sharded = os.path.join(temp_dir, "sharded.fastq.gz")
+            whole = os.path.join(temp_dir, "whole.fastq.gz")
+            chopper_cmd = construct_chopper_command(**self.filters, threads=1)
+
+            shard_and_rezip(
+                self.input_file,
+                sharded,
+                chopper_cmd,
+                self.filters,
+                6,
+                ShardPlan(3, 6),
+            )
+            filter_and_rezip(self.input_file, whole, self.filters, ["gzip"])
+
+            self.assertEqual(self._read_ids(sharded), self._read_ids(whole))
+
+    @patch("subprocess.run")
+    def test_shard_and_rezip_chopper_error(self, mock_run):
+        mock_run.side_effect = subprocess.CalledProcessError(
+            returncode=1, cmd=["chopper"], stderr=b"Error: invalid FASTQ\n"
+        )
+        with tempfile.TemporaryDirectory() as temp_dir:
+            # The error names the shard and its file and shows chopper's
+            # standard error
+            with self.assertRaisesRegex(
+                Exception,
+                r"chopper on shard 0 of .*sample1_0_L001_R1_001.fastq.gz "
+                r"\(return code 1\):\nError: invalid FASTQ",
+            ) as cm:
+                shard_and_rezip(
+                    self.input_file,
+                    os.path.join(temp_dir, "out.fastq.gz"),
+                    ["chopper"],
+                    self.filters,
+                    6,
+                    ShardPlan(2, 4),
+                )
+            self.assertIsInstance(cm.exception.__cause__, subprocess.CalledProcessError)
+
+    def test_shard_and_rezip_timeout(self):
+        start = time.monotonic()
+        with tempfile.TemporaryDirectory() as temp_dir:
+            with self.assertRaises(subprocess.TimeoutExpired):
+                shard_and_rezip(
+                    self.input_file,
+                    os.path.join(temp_dir, "out.fastq.gz"),
+                    ["sleep", "30"],
+                    self.filters,
+                    6,
+                    ShardPlan(1, 2),
+                    timeout=0.3,
+                )
+        self.assertLess(time.monotonic() - start, 10)
+
+    @patch("q2_long_reads_qc.trim_long_reads.shard_and_rezip")
+    @patch("q2_long_reads_qc.trim_long_reads.filter_and_rezip")
+    def test_trim_shard_threshold(self, mock_filter_and_rezip, mock_shard_and_rezip):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            temp_input_dir = os.path.join(temp_dir, "input")
+            shutil.copytree(self.get_data_path("trim/single_end/"), temp_input_dir)
+            # Make one of the two files larger than the 1 MB threshold
+            large_file = os.path.join(temp_input_dir, "sample2_1_L001_R1_001.fastq.gz")
+            with open(large_file, "ab") as fh:
+                fh.write(os.urandom(2 * 1024**2))
+            query_reads = CasavaOneEightSingleLanePerSampleDirFmt(
+                temp_input_dir, mode="r"
+            )
+
+            trim(
+                query_reads,
+                engine="native",
+                shard_threshold=1,
+                threads=6,
+                timeout=30,
+            )
+
+            mock_filter_and_rezip.assert_called_once()
+            mock_shard_and_rezip.assert_called_once()
+            args, _ = mock_shard_and_rezip.call_args
+            self.assertEqual(args[0], large_file)
+            self.assertIsNone(args[2])
+            self.assertEqual(args[5], plan_shards(6, SHARD_SIZE, trimmer=False))
+            # Both jobs are limited in time
+            self.assertEqual(args[-1], 30)
+            args, _ = mock_filter_and_rezip.call_args
+            self.assertEqual(args[-1], 30)
+
+
+class TestBatchAndRezip(LongReadsQCTestsBase):
+    def setUp(self):
+        super().setUp()
+        self.input_files = [
+            self.get_data_path(f"trim/single_end/{name}")
+            for name in (
+                "sample1_0_L001_R1_001.fastq.gz",
+                "sample2_1_L001_R1_001.fastq.gz",
+            )
+        ]
+
+    def _files(self, temp_dir):
+        return [
+            (input_file, os.path.join(temp_dir, os.path.basename(input_file)))
+            for input_file in self.input_files
+        ]
+
+    @patch("q2_long_reads_qc.trim_long_reads.BATCH_MEMBER_SIZE", 5000)
+    def test_batch_and_rezip_demultiplexes(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            files = self._files(temp_dir)
+            # Reads streamed through cat come back unchanged, except for the
+            # optional repetition of the read name after "+"
+            batch_and_rezip(files, ["cat"], 6)
+
+            for input_file, output_file in files:
+                with gzip.open(input_file) as exp, gzip.open(output_file) as obs:
+                    exp_lines, obs_lines = exp.readlines(), obs.readlines()
+                self.assertEqual(len(obs_lines), len(exp_lines))
+                for i in (0, 1, 3):
+                    self.assertEqual(obs_lines[i::4], exp_lines[i::4])
+
+    def test_batch_and_rezip_stats(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            files = self._files(temp_dir)
+            stats = [(ReadStats(), ReadStats()) for _ in files]
+            batch_and_rezip(files, ["cat"], 6, stats)
+
+            for (input_file, _), (input_stats, filtered_stats) in zip(files, stats):
+                with gzip.open(input_file) as fh:
+                    seqs = fh.read().splitlines()[1::4]
+                self.assertEqual(input_stats.to_dict()["reads"], len(seqs))
+                self.assertEqual(filtered_stats.to_dict(), input_stats.to_dict())
+
+    def test_batch_and_rezip_no_reads_left(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            files = self._files(temp_dir)
+            batch_and_rezip(files, ["true"], 6)
+
+            for _, output_file in files:
+                with gzip.open(output_file) as obs:
+                    self.assertEqual(obs.read(), b"")
+
+    def test_batch_and_rezip_error(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            with self.assertRaisesRegex(
+                Exception, r"false on the batch of 2 files .*\(return code 1\)"
+            ):
+                batch_and_rezip(self._files(temp_dir), ["false"], 6)
+
+    @patch("q2_long_reads_qc.trim_long_reads.MAX_BATCH_FILES", 2)
+    def test_group_files(self):
+        units = [_Unit([(self.input_files[0], f"out{i}")]) for i in range(5)]
+        self.assertEqual([len(group) for group in _group_files(units)], [2, 2, 1])
+
+    @patch("q2_long_reads_qc.trim_long_reads.process_and_rezip")
+    @patch("q2_long_reads_qc.trim_long_reads.batch_and_rezip")
+    def test_trim_batch_threshold(self, mock_batch_and_rezip, mock_process_and_rezip):
+        query_reads = CasavaOneEightSingleLanePerSampleDirFmt(
+            self.get_data_path("trim/single_end/"), mode="r"
+        )
+
+        trim(query_reads, batch_threshold=1)
+
+        mock_process_and_rezip.assert_not_called()
+        mock_batch_and_rezip.assert_called_once()
+        args, _ = mock_batch_and_rezip.call_args
+        self.assertEqual([f for f, _ in args[0]], self.input_files)
+
+
+class TestRunJobs(unittest.TestCase):
+    def test_run_jobs_all_jobs(self):
+        done = []
+        jobs = [functools.partial(done.append, i) for i in range(5)]
+
+        _run_jobs(jobs, 3)
+
+        self.assertEqual(sorted(done), list(range(5)))
+
+    def test_run_jobs_error_is_raised(self):
+        def failing_job():
+            raise Exception("chopper failed")
+
+        with self.assertRaisesRegex(Exception, "chopper failed"):
+            _run_jobs([failing_job], 2)
+
+    def test_run_jobs_kills_running_jobs(self):
+        def failing_job():
+            time.sleep(0.5)
+            raise Exception("chopper failed")
+
+        def hung_job():
+            run_pipeline([["sleep", "30"]], os.devnull, verbose=False)
+
+        start = time.monotonic()
+        with self.assertRaisesRegex(Exception, "chopper failed"):
+            _run_jobs([hung_job, failing_job], 2)
+        self.assertLess(time.monotonic() - start, 10)
+
 
 class TestConstructChopperCommand(unittest.TestCase):
     def test_construct_chopper_command(self):
@@ -225,40 +907,144 @@ class TestConstructChopperCommand(unittest.TestCase):
         self.assertEqual(result, expected_command)
 
 
+class TestRunChopperPipelines(LongReadsQCTestsBase):
+    @patch("q2_long_reads_qc.trim_long_reads.chopper_reads_gzip", return_value=True)
+    @patch("q2_long_reads_qc.trim_long_reads.process_and_rezip")
+    @patch("q2_long_reads_qc.trim_long_reads.run_tasks")
+    def test_trim_uses_executor(self, mock_run_tasks, mock_process_and_rezip, _):
+        query_reads = CasavaOneEightSingleLanePerSampleDirFmt(
+            self.get_data_path("trim/single_end/"), mode="r"
+        )
+
+        trim(query_reads, parallel_samples=2, timeout=60)
+
+        mock_process_and_rezip.assert_not_called()
+        (jobs, workers, _), _ = mock_run_tasks.call_args_list[0]
+        self.assertEqual(len(jobs), 2)
+        self.assertEqual(workers, 2)
+        for job in jobs:
+            pipeline, input_file = job.args
+            chopper_cmd, _ = pipeline.cmds
+            self.assertEqual(chopper_cmd[-1], input_file)
+            self.assertEqual(chopper_cmd[0], "chopper")
+            self.assertIn("--input", chopper_cmd)
+            self.assertEqual(pipeline.timeout, 60)
+
+    def test_pipeline_error_names_stage(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            # The compressor fails rather than chopper
+            pipeline = Pipeline(
+                [
+                    ["echo", "@r1"],
+                    ["sh", "-c", "cat >/dev/null; echo oops >&2; exit 3"],
+                ],
+                os.path.join(temp_dir, "out.fastq.gz"),
+            )
+            with self.assertRaisesRegex(
+                Exception, r"sh on in.fastq.gz \(return code 3\):\noops"
+            ):
+                _run_jobs(
+                    [
+                        functools.partial(
+                            _run_trimming_pipeline, pipeline, "in.fastq.gz"
+                        )
+                    ],
+                    1,
+                )
+
+
 class TestProcessAndRezip(unittest.TestCase):
-    @patch("q2_long_reads_qc.trim_long_reads.run_commands_with_pipe")
-    def test_process_and_rezip_success(self, mock_run_commands_with_pipe):
-        """Test that process_and_rezip runs successfully."""
+    @patch("q2_long_reads_qc.trim_long_reads.chopper_reads_gzip", return_value=True)
+    @patch("q2_long_reads_qc.trim_long_reads.run_pipeline")
+    def test_process_and_rezip_success(self, mock_run_pipeline, _):
+        """Test that process_and_rezip lets chopper read the input file."""
         input_file = "/fake/input/file.fastq.gz"
         chopper_cmd = ["chopper", "filter"]
         filtered_seqs_path = "/fake/output/file.fastq.gz"
 
-        # Mock run_commands_with_pipe to simulate successful execution
+        # Mock run_pipeline to simulate successful execution
         # Simulate no exception raised
-        mock_run_commands_with_pipe.return_value = None
+        mock_run_pipeline.return_value = None
 
         # Call the function
         process_and_rezip(input_file, chopper_cmd, filtered_seqs_path)
 
-        # Check that run_commands_with_pipe was called with the correct
-        # arguments
-        mock_run_commands_with_pipe.assert_called_once_with(
-            ["gunzip", "-c", str(input_file)],
-            chopper_cmd,
-            ["gzip"],
+        # Check that run_pipeline was called with the correct arguments
+        mock_run_pipeline.assert_called_once_with(
+            [["chopper", "filter", "--input", input_file], ["gzip"]],
             str(filtered_seqs_path),
+            timeout=None,
         )
 
-    @patch("q2_long_reads_qc.trim_long_reads.run_commands_with_pipe")
-    def test_process_and_rezip_exception(self, mock_run_commands_with_pipe):
+    @patch("q2_long_reads_qc.trim_long_reads.chopper_reads_gzip", return_value=True)
+    @patch("q2_long_reads_qc.trim_long_reads.run_pipeline")
+    def test_process_and_rezip_compression_cmd(self, mock_run_pipeline, _):
+        compression_cmd = ["pigz", "-c", "-9", "-p", "4"]
+
+        process_and_rezip(
+            "/fake/input/file.fastq.gz",
+            ["chopper"],
+            "/fake/output/file.fastq.gz",
+            compression_cmd,
+        )
+
+        mock_run_pipeline.assert_called_once_with(
+            [["chopper", "--input", "/fake/input/file.fastq.gz"], compression_cmd],
+            "/fake/output/file.fastq.gz",
+            timeout=None,
+        )
+
+    @patch("q2_long_reads_qc.trim_long_reads.chopper_reads_gzip", return_value=False)
+    @patch("q2_long_reads_qc.trim_long_reads.run_pipeline")
+    def test_process_and_rezip_in_process_decompression(self, mock_run_pipeline, _):
+        """Test that the input is decompressed in-process for old chopper
+        versions."""
+        fed = []
+        mock_run_pipeline.side_effect = lambda cmds, out, source, timeout: fed.append(
+            source.read()
+        )
+        with tempfile.TemporaryDirectory() as temp_dir:
+            input_file = os.path.join(temp_dir, "in.fastq.gz")
+            with gzip.open(input_file, "wb") as fh:
+                fh.write(b"@r1\nACGT\n+\nIIII\n")
+
+            process_and_rezip(input_file, ["chopper"], "/fake/out.fastq.gz")
+
+        mock_run_pipeline.assert_called_once()
+        args, _ = mock_run_pipeline.call_args
+        self.assertEqual(args[0], [["chopper"], ["gzip"]])
+        self.assertEqual(fed, [b"@r1\nACGT\n+\nIIII\n"])
+
+    @patch("q2_long_reads_qc.trim_long_reads.chopper_reads_gzip", return_value=False)
+    def test_process_and_rezip_truncated_input(self, _):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            input_file = os.path.join(temp_dir, "in.fastq.gz")
+            with gzip.open(input_file, "wb") as fh:
+                fh.write(b"@r1\nACGT\n+\nIIII\n" * 1000)
+            with open(input_file, "r+b") as fh:
+                fh.truncate(os.path.getsize(input_file) // 2)
+
+            with self.assertRaisesRegex(
+                ValueError, r"in.fastq.gz is truncated or corrupt"
+            ) as context:
+                process_and_rezip(
+                    input_file,
+                    ["cat"],
+                    os.path.join(temp_dir, "out.fastq.gz"),
+                )
+            self.assertIsInstance(context.exception.__cause__, EOFError)
+
+    @patch("q2_long_reads_qc.trim_long_reads.chopper_reads_gzip", return_value=True)
+    @patch("q2_long_reads_qc.trim_long_reads.run_pipeline")
+    def test_process_and_rezip_exception(self, mock_run_pipeline, _):
         """Test that process_and_rezip raises an exception when chopper
         fails."""
         input_file = "/fake/input/file.fastq.gz"
         chopper_cmd = ["chopper", "filter"]
         filtered_seqs_path = "/fake/output/file.fastq.gz"
 
-        # Mock run_commands_with_pipe to raise CalledProcessError
-        mock_run_commands_with_pipe.side_effect = subprocess.CalledProcessError(
+        # Mock run_pipeline to raise CalledProcessError
+        mock_run_pipeline.side_effect = subprocess.CalledProcessError(
             returncode=1, cmd="chopper"
         )
 
@@ -272,5 +1058,34 @@ class TestProcessAndRezip(unittest.TestCase):
         self.assertIn("(return code 1)", str(context.exception))
 
 
+class TestChopperReadsGzip(unittest.TestCase):
+    def setUp(self):
+        chopper_version.cache_clear()
+
+    def tearDown(self):
+        chopper_version.cache_clear()
+
+    @patch("subprocess.run")
+    def test_recent_version(self, mock_run):
+        mock_run.return_value = subprocess.CompletedProcess([], 0, "chopper 0.9.0\n")
+        self.assertTrue(chopper_reads_gzip())
+
+    @patch("subprocess.run")
+    def test_old_version(self, mock_run):
+        mock_run.return_value = subprocess.CompletedProcess([], 0, "chopper 0.6.0\n")
+        self.assertFalse(chopper_reads_gzip())
+
+    @patch("subprocess.run", side_effect=FileNotFoundError)
+    def test_missing_chopper(self, _):
+        self.assertFalse(chopper_reads_gzip())
+
+    @patch("subprocess.run")
+    def test_probed_once(self, mock_run):
+        mock_run.return_value = subprocess.CompletedProcess([], 0, "chopper 0.9.0\n")
+        chopper_reads_gzip()
+        chopper_reads_gzip()
+        mock_run.assert_called_once()
+
+
 if __name__ == "__main__":
     unittest.main()
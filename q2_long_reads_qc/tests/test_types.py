@@ -0,0 +1,153 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2024, QIIME 2 development team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file LICENSE, distributed with this software.
+# ----------------------------------------------------------------------------
+import json
+import os
+import tempfile
+import unittest
+
+import pyarrow as pa
+from qiime2.plugin import ValidationError
+
+from q2_long_reads_qc._metrics import READ_METRICS_SCHEMA
+from q2_long_reads_qc._stats import NanoStats, ReadStats
+from q2_long_reads_qc.types import (
+    NanoStatsFormat,
+    ReadMetricsFormat,
+    ReadStatsFormat,
+    SequencingSummaryFormat,
+)
+
+
+class TestReadStatsFormat(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.temp_dir.name, "sample1.json")
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def _write(self, content):
+        with open(self.path, "w") as fh:
+            fh.write(content)
+        return ReadStatsFormat(self.path, mode="r")
+
+    def test_valid(self):
+        stats = ReadStats().to_dict()
+        fmt = self._write(json.dumps({"input": stats, "filtered": stats}))
+        fmt.validate()
+
+    def test_invalid_json(self):
+        fmt = self._write("{")
+        with self.assertRaisesRegex(ValidationError, "not valid JSON"):
+            fmt.validate()
+
+    def test_missing_stage(self):
+        fmt = self._write(json.dumps({"input": ReadStats().to_dict()}))
+        with self.assertRaisesRegex(ValidationError, "'filtered'.*missing"):
+            fmt.validate()
+
+    def test_missing_keys(self):
+        stats = ReadStats().to_dict()
+        del stats["lengths"]
+        fmt = self._write(json.dumps({"input": stats, "filtered": stats}))
+        with self.assertRaisesRegex(ValidationError, "lack lengths"):
+            fmt.validate()
+
+
+class TestNanoStatsFormat(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.temp_dir.name, "sample1.json")
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def _write(self, content):
+        with open(self.path, "w") as fh:
+            fh.write(content)
+        return NanoStatsFormat(self.path, mode="r")
+
+    def test_valid(self):
+        fmt = self._write(json.dumps(NanoStats().to_dict()))
+        fmt.validate()
+
+    def test_invalid_json(self):
+        fmt = self._write("[")
+        with self.assertRaisesRegex(ValidationError, "not valid JSON"):
+            fmt.validate()
+
+    def test_not_an_object(self):
+        fmt = self._write("[]")
+        with self.assertRaisesRegex(ValidationError, "JSON object"):
+            fmt.validate()
+
+    def test_missing_keys(self):
+        stats = NanoStats().to_dict()
+        del stats["lengths"]
+        fmt = self._write(json.dumps(stats))
+        with self.assertRaisesRegex(ValidationError, "lack lengths"):
+            fmt.validate()
+
+
+class TestReadMetricsFormat(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.temp_dir.name, "sample1.arrow")
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def _write(self, schema):
+        with pa.OSFile(self.path, "wb") as sink, pa.ipc.new_file(sink, schema):
+            pass
+        return ReadMetricsFormat(self.path, mode="r")
+
+    def test_valid(self):
+        self._write(READ_METRICS_SCHEMA).validate()
+
+    def test_not_arrow(self):
+        with open(self.path, "w") as fh:
+            fh.write("read_id,length\n")
+        fmt = ReadMetricsFormat(self.path, mode="r")
+        with self.assertRaisesRegex(ValidationError, "not an Arrow IPC file"):
+            fmt.validate()
+
+    def test_missing_columns(self):
+        fmt = self._write(READ_METRICS_SCHEMA.remove(4))
+        with self.assertRaisesRegex(ValidationError, "lack gc_fraction"):
+            fmt.validate()
+
+
+class TestSequencingSummaryFormat(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.temp_dir.name, "sample1.txt")
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def _write(self, content):
+        with open(self.path, "w") as fh:
+            fh.write(content)
+        return SequencingSummaryFormat(self.path, mode="r")
+
+    def test_valid(self):
+        fmt = self._write(
+            "read_id\tstart_time\tsequence_length_template\tmean_qscore_template\n"
+            "r1\t1.0\t100\t12.5\n"
+        )
+        fmt.validate()
+
+    def test_missing_columns(self):
+        fmt = self._write("read_id\tstart_time\tsequence_length_template\n")
+        with self.assertRaisesRegex(ValidationError, "lacks the columns mean_qscore"):
+            fmt.validate()
+
+
+if __name__ == "__main__":
+    unittest.main()
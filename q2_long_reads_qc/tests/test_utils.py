@@ -5,13 +5,31 @@
 #
 # The full license is in the file LICENSE, distributed with this software.
 # ----------------------------------------------------------------------------
+import gzip
+import io
+import os
+import subprocess
+import sys
 import tempfile
+import threading
+import time
 import unittest
-from unittest.mock import call, patch
+from unittest.mock import MagicMock, call, patch
+
+import pandas as pd
 
 from q2_long_reads_qc._utils import (
+    PIPE_BUFFER_SIZE,
+    ProcessGroup,
+    enlarge_pipe,
+    link_or_copy,
+    manifest_files,
+    open_command_writer,
+    process_group,
     run_command,
     run_commands_with_pipe,
+    run_pipeline,
+    stream_command,
 )
 
 EXTERNAL_CMD_WARNING = (
@@ -65,3 +83,269 @@ class TestCommandOperations(unittest.TestCase):
             run_commands_with_pipe(
                 cmd1, cmd2, cmd3, temp_dir + "res.out", verbose=False
             )  # Assuming no exception is good enough for this test
+
+
+class TestRunPipeline(unittest.TestCase):
+    def test_run_pipeline(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            outfile = os.path.join(temp_dir, "res.out")
+            run_pipeline(
+                [["echo", "hello\nworld"], ["grep", "world"]], outfile, verbose=False
+            )
+            with open(outfile) as fh:
+                self.assertEqual(fh.read(), "world\n")
+
+    def test_run_pipeline_source(self):
+        source = io.BytesIO(b"hello\n" * 1000000 + b"world\n")
+        with tempfile.TemporaryDirectory() as temp_dir:
+            outfile = os.path.join(temp_dir, "res.out")
+            run_pipeline(
+                [["grep", "world"], ["cat"]], outfile, source=source, verbose=False
+            )
+            with open(outfile) as fh:
+                self.assertEqual(fh.read(), "world\n")
+
+    def test_run_pipeline_file_source(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            source_path = os.path.join(temp_dir, "source")
+            with open(source_path, "wb") as fh:
+                fh.write(b"skipped\n" + b"hello\n" * 1000000 + b"world\n")
+            outfile = os.path.join(temp_dir, "res.out")
+            with open(source_path, "rb") as source:
+                # Only the rest of a partially read file is fed
+                source.readline()
+                run_pipeline(
+                    [["grep", "-v", "hello"], ["cat"]],
+                    outfile,
+                    source=source,
+                    verbose=False,
+                )
+            with open(outfile) as fh:
+                self.assertEqual(fh.read(), "world\n")
+
+    def test_run_pipeline_source_error(self):
+        class BrokenSource(io.RawIOBase):
+            def read(self, size=-1):
+                raise EOFError("truncated gzip file")
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            with self.assertRaisesRegex(EOFError, "truncated"):
+                run_pipeline(
+                    [["cat"]],
+                    os.path.join(temp_dir, "res.out"),
+                    source=BrokenSource(),
+                    verbose=False,
+                )
+
+    def test_run_pipeline_failing_stage(self):
+        failing_cmd = ["sh", "-c", "exit 3"]
+        start = time.monotonic()
+        with tempfile.TemporaryDirectory() as temp_dir:
+            with self.assertRaises(subprocess.CalledProcessError) as context:
+                run_pipeline(
+                    [["sleep", "30"], failing_cmd],
+                    os.path.join(temp_dir, "res.out"),
+                    verbose=False,
+                )
+        # The rest of the pipeline is killed rather than waited for
+        self.assertLess(time.monotonic() - start, 10)
+        self.assertEqual(context.exception.returncode, 3)
+        self.assertEqual(context.exception.cmd, failing_cmd)
+
+    def test_run_pipeline_truncated_input(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            truncated = os.path.join(temp_dir, "in.gz")
+            with open(truncated, "wb") as fh:
+                fh.write(gzip.compress(b"hello\n" * 1000)[:20])
+            with self.assertRaises(subprocess.CalledProcessError) as context:
+                run_pipeline(
+                    [["gzip", "-dc", truncated], ["cat"]],
+                    os.path.join(temp_dir, "res.out"),
+                    verbose=False,
+                )
+        self.assertEqual(context.exception.cmd, ["gzip", "-dc", truncated])
+
+    def test_run_pipeline_timeout(self):
+        start = time.monotonic()
+        with tempfile.TemporaryDirectory() as temp_dir:
+            with self.assertRaises(subprocess.TimeoutExpired):
+                run_pipeline(
+                    [["sleep", "30"], ["cat"]],
+                    os.path.join(temp_dir, "res.out"),
+                    verbose=False,
+                    timeout=0.5,
+                )
+        self.assertLess(time.monotonic() - start, 10)
+
+
+class TestProcessGroup(unittest.TestCase):
+    def test_kill(self):
+        group = ProcessGroup()
+        errors = []
+
+        def run():
+            with process_group(group):
+                try:
+                    run_pipeline([["sleep", "30"]], os.devnull, verbose=False)
+                except subprocess.CalledProcessError as e:
+                    errors.append(e)
+
+        thread = threading.Thread(target=run)
+        thread.start()
+        time.sleep(0.5)
+        group.kill()
+        thread.join(10)
+
+        self.assertFalse(thread.is_alive())
+        self.assertEqual(len(errors), 1)
+
+    def test_kill_before_start(self):
+        group = ProcessGroup()
+        group.kill()
+        with process_group(group):
+            with self.assertRaises(subprocess.CalledProcessError):
+                run_pipeline([["sleep", "30"]], os.devnull, verbose=False)
+
+
+class TestEnlargePipe(unittest.TestCase):
+    @unittest.skipUnless(sys.platform.startswith("linux"), "Linux only")
+    def test_enlarge_pipe(self):
+        import fcntl
+
+        read_end, write_end = os.pipe()
+        try:
+            enlarge_pipe(read_end)
+            size = fcntl.fcntl(write_end, getattr(fcntl, "F_GETPIPE_SZ", 1032))
+            self.assertEqual(size, PIPE_BUFFER_SIZE)
+        finally:
+            os.close(read_end)
+            os.close(write_end)
+
+    def test_enlarge_pipe_limit_exceeded(self):
+        read_end, write_end = os.pipe()
+        try:
+            # Sizes beyond the system limit are silently ignored
+            enlarge_pipe(read_end, 2**40)
+        finally:
+            os.close(read_end)
+            os.close(write_end)
+
+
+class TestManifestFiles(unittest.TestCase):
+    def test_manifest_files(self):
+        reads = MagicMock()
+        reads.manifest = pd.DataFrame(
+            {
+                "forward": ["s1_R1.fastq.gz", "s2_R1.fastq.gz", "s3_R1.fastq.gz"],
+                "reverse": ["s1_R2.fastq.gz", None, float("nan")],
+            },
+            index=pd.Index(["s1", "s2", "s3"], name="sample-id"),
+        )
+        self.assertEqual(
+            manifest_files(reads),
+            {
+                "s1": ["s1_R1.fastq.gz", "s1_R2.fastq.gz"],
+                "s2": ["s2_R1.fastq.gz"],
+                "s3": ["s3_R1.fastq.gz"],
+            },
+        )
+
+
+class TestLinkOrCopy(unittest.TestCase):
+    def test_link(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            src = os.path.join(temp_dir, "src")
+            dst = os.path.join(temp_dir, "dst")
+            with open(src, "w") as fh:
+                fh.write("content")
+
+            link_or_copy(src, dst)
+
+            self.assertTrue(os.path.samefile(src, dst))
+
+    @patch("os.link", side_effect=OSError("Invalid cross-device link"))
+    def test_copy_fallback(self, _):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            src = os.path.join(temp_dir, "src")
+            dst = os.path.join(temp_dir, "dst")
+            with open(src, "w") as fh:
+                fh.write("content")
+
+            link_or_copy(src, dst)
+
+            self.assertFalse(os.path.samefile(src, dst))
+            with open(dst) as fh:
+                self.assertEqual(fh.read(), "content")
+
+
+class TestOpenCommandWriter(unittest.TestCase):
+    def test_open_command_writer(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            outfile = os.path.join(temp_dir, "res.gz")
+            with open_command_writer(["gzip", "-c"], outfile, verbose=False) as fh:
+                fh.write(b"hello\n")
+            with gzip.open(outfile) as fh:
+                self.assertEqual(fh.read(), b"hello\n")
+
+    def test_open_command_writer_failure(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            with self.assertRaises(subprocess.CalledProcessError):
+                with open_command_writer(
+                    ["false"], os.path.join(temp_dir, "res"), verbose=False
+                ) as fh:
+                    fh.write(b"hello\n")
+
+    def test_open_command_writer_early_exit(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            with self.assertRaises(subprocess.CalledProcessError) as context:
+                with open_command_writer(
+                    ["sh", "-c", "exit 3"], os.path.join(temp_dir, "res"), verbose=False
+                ) as fh:
+                    # Fails with a broken pipe once sh exited
+                    while True:
+                        fh.write(b"x" * 65536)
+            self.assertEqual(context.exception.returncode, 3)
+            self.assertEqual(context.exception.cmd, ["sh", "-c", "exit 3"])
+
+    def test_open_command_writer_timeout(self):
+        start = time.monotonic()
+        with tempfile.TemporaryDirectory() as temp_dir:
+            with self.assertRaises(subprocess.TimeoutExpired):
+                with open_command_writer(
+                    ["sleep", "30"],
+                    os.path.join(temp_dir, "res"),
+                    verbose=False,
+                    timeout=0.3,
+                ) as fh:
+                    # Blocks once the pipe is full, until sleep is killed
+                    while True:
+                        fh.write(b"x" * 65536)
+        self.assertLess(time.monotonic() - start, 10)
+
+
+class TestStreamCommand(unittest.TestCase):
+    def test_stream_command(self):
+        chunks = stream_command(["cat"], [b"hello ", b"world\n"], verbose=False)
+        self.assertEqual(b"".join(chunks), b"hello world\n")
+
+    def test_stream_command_failure(self):
+        with self.assertRaises(subprocess.CalledProcessError):
+            list(stream_command(["false"], [b"hello\n"], verbose=False))
+
+    def test_stream_command_feeder_error(self):
+        def chunks():
+            yield b"hello\n"
+            raise OSError("read error")
+
+        with self.assertRaisesRegex(OSError, "read error"):
+            list(stream_command(["cat"], chunks(), verbose=False))
+
+    def test_stream_command_timeout(self):
+        start = time.monotonic()
+        with self.assertRaises(subprocess.TimeoutExpired):
+            list(
+                stream_command(
+                    ["sleep", "30"], [b"hello\n"], verbose=False, timeout=0.3
+                )
+            )
+        self.assertLess(time.monotonic() - start, 10)
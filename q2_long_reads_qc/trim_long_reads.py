@@ -5,15 +5,65 @@
 #
 # The full license is in the file LICENSE, distributed with this software.
 # ----------------------------------------------------------------------------
+import collections
+import contextlib
+import functools
+import io
+import json
 import os
-import shutil
+import re
 import subprocess
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, NamedTuple, Optional, Tuple
 
 from q2_types.per_sample_sequences import (
     CasavaOneEightSingleLanePerSampleDirFmt,
 )
 
-from q2_long_reads_qc._utils import run_commands_with_pipe
+from q2_long_reads_qc._cache import ResultCache
+from q2_long_reads_qc._executor import Pipeline, run_pipeline_async, run_tasks
+from q2_long_reads_qc._fastq import (
+    filter_pairs,
+    filter_reads,
+    parse_batches,
+    read_batches,
+    read_chunks,
+    split_tagged,
+    tag_records,
+)
+from q2_long_reads_qc._gzip import (
+    GZIP_ERRORS,
+    compress,
+    construct_compression_command,
+    open_gzip,
+    parallel_compression_available,
+)
+from q2_long_reads_qc._resources import plan_shards, plan_threads
+from q2_long_reads_qc._stats import ReadStats
+from q2_long_reads_qc._utils import (
+    link_or_copy,
+    manifest_files,
+    open_command_writer,
+    print_command,
+    run_pipeline,
+    stream_command,
+)
+from q2_long_reads_qc.types import ReadStatsDirFmt
+
+# Amount of decompressed reads in one shard of a large FASTQ file
+SHARD_SIZE = 64 * 1024**2
+
+# Small files are trimmed together in batches of at most this much
+# compressed data and this many files
+MAX_BATCH_SIZE = 256 * 1024**2
+MAX_BATCH_FILES = 128
+
+# Amount of trimmed reads of one file in a batch compressed at once
+BATCH_MEMBER_SIZE = 4 * 1024**2
+
+# First chopper release reading (gzipped) FASTQ files through --input
+CHOPPER_INPUT_VERSION = (0, 7, 0)
 
 
 # Generates a command list for the 'chopper' tool
@@ -46,56 +96,791 @@ def construct_chopper_command(
     ]
 
 
+# Version of the installed chopper, probed once. None if it is unknown
+@functools.lru_cache(maxsize=None)
+def chopper_version():
+    try:
+        result = subprocess.run(
+            ["chopper", "--version"], capture_output=True, text=True, check=True
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    version = re.search(r"(\d+)\.(\d+)\.(\d+)", result.stdout)
+    if version is None:
+        return None
+    return tuple(int(v) for v in version.groups())
+
+
+# Checks whether the installed chopper can read gzipped FASTQ files itself
+# through --input
+def chopper_reads_gzip() -> bool:
+    version = chopper_version()
+    return version is not None and version >= CHOPPER_INPUT_VERSION
+
+
+# Error reporting the failure of a command on 'target', e.g. a file, with
+# the standard error of the command if it was captured
+def _command_error(e, target):
+    cmd = e.cmd.split()[0] if isinstance(e.cmd, str) else e.cmd[0]
+    message = (
+        f"An error was encountered while using {os.path.basename(cmd)} on "
+        f"{target} (return code {e.returncode})"
+    )
+    if e.stderr:
+        stderr = e.stderr
+        if isinstance(stderr, bytes):
+            stderr = stderr.decode(errors="replace")
+        return Exception(f"{message}:\n{stderr.strip()}")
+    return Exception(f"{message}, please inspect stdout and stderr to learn more.")
+
+
+# Error reporting that reading the gzipped input file(s) 'target' failed
+def _input_error(e, target):
+    return ValueError(f"The gzipped FASTQ file {target} is truncated or corrupt: {e}")
+
+
 # Executes a pipeline that unzips FASTQ files, processes them with 'chopper'
-# and then rezips them
-def process_and_rezip(input_file, chopper_cmd, filtered_seqs_path):
+# and then rezips them. Recent chopper versions read the gzipped file
+# directly; otherwise it is decompressed in-process and fed to chopper.
+# The pipeline is killed if it runs for longer than 'timeout' seconds
+def process_and_rezip(
+    input_file, chopper_cmd, filtered_seqs_path, compression_cmd=None, timeout=None
+):
+    if compression_cmd is None:
+        compression_cmd = ["gzip"]
+    try:
+        if chopper_reads_gzip():
+            run_pipeline(
+                [[*chopper_cmd, "--input", str(input_file)], compression_cmd],
+                str(filtered_seqs_path),
+                timeout=timeout,
+            )
+        else:
+            with open_gzip(input_file) as source:
+                run_pipeline(
+                    [chopper_cmd, compression_cmd],
+                    str(filtered_seqs_path),
+                    source=source,
+                    timeout=timeout,
+                )
+    except subprocess.CalledProcessError as e:
+        raise _command_error(e, input_file) from e
+    except GZIP_ERRORS as e:
+        raise _input_error(e, input_file) from e
+
+
+# Runs a pipeline trimming input_file on the event loop of the scheduler,
+# see run_tasks, reporting failures like process_and_rezip
+async def _run_trimming_pipeline(pipeline, input_file):
     try:
-        run_commands_with_pipe(
-            ["gunzip", "-c", str(input_file)],
+        return await run_pipeline_async(pipeline)
+    except subprocess.CalledProcessError as e:
+        raise _command_error(e, input_file) from e
+
+
+# Filters a FASTQ file with the in-process engine and compresses the reads
+# passing the filters. The compressor is killed if it runs for longer than
+# 'timeout' seconds
+def filter_and_rezip(
+    input_file, filtered_seqs_path, filters, compression_cmd, stats=None, timeout=None
+):
+    try:
+        with open_gzip(input_file) as fh_in, open_command_writer(
+            compression_cmd, filtered_seqs_path, timeout=timeout
+        ) as fh_out:
+            filter_reads(fh_in, fh_out, stats, **filters)
+    except subprocess.CalledProcessError as e:
+        raise _command_error(e, input_file) from e
+    except GZIP_ERRORS as e:
+        raise _input_error(e, input_file) from e
+
+
+# Filters the mates of a paired-end sample together in a single pass and
+# compresses both outputs, keeping them in sync. Both compressors are
+# killed if they run for longer than 'timeout' seconds
+def process_pair_and_rezip(
+    fwd_file,
+    rev_file,
+    fwd_output,
+    rev_output,
+    filters,
+    policy,
+    compression_cmd,
+    stats=None,
+    timeout=None,
+):
+    try:
+        with contextlib.ExitStack() as stack:
+            fwd_in = stack.enter_context(open_gzip(fwd_file))
+            rev_in = stack.enter_context(open_gzip(rev_file))
+            fwd_out = stack.enter_context(
+                open_command_writer(compression_cmd, fwd_output, timeout=timeout)
+            )
+            rev_out = stack.enter_context(
+                open_command_writer(compression_cmd, rev_output, timeout=timeout)
+            )
+            filter_pairs(fwd_in, rev_in, fwd_out, rev_out, policy, stats, **filters)
+    except subprocess.CalledProcessError as e:
+        raise _command_error(e, f"{fwd_file} and {rev_file}") from e
+    except GZIP_ERRORS as e:
+        raise _input_error(e, f"{fwd_file} or {rev_file}") from e
+
+
+# Yields record-aligned chunks of a FASTQ file handle, adding their reads to
+# 'stats' on the way
+def _counted_chunks(fh, stats):
+    for chunk in read_chunks(fh):
+        for batch in parse_batches([chunk]):
+            stats.add(batch)
+        yield chunk
+
+
+# Writes the chunks of trimmed reads to fh_out, passing them on to be counted
+def _written_chunks(chunks, fh_out):
+    for chunk in chunks:
+        fh_out.write(chunk)
+        yield chunk
+
+
+# Trims a FASTQ file with chopper while collecting statistics of the reads
+# before and after trimming. Python stands between the stages to see the
+# reads, which are decompressed in-process, fed to chopper and read back
+# from it on their way to the compressor. Both commands are killed if they
+# run for longer than 'timeout' seconds
+def process_with_stats(
+    input_file, chopper_cmd, filtered_seqs_path, compression_cmd, stats, timeout=None
+):
+    input_stats, filtered_stats = stats
+    try:
+        with open_gzip(input_file) as fh_in, open_command_writer(
+            compression_cmd, filtered_seqs_path, timeout=timeout
+        ) as fh_out:
+            trimmed = stream_command(
+                chopper_cmd, _counted_chunks(fh_in, input_stats), timeout=timeout
+            )
+            for batch in parse_batches(_written_chunks(trimmed, fh_out)):
+                filtered_stats.add(batch)
+    except subprocess.CalledProcessError as e:
+        raise _command_error(e, input_file) from e
+    except GZIP_ERRORS as e:
+        raise _input_error(e, input_file) from e
+
+
+# Trims one shard of a large FASTQ file with chopper or, if no chopper
+# command is given, with the native engine and compresses the result into
+# a gzip member. With collect_stats, the statistics of the reads of the
+# shard before and after trimming are returned along with it. chopper is
+# killed if the shard is not trimmed by the monotonic 'deadline'
+def _trim_shard(
+    chunk, chopper_cmd, filters, compression_level, collect_stats, deadline=None
+):
+    stats = (ReadStats(), ReadStats()) if collect_stats else None
+    if chopper_cmd is None:
+        trimmed = io.BytesIO()
+        filter_reads(io.BytesIO(chunk), trimmed, stats, **filters)
+        trimmed = trimmed.getvalue()
+    else:
+        timeout = None
+        if deadline is not None:
+            timeout = max(0, deadline - time.monotonic())
+        trimmed = subprocess.run(
             chopper_cmd,
-            ["gzip"],
-            str(filtered_seqs_path),
+            input=chunk,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            check=True,
+            timeout=timeout,
+        ).stdout
+        if stats is not None:
+            for reads, reads_stats in ((chunk, stats[0]), (trimmed, stats[1])):
+                for batch in parse_batches([reads]):
+                    reads_stats.add(batch)
+    return compress(trimmed, compression_level), stats
+
+
+# Splits a large FASTQ file into record-aligned shards trimmed by the
+# workers of a ShardPlan, see plan_shards. The trimmed shards are written
+# as consecutive gzip members in their original order, which is a valid
+# gzip file. The statistics of the shards are merged into the
+# (input, filtered) pair 'stats' if given. All shards share a limit of
+# 'timeout' seconds: once it is exceeded, chopper is killed and no further
+# shards are started
+def shard_and_rezip(
+    input_file,
+    filtered_seqs_path,
+    chopper_cmd,
+    filters,
+    compression_level,
+    plan,
+    stats=None,
+    timeout=None,
+):
+    if chopper_cmd is not None:
+        print_command(f"<shards of {input_file}> | {' '.join(chopper_cmd)}")
+
+    deadline = None
+    if timeout is not None:
+        deadline = time.monotonic() + timeout
+
+    with open_gzip(input_file) as fh_in, open(
+        filtered_seqs_path, "wb"
+    ) as fh_out, ThreadPoolExecutor(max_workers=plan.workers) as executor:
+
+        def write(index, future):
+            try:
+                member, shard_stats = future.result()
+            except subprocess.CalledProcessError as e:
+                raise _command_error(e, f"shard {index} of {input_file}") from e
+            fh_out.write(member)
+            if stats is not None:
+                for collected, shard in zip(stats, shard_stats):
+                    collected.merge(shard)
+
+        # Keep a bounded number of shards in memory
+        pending = collections.deque()
+        try:
+            for index, chunk in enumerate(read_chunks(fh_in, SHARD_SIZE)):
+                if deadline is not None and time.monotonic() > deadline:
+                    raise subprocess.TimeoutExpired(
+                        f"<shards of {input_file}>", timeout
+                    )
+                future = executor.submit(
+                    _trim_shard,
+                    chunk,
+                    chopper_cmd,
+                    filters,
+                    compression_level,
+                    stats is not None,
+                    deadline,
+                )
+                pending.append((index, future))
+                if len(pending) >= plan.window:
+                    write(*pending.popleft())
+            while pending:
+                write(*pending.popleft())
+        except GZIP_ERRORS as e:
+            raise _input_error(e, input_file) from e
+        finally:
+            for _, future in pending:
+                future.cancel()
+
+
+# Yields the reads of the input files as FASTQ chunks, each read tagged
+# with the index of its file. The reads of every file are added to the
+# input statistics of its (input, filtered) pair in 'stats' if given
+def _tagged_chunks(files, stats=None):
+    for tag, (input_file, _) in enumerate(files):
+        try:
+            with open_gzip(input_file) as fh:
+                for batch in read_batches(fh):
+                    if stats is not None:
+                        stats[tag][0].add(batch)
+                    yield tag_records(batch, tag)
+        except GZIP_ERRORS as e:
+            raise _input_error(e, input_file) from e
+
+
+# Trims several small FASTQ files through a single chopper process to save
+# the process startup cost of every file. The reads are tagged with the
+# index of their file on the way in and demultiplexed into their own
+# compressed output file on the way out. If given, 'stats' holds an
+# (input, filtered) pair of statistics for every file. chopper is killed
+# if it runs for longer than 'timeout' seconds per file of the batch
+def batch_and_rezip(files, chopper_cmd, compression_level, stats=None, timeout=None):
+    buffers = [[] for _ in files]
+    buffered = [0] * len(files)
+
+    with contextlib.ExitStack() as stack:
+        outputs = [stack.enter_context(open(out, "wb")) for _, out in files]
+
+        def flush(tag):
+            outputs[tag].write(compress(b"".join(buffers[tag]), compression_level))
+            buffers[tag].clear()
+            buffered[tag] = 0
+
+        if timeout is not None:
+            timeout *= len(files)
+        try:
+            trimmed = stream_command(
+                chopper_cmd, _tagged_chunks(files, stats), timeout=timeout
+            )
+            for batch in parse_batches(trimmed):
+                for tag, records in split_tagged(batch).items():
+                    if stats is not None:
+                        for records_batch in parse_batches([records]):
+                            stats[tag][1].add(records_batch)
+                    buffers[tag].append(records)
+                    buffered[tag] += len(records)
+                    if buffered[tag] >= BATCH_MEMBER_SIZE:
+                        flush(tag)
+        except subprocess.CalledProcessError as e:
+            target = f"the batch of {len(files)} files starting with {files[0][0]}"
+            raise _command_error(e, target) from e
+
+        # Files without any reads left still get a valid (empty) gzip file
+        for tag, output in enumerate(outputs):
+            if buffers[tag] or not output.tell():
+                flush(tag)
+
+
+class _Unit(NamedTuple):
+    """Files trimmed together, as (input, output) pairs: a single file or
+    the mates of a paired-end sample. With statistics collected, 'stats' is
+    the (input, filtered) pair of statistics of their reads. 'key' is the
+    key of their results in the cache, if one is used"""
+
+    files: List[Tuple[str, str]]
+    stats: Optional[Tuple[ReadStats, ReadStats]] = None
+    key: Optional[str] = None
+
+
+# Groups consecutive single-file units into batches of limited total size
+# and number
+def _group_files(units):
+    groups, size = [[]], 0
+    for unit in units:
+        ((input_file, _),) = unit.files
+        file_size = os.path.getsize(input_file)
+        if groups[-1] and (
+            size + file_size > MAX_BATCH_SIZE or len(groups[-1]) >= MAX_BATCH_FILES
+        ):
+            groups.append([])
+            size = 0
+        groups[-1].append(unit)
+        size += file_size
+    return [group for group in groups if group]
+
+
+# Parameters identifying the results of trimming a file in the cache. The
+# thread count is left out as it does not change the trimmed reads
+def _cache_params(filters, engine, compression_level):
+    params = {"engine": engine, "compression_level": compression_level}
+    if engine == "chopper":
+        params["command"] = construct_chopper_command(**filters, threads=1)
+        params["chopper_version"] = chopper_version()
+    else:
+        params["filters"] = filters
+    return params
+
+
+# Statistics of the reads of a unit as stored in the cache and in the
+# ReadStats directory format
+def _stats_dict(stats):
+    input_stats, filtered_stats = stats
+    return {"input": input_stats.to_dict(), "filtered": filtered_stats.to_dict()}
+
+
+# Links the cached results of a unit to its output files and adds the
+# cached statistics of its reads to its own if it collects them. Returns
+# False, adding nothing, unless they are all cached
+def _fetch_results(cache, unit):
+    output_files = [output_file for _, output_file in unit.files]
+    if unit.stats is None:
+        return cache.fetch(unit.key, output_files)
+
+    data = cache.fetch_data(unit.key)
+    if data is None or not cache.fetch(unit.key, output_files):
+        return False
+    for stats, stage in zip(unit.stats, ("input", "filtered")):
+        stats.merge(ReadStats.from_dict(data[stage]))
+    return True
+
+
+# Adds the results of the units, and their statistics if collected, to
+# the cache
+def _store_results(cache, units):
+    for unit in units:
+        cache.store(unit.key, [output_file for _, output_file in unit.files])
+        if unit.stats is not None:
+            cache.store_data(unit.key, _stats_dict(unit.stats))
+
+
+def _cache_job_results(cache, job_units, index):
+    _store_results(cache, job_units[index])
+
+
+# Runs the trimming jobs, chopper pipelines and threaded jobs alike, from a
+# single scheduler, at most 'workers' of them at a time. With a cache, the
+# results of the units in job_units of every job are added to it as soon
+# as the job is done. The first failure cancels all other jobs, kills
+# their commands and is re-raised
+def _run_jobs(jobs, workers, cache=None, job_units=None):
+    on_done = None
+    if cache is not None:
+        on_done = functools.partial(_cache_job_results, cache, job_units)
+    run_tasks(jobs, workers, on_done)
+
+
+# Carries over the non-sequence files of the input directory
+def _carry_over(query_reads, filtered_seqs):
+    for filename in ("MANIFEST", "metadata.yml"):
+        src = os.path.join(query_reads.path, filename)
+        if os.path.exists(src):
+            link_or_copy(src, os.path.join(filtered_seqs.path, filename))
+
+
+# Trims the FASTQ files of query_reads as trim does. With collect_stats,
+# every job also collects the statistics of the reads of its files before
+# and after trimming, which are returned per sample along with the trimmed
+# reads. Otherwise the statistics are None
+def _trim(
+    query_reads,
+    collect_stats,
+    threads,
+    parallel_samples,
+    quality,
+    maxqual,
+    minlength,
+    maxlength,
+    headcrop,
+    tailcrop,
+    compression_level,
+    pair_policy,
+    engine,
+    shard_threshold,
+    batch_threshold,
+    cache_dir,
+    cache_size,
+    timeout,
+):
+    # Initialize directory format for filtered sequences
+    filtered_seqs = CasavaOneEightSingleLanePerSampleDirFmt()
+
+    filters = {
+        "quality": quality,
+        "maxqual": maxqual,
+        "minlength": minlength,
+        "maxlength": maxlength,
+        "headcrop": headcrop,
+        "tailcrop": tailcrop,
+    }
+
+    # With a cache, files trimmed before with the same parameters are linked
+    # from it and the results of all others are added to it once trimmed
+    cache = None
+    if cache_dir is not None:
+        cache = ResultCache(cache_dir, cache_size * 1024**2)
+        cache_params = _cache_params(filters, engine, compression_level)
+
+    # Collect the units of files of every sample in the DataFrame. Unless
+    # the mates are filtered independently, the two files of a paired-end
+    # sample are processed together by a single job. Files larger than the
+    # sharding threshold are trimmed separately and, with chopper, files
+    # smaller than the batching threshold are trimmed in batches
+    sample_stats = collections.defaultdict(list) if collect_stats else None
+    pairs, files, large_files, small_files = [], [], [], []
+    for sample_id, sample_files in manifest_files(query_reads).items():
+        mates = [
+            (f, str(filtered_seqs.path / os.path.basename(f))) for f in sample_files
+        ]
+        if pair_policy != "independent" and len(mates) == 2:
+            sample_units = [_Unit(mates)]
+        else:
+            sample_units = [_Unit([mate]) for mate in mates]
+
+        for unit in sample_units:
+            if collect_stats:
+                unit = unit._replace(stats=(ReadStats(), ReadStats()))
+                sample_stats[sample_id].append(unit.stats)
+            if cache is not None:
+                input_files = [input_file for input_file, _ in unit.files]
+                params = cache_params
+                if len(unit.files) == 2:
+                    params = {**cache_params, "pair_policy": pair_policy}
+                unit = unit._replace(key=cache.key(input_files, params))
+                if _fetch_results(cache, unit):
+                    continue
+
+            if len(unit.files) == 2:
+                pairs.append(unit)
+                continue
+            ((input_file, _),) = unit.files
+            size = os.path.getsize(input_file)
+            if shard_threshold and size > shard_threshold * 1024**2:
+                large_files.append(unit)
+            elif engine == "chopper" and size < batch_threshold * 1024**2:
+                small_files.append(unit)
+            else:
+                files.append(unit)
+
+    # Split the CPU budget between concurrent jobs, chopper threads
+    # and compression threads. Pairs are always filtered in-process, so
+    # chopper only gets threads if single files or batches go through it
+    batches = _group_files(small_files)
+    uses_chopper = engine == "chopper" and bool(files or batches)
+    plan = plan_threads(
+        threads,
+        len(pairs) + len(files) + len(batches),
+        parallel_samples,
+        parallel_compression=parallel_compression_available(),
+        trimmer=uses_chopper,
+    )
+    chopper_cmd = None
+    if uses_chopper:
+        chopper_cmd = construct_chopper_command(**filters, threads=plan.chopper_threads)
+    compression_cmd = construct_compression_command(
+        compression_level, plan.compression_threads
+    )
+
+    # With a chopper reading gzipped files itself, trimming a file is a pure
+    # subprocess pipeline driven by the scheduler's event loop rather than
+    # by a thread. Collecting statistics needs the reads to pass through
+    # Python, so it takes the threaded path instead. Every job is listed
+    # with the units it trims. Every job is limited to 'timeout' seconds per
+    # file it trims
+    pipelined = engine == "chopper" and not collect_stats and chopper_reads_gzip()
+    time_limit = timeout or None
+    jobs, job_units = [], []
+    for unit in pairs:
+        (fwd, fwd_out), (rev, rev_out) = unit.files
+        job = functools.partial(
+            process_pair_and_rezip,
+            fwd,
+            rev,
+            fwd_out,
+            rev_out,
+            filters,
+            pair_policy,
+            compression_cmd,
+            unit.stats,
+            time_limit,
         )
-    except subprocess.CalledProcessError as e:
-        raise Exception(
-            f"An error was encountered while using chopper, "
-            f"(return code {e.returncode}), please inspect "
-            "stdout and stderr to learn more."
+        jobs.append(job)
+        job_units.append([unit])
+    for unit in files:
+        ((input_file, output_file),) = unit.files
+        if engine == "native":
+            job = functools.partial(
+                filter_and_rezip,
+                input_file,
+                output_file,
+                filters,
+                compression_cmd,
+                unit.stats,
+                time_limit,
+            )
+        elif collect_stats:
+            job = functools.partial(
+                process_with_stats,
+                input_file,
+                chopper_cmd,
+                output_file,
+                compression_cmd,
+                unit.stats,
+                time_limit,
+            )
+        elif pipelined:
+            pipeline = Pipeline(
+                [[*chopper_cmd, "--input", input_file], compression_cmd],
+                output_file,
+                time_limit,
+            )
+            job = functools.partial(_run_trimming_pipeline, pipeline, input_file)
+        else:
+            job = functools.partial(
+                process_and_rezip,
+                input_file,
+                chopper_cmd,
+                output_file,
+                compression_cmd,
+                time_limit,
+            )
+        jobs.append(job)
+        job_units.append([unit])
+    for batch in batches:
+        job = functools.partial(
+            batch_and_rezip,
+            [unit.files[0] for unit in batch],
+            chopper_cmd,
+            compression_level,
+            [unit.stats for unit in batch] if collect_stats else None,
+            time_limit,
+        )
+        jobs.append(job)
+        job_units.append(batch)
+
+    _run_jobs(jobs, plan.workers, cache, job_units)
+
+    # Large files are trimmed one after another, each of them split into
+    # shards that are processed using the whole thread budget
+    shard_chopper_cmd = None
+    if engine == "chopper":
+        shard_chopper_cmd = construct_chopper_command(**filters, threads=1)
+    shard_plan = plan_shards(threads, SHARD_SIZE, trimmer=engine == "chopper")
+    large_jobs = []
+    for unit in large_files:
+        ((input_file, output_file),) = unit.files
+        job = functools.partial(
+            shard_and_rezip,
+            input_file,
+            output_file,
+            shard_chopper_cmd,
+            filters,
+            compression_level,
+            shard_plan,
+            unit.stats,
+            time_limit,
         )
+        large_jobs.append(job)
+    _run_jobs(large_jobs, 1, cache, [[unit] for unit in large_files])
+
+    if cache is not None:
+        cache.evict()
+
+    _carry_over(query_reads, filtered_seqs)
+    return filtered_seqs, sample_stats
 
 
 # Trims paired-end read FASTQ files using specified quality control parameter
 def trim(
     query_reads: CasavaOneEightSingleLanePerSampleDirFmt,
     threads: int = 4,
+    parallel_samples: int = 1,
     quality: int = 0,
     maxqual: int = 1000,
     minlength: int = 1,
     maxlength: int = 2147483647,
     headcrop: int = 0,
     tailcrop: int = 0,
+    compression_level: int = 6,
+    pair_policy: str = "independent",
+    engine: str = "chopper",
+    shard_threshold: int = 0,
+    batch_threshold: int = 0,
+    cache_dir: str = None,
+    cache_size: int = 10240,
+    timeout: int = 0,
 ) -> CasavaOneEightSingleLanePerSampleDirFmt:
+    filtered_seqs, _ = _trim(
+        query_reads,
+        collect_stats=False,
+        threads=threads,
+        parallel_samples=parallel_samples,
+        quality=quality,
+        maxqual=maxqual,
+        minlength=minlength,
+        maxlength=maxlength,
+        headcrop=headcrop,
+        tailcrop=tailcrop,
+        compression_level=compression_level,
+        pair_policy=pair_policy,
+        engine=engine,
+        shard_threshold=shard_threshold,
+        batch_threshold=batch_threshold,
+        cache_dir=cache_dir,
+        cache_size=cache_size,
+        timeout=timeout,
+    )
+    return filtered_seqs
 
-    # Initialize directory format for filtered sequences
-    filtered_seqs = CasavaOneEightSingleLanePerSampleDirFmt()
 
-    # Iterate over the FASTQ paired-end files in the DataFrame
-    # and exececute chopper command
-    for _, fwd, rev in query_reads.manifest.itertuples():
-        filtered_seqs_path_fwd = filtered_seqs.path / os.path.basename(fwd)
-        if rev:
-            filtered_seqs_path_rev = filtered_seqs.path / os.path.basename(rev)
+# Trims FASTQ files like trim, collecting statistics of the reads of every
+# sample before and after trimming in the same pass over the reads
+def trim_with_stats(
+    query_reads: CasavaOneEightSingleLanePerSampleDirFmt,
+    threads: int = 4,
+    parallel_samples: int = 1,
+    quality: int = 0,
+    maxqual: int = 1000,
+    minlength: int = 1,
+    maxlength: int = 2147483647,
+    headcrop: int = 0,
+    tailcrop: int = 0,
+    compression_level: int = 6,
+    pair_policy: str = "independent",
+    engine: str = "chopper",
+    shard_threshold: int = 0,
+    batch_threshold: int = 0,
+    cache_dir: str = None,
+    cache_size: int = 10240,
+    timeout: int = 0,
+) -> (CasavaOneEightSingleLanePerSampleDirFmt, ReadStatsDirFmt):
+    filtered_seqs, sample_stats = _trim(
+        query_reads,
+        collect_stats=True,
+        threads=threads,
+        parallel_samples=parallel_samples,
+        quality=quality,
+        maxqual=maxqual,
+        minlength=minlength,
+        maxlength=maxlength,
+        headcrop=headcrop,
+        tailcrop=tailcrop,
+        compression_level=compression_level,
+        pair_policy=pair_policy,
+        engine=engine,
+        shard_threshold=shard_threshold,
+        batch_threshold=batch_threshold,
+        cache_dir=cache_dir,
+        cache_size=cache_size,
+        timeout=timeout,
+    )
 
-        chopper_cmd = construct_chopper_command(
-            quality, maxqual, minlength, maxlength, headcrop, tailcrop, threads
-        )
+    # Every job collected its own (input, filtered) statistics, which are
+    # merged per sample
+    read_stats = ReadStatsDirFmt()
+    for sample_id, collected in sample_stats.items():
+        input_stats, filtered_stats = ReadStats(), ReadStats()
+        for unit_input_stats, unit_filtered_stats in collected:
+            input_stats.merge(unit_input_stats)
+            filtered_stats.merge(unit_filtered_stats)
+        with open(read_stats.path / f"{sample_id}.json", "w") as fh:
+            json.dump(_stats_dict((input_stats, filtered_stats)), fh)
+
+    return filtered_seqs, read_stats
 
-        process_and_rezip(fwd, chopper_cmd, str(filtered_seqs_path_fwd))
-        if rev:
-            process_and_rezip(rev, chopper_cmd, str(filtered_seqs_path_rev))
 
-    for filename in os.listdir(filtered_seqs.path):
-        src = os.path.join(filtered_seqs.path, filename)
-        shutil.copy(src, query_reads.path)
+# Trims FASTQ files like trim, split into partitions of samples trimmed by
+# separate trim actions. With QIIME 2's parallel executor, e.g. Parsl, the
+# partitions are distributed over its workers, which may run on different
+# nodes, and the trimmed partitions are collated into a single artifact
+def trim_partitioned(
+    ctx,
+    query_reads,
+    num_partitions=None,
+    threads=4,
+    parallel_samples=1,
+    quality=0,
+    maxqual=1000,
+    minlength=1,
+    maxlength=2147483647,
+    headcrop=0,
+    tailcrop=0,
+    compression_level=6,
+    pair_policy="independent",
+    engine="chopper",
+    shard_threshold=0,
+    batch_threshold=0,
+    cache_dir=None,
+    cache_size=10240,
+    timeout=0,
+):
+    partition_method = ctx.get_action("long_reads_qc", "partition_reads")
+    trim_method = ctx.get_action("long_reads_qc", "trim")
+    collate_method = ctx.get_action("long_reads_qc", "collate_reads")
 
-    return query_reads
+    (partitioned_reads,) = partition_method(query_reads, num_partitions)
+    trimmed_partitions = []
+    for partition in partitioned_reads.values():
+        (trimmed,) = trim_method(
+            partition,
+            threads=threads,
+            parallel_samples=parallel_samples,
+            quality=quality,
+            maxqual=maxqual,
+            minlength=minlength,
+            maxlength=maxlength,
+            headcrop=headcrop,
+            tailcrop=tailcrop,
+            compression_level=compression_level,
+            pair_policy=pair_policy,
+            engine=engine,
+            shard_threshold=shard_threshold,
+            batch_threshold=batch_threshold,
+            cache_dir=cache_dir,
+            cache_size=cache_size,
+            timeout=timeout,
+        )
+        trimmed_partitions.append(trimmed)
+    (filtered_query_reads,) = collate_method(trimmed_partitions)
+    return filtered_query_reads
@@ -0,0 +1,33 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2024, QIIME 2 development team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file LICENSE, distributed with this software.
+# ----------------------------------------------------------------------------
+from ._format import (
+    NanoStatsDirFmt,
+    NanoStatsFormat,
+    ReadMetricsDirFmt,
+    ReadMetricsFormat,
+    ReadStatsDirFmt,
+    ReadStatsFormat,
+    SequencingSummaryDirFmt,
+    SequencingSummaryFormat,
+)
+from ._type import NanoStats, ReadMetrics, ReadStats, SequencingSummary
+
+__all__ = [
+    "ReadStats",
+    "ReadStatsDirFmt",
+    "ReadStatsFormat",
+    "NanoStats",
+    "NanoStatsDirFmt",
+    "NanoStatsFormat",
+    "ReadMetrics",
+    "ReadMetricsDirFmt",
+    "ReadMetricsFormat",
+    "SequencingSummary",
+    "SequencingSummaryDirFmt",
+    "SequencingSummaryFormat",
+]
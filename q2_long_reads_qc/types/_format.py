@@ -0,0 +1,142 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2024, QIIME 2 development team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file LICENSE, distributed with this software.
+# ----------------------------------------------------------------------------
+import json
+
+import pyarrow as pa
+from qiime2.plugin import ValidationError, model
+
+STATS_KEYS = ("reads", "bases", "quality_sum", "lengths", "qualities")
+
+
+# Read statistics of one sample before ("input") and after ("filtered")
+# trimming, as written by ReadStats.to_dict
+class ReadStatsFormat(model.TextFileFormat):
+    def _validate_(self, level):
+        try:
+            with self.open() as fh:
+                data = json.load(fh)
+        except json.JSONDecodeError as e:
+            raise ValidationError(f"The read statistics are not valid JSON: {e}")
+
+        for stage in ("input", "filtered"):
+            stats = data.get(stage) if isinstance(data, dict) else None
+            if not isinstance(stats, dict):
+                raise ValidationError(f"The {stage!r} read statistics are missing.")
+            missing = [key for key in STATS_KEYS if key not in stats]
+            if missing:
+                raise ValidationError(
+                    f"The {stage!r} read statistics lack {', '.join(missing)}."
+                )
+
+
+class ReadStatsDirFmt(model.DirectoryFormat):
+    stats = model.FileCollection(r".+\.json", format=ReadStatsFormat)
+
+    @stats.set_path_maker
+    def stats_path_maker(self, sample_id):
+        return f"{sample_id}.json"
+
+
+NANOSTATS_KEYS = (
+    "reads",
+    "bases",
+    "squared_lengths",
+    "quality_sum",
+    "longest",
+    "above_thresholds",
+    "lengths",
+    "qualities",
+)
+
+
+# NanoStats of the reads of one sample, as written by NanoStats.to_dict
+class NanoStatsFormat(model.TextFileFormat):
+    def _validate_(self, level):
+        try:
+            with self.open() as fh:
+                data = json.load(fh)
+        except json.JSONDecodeError as e:
+            raise ValidationError(f"The NanoStats are not valid JSON: {e}")
+
+        if not isinstance(data, dict):
+            raise ValidationError("The NanoStats must be a JSON object.")
+        missing = [key for key in NANOSTATS_KEYS if key not in data]
+        if missing:
+            raise ValidationError(f"The NanoStats lack {', '.join(missing)}.")
+
+
+class NanoStatsDirFmt(model.DirectoryFormat):
+    stats = model.FileCollection(r".+\.json", format=NanoStatsFormat)
+
+    @stats.set_path_maker
+    def stats_path_maker(self, sample_id):
+        return f"{sample_id}.json"
+
+
+READ_METRICS_COLUMNS = (
+    "read_id",
+    "mate",
+    "length",
+    "mean_quality",
+    "gc_fraction",
+    "passed",
+)
+
+
+# Metrics of every read of one sample as an Arrow IPC file, see
+# _metrics.READ_METRICS_SCHEMA
+class ReadMetricsFormat(model.BinaryFileFormat):
+    def _validate_(self, level):
+        try:
+            with pa.memory_map(str(self.path)) as source:
+                schema = pa.ipc.open_file(source).schema
+        except pa.ArrowInvalid as e:
+            raise ValidationError(f"The read metrics are not an Arrow IPC file: {e}")
+
+        missing = [name for name in READ_METRICS_COLUMNS if name not in schema.names]
+        if missing:
+            raise ValidationError(f"The read metrics lack {', '.join(missing)}.")
+
+
+class ReadMetricsDirFmt(model.DirectoryFormat):
+    metrics = model.FileCollection(r".+\.arrow", format=ReadMetricsFormat)
+
+    @metrics.set_path_maker
+    def metrics_path_maker(self, sample_id):
+        return f"{sample_id}.arrow"
+
+
+# Columns of a basecaller sequencing summary that stats needs, see
+# _summary.SUMMARY_COLUMNS
+SEQUENCING_SUMMARY_COLUMNS = (
+    "start_time",
+    "sequence_length_template",
+    "mean_qscore_template",
+)
+
+
+# Tab-separated sequencing summary of the reads of one sample, as written by
+# the ONT basecallers, e.g. sequencing_summary.txt of Guppy or Dorado
+class SequencingSummaryFormat(model.TextFileFormat):
+    def _validate_(self, level):
+        with self.open() as fh:
+            header = fh.readline().rstrip("\r\n").split("\t")
+
+        missing = [name for name in SEQUENCING_SUMMARY_COLUMNS if name not in header]
+        if missing:
+            raise ValidationError(
+                f"The sequencing summary lacks the columns {', '.join(missing)}."
+            )
+
+
+class SequencingSummaryDirFmt(model.DirectoryFormat):
+    summaries = model.FileCollection(r".+\.txt", format=SequencingSummaryFormat)
+
+    @summaries.set_path_maker
+    def summaries_path_maker(self, sample_id):
+        return f"{sample_id}.txt"
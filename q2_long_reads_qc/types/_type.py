@@ -0,0 +1,16 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2024, QIIME 2 development team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file LICENSE, distributed with this software.
+# ----------------------------------------------------------------------------
+from q2_types.sample_data import SampleData
+from qiime2.plugin import SemanticType
+
+ReadStats = SemanticType("ReadStats", variant_of=SampleData.field["type"])
+NanoStats = SemanticType("NanoStats", variant_of=SampleData.field["type"])
+ReadMetrics = SemanticType("ReadMetrics", variant_of=SampleData.field["type"])
+SequencingSummary = SemanticType(
+    "SequencingSummary", variant_of=SampleData.field["type"]
+)